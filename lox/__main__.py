@@ -1,90 +1,244 @@
 import sys
+from typing import TYPE_CHECKING, Optional
 
-from lox.runtime_error import InterpreterRuntimeError
+if TYPE_CHECKING:
+    import argparse
 
-from lox.interpreter import Interpreter
+    from lox.interpreter import Interpreter
 
-had_error: bool = False
-had_runtime_error: bool = False
-interpreter: Interpreter = Interpreter()
+# Nothing is imported up front: the interpreter is imported once it is known
+# to be needed, and the thin client does without even argparse, so that it
+# starts quickly.
 
 
 def main() -> None:
-    if len(sys.argv) > 2:
-        print("Usage: pylox [script]")
-        exit(64)
-    if len(sys.argv) == 2:
-        run_file(sys.argv[1])
-    else:
-        run_prompt()
-
-
-def run_file(path: str) -> None:
-    data = open(path).read().encode("ascii")
-    run(data.decode("ascii"))
-
-    # Indicate an error in the exit code.
-    global had_error, had_runtime_error
-    if had_error:
-        exit(65)
-    if had_runtime_error:
-        exit(70)
-
-
-def run_prompt() -> None:
-    try:
-        while True:
-            line: str = input("> ")
-            if line == " ":
-                break
-            run(line)
-            global had_error
-            had_error = False
-    except EOFError:
-        pass
-
-
-def run(source: str) -> None:
-    from lox.scanner import Scanner
-    from lox.parser import Parser
-    from lox.tokens import Token
-    from lox.stmt import Stmt
-    from lox.resolver import Resolver
-
-    scanner = Scanner(source)
-    tokens: list[Token] = scanner.scan_tokens()
-
-    parser = Parser(tokens)
-    statements: list[Stmt] = parser.parse()
-
-    # Stop if there was a syntax error
-    if had_error:
+    # 'serve' and 'run' are subcommands, anything else is the script to run
+    command: Optional[str] = (
+        sys.argv[1] if sys.argv[1:2] in (["serve"], ["run"]) else None
+    )
+    if command == "run" and run_thin_client(sys.argv[2:]):
         return
-
-    resolver = Resolver(interpreter)
-    resolver.resolve(statements)
-
-    # Stop if there was a resolution error
-    if had_error:
+    # Looked for by hand, so that the report also covers parsing the arguments
+    if "--startup-report" not in sys.argv[1:]:
+        return parse_and_start(command)
+    from lox.startup_report import StartupReport
+
+    with StartupReport():
+        parse_and_start(command)
+
+
+# Runs the script through the daemon when the arguments are only what the
+# client needs, and returns whether it did. Anything else is left to argparse,
+# which also reports the errors.
+def run_thin_client(arguments: list[str]) -> bool:
+    from lox.client import default_socket_path, run_client
+
+    client: bool = False
+    socket_path: Optional[str] = None
+    script: Optional[str] = None
+    remaining: list[str] = list(arguments)
+    while remaining:
+        argument: str = remaining.pop(0)
+        if argument == "--client":
+            client = True
+        elif argument == "--socket" and remaining:
+            socket_path = remaining.pop(0)
+        elif argument.startswith("--socket="):
+            socket_path = argument[len("--socket=") :]
+        elif script is None and (argument == "-" or not argument.startswith("-")):
+            script = argument
+        else:
+            return False
+    if not client or script is None:
+        return False
+    exit(run_client(script, socket_path or default_socket_path()))
+
+
+def parse_and_start(command: Optional[str]) -> None:
+    import argparse
+
+    from lox.client import default_socket_path
+    from lox.memo_cache import DEFAULT_MEMO_SIZE
+
+    parser = argparse.ArgumentParser(
+        prog="pylox" if command is None else f"pylox {command}"
+    )
+    if command != "serve":
+        parser.add_argument("script", nargs="?" if command is None else None)
+    parser.add_argument(
+        "--stackless",
+        action="store_true",
+        help="run Lox calls on a heap-allocated stack instead of the Python one",
+    )
+    parser.add_argument(
+        "--max-depth",
+        type=int,
+        help="maximum depth of Lox calls in stackless mode (default: 50000)",
+    )
+    parser.add_argument(
+        "--single-pass",
+        action="store_true",
+        help="resolve variables while parsing instead of in a separate pass",
+    )
+    parser.add_argument(
+        "--memoize",
+        action="store_true",
+        help="cache the results of functions found to be pure",
+    )
+    parser.add_argument(
+        "--memo-size",
+        type=int,
+        default=DEFAULT_MEMO_SIZE,
+        help="number of results cached per function with --memoize",
+    )
+    parser.add_argument(
+        "--startup-report",
+        action="store_true",
+        help="print the time spent importing and initialising each module",
+    )
+    if command != "serve":
+        parser.add_argument(
+            "--fibers",
+            action="store_true",
+            help="run spawn, await, sleep and yield as tasks on an event loop,"
+            " implies --stackless",
+        )
+        parser.add_argument(
+            "--compile",
+            action="store_true",
+            help="compile the script to Python instead of walking its tree,"
+            " ignored with --stackless, --fibers, --memoize, --stats or --coverage",
+        )
+        parser.add_argument(
+            "--lazy",
+            action="store_true",
+            help="parse the body of a top level function when it is first called",
+        )
+        parser.add_argument(
+            "--strict",
+            action="store_true",
+            help="with --lazy, still report syntax errors in bodies before running",
+        )
+        parser.add_argument(
+            "--shake",
+            action="store_true",
+            help="leave out the top level functions and classes the script never"
+            " refers to",
+        )
+        parser.add_argument(
+            "--bundle",
+            metavar="PATH",
+            help="write the script, shaken, to PATH as a single file instead of"
+            " running it",
+        )
+        parser.add_argument(
+            "--stats",
+            metavar="PATH",
+            help="write run time counters and phase timings to PATH as JSON",
+        )
+        parser.add_argument(
+            "--heap-report",
+            metavar="PATH",
+            help="write the live Lox objects left at exit to PATH",
+        )
+        parser.add_argument(
+            "--coverage",
+            metavar="PATH",
+            help="write the lines of the script that ran to PATH",
+        )
+    if command is not None:
+        parser.add_argument(
+            "--socket",
+            default=default_socket_path(),
+            help="Unix socket the daemon listens on",
+        )
+    if command == "run":
+        parser.add_argument(
+            "--client",
+            action="store_true",
+            help="run the script in the daemon started by 'serve', '-' reads stdin",
+        )
+    args = parser.parse_args(sys.argv[1:] if command is None else sys.argv[2:])
+    start(command, args)
+
+
+def start(command: Optional[str], args: "argparse.Namespace") -> None:
+    if command == "run" and args.client:
+        from lox.client import run_client
+
+        exit(run_client(args.script, args.socket))
+
+    from lox.interpreter import DEFAULT_MAX_DEPTH, RECURSION_LIMIT
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), RECURSION_LIMIT))
+    max_depth: int = (
+        DEFAULT_MAX_DEPTH if args.max_depth is None else args.max_depth
+    )
+    memo_size: int = args.memo_size if args.memoize else 0
+    if command == "serve":
+        from lox.server import serve
+
+        serve(args.socket, args.stackless, max_depth, args.single_pass, memo_size)
         return
+    if args.stats is None:
+        return run_local(args, max_depth, memo_size)
+    from lox.stats import Stats
+
+    with Stats(args.stats):
+        run_local(args, max_depth, memo_size)
+
+
+def run_local(args: "argparse.Namespace", max_depth: int, memo_size: int) -> None:
+    from lox.interpreter import Interpreter
+
+    interpreter = Interpreter(
+        stackless=args.stackless,
+        max_depth=max_depth,
+        # Later lines of a session could change what earlier ones found pure
+        memo_size=memo_size if args.script is not None else 0,
+        fibers=args.fibers,
+        # Statistics and coverage count what the tree walk does
+        compiled=args.compile and args.stats is None and args.coverage is None,
+    )
+    if args.heap_report is None:
+        return run_covered(args, interpreter)
+    try:
+        run_covered(args, interpreter)
+    finally:
+        from lox.heap import heap_snapshot
 
-    interpreter.interpret(statements)
-
-
-def error(line: int, message: str) -> None:
-    report(line, "", message)
-
+        with open(args.heap_report, "w") as report:
+            report.write(f"{heap_snapshot(interpreter).report()}\n")
 
-def runtime_error(error: InterpreterRuntimeError) -> None:
-    print(f"{error}\n[line {error.token.line}]", file=sys.stderr)
-    global had_runtime_error
-    had_runtime_error = True
 
+def run_covered(args: "argparse.Namespace", interpreter: "Interpreter") -> None:
+    if args.coverage is None:
+        return run_script(args, interpreter)
+    from lox.coverage import LineCoverage
 
-def report(line: int, where: str, message: str) -> None:
-    print(f"[line {line}] Error {where}: {message}", file=sys.stderr)
-    global had_error
-    had_error = True
+    coverage = LineCoverage(interpreter)
+    interpreter.add_hook(coverage)
+    try:
+        run_script(args, interpreter)
+    finally:
+        coverage.write(args.coverage, args.script)
+
+
+def run_script(args: "argparse.Namespace", interpreter: "Interpreter") -> None:
+    from lox.parser import Laziness
+    from lox.runner import bundle_file, run_file, run_prompt
+
+    laziness: Laziness = Laziness.EAGER
+    if args.lazy:
+        laziness = Laziness.STRICT if args.strict else Laziness.LAZY
+    if args.bundle is not None:
+        if args.script is None:
+            exit("pylox: --bundle needs a script")
+        bundle_file(args.script, args.bundle, interpreter, args.single_pass, laziness)
+    elif args.script is not None:
+        run_file(args.script, interpreter, args.single_pass, laziness, args.shake)
+    else:
+        run_prompt(interpreter, args.single_pass, laziness)
 
 
 if __name__ == "__main__":
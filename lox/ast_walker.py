@@ -0,0 +1,103 @@
+import lox.expr as expr
+import lox.stmt as stmt
+from lox.expr import Expr
+from lox.stmt import Stmt
+
+from typing import Optional
+
+
+# Visits every node below the ones it is given. Analyses override the visit
+# methods they care about and call the base version to keep descending.
+class AstWalker(expr.Visitor, stmt.Visitor):
+    def walk(self, *nodes: Optional[Expr | Stmt]) -> None:
+        for node in nodes:
+            if node is not None:
+                node.accept(self)
+
+    def walk_all(self, statements: list[Stmt]) -> None:
+        for statement in statements:
+            statement.accept(self)
+
+    def visit_block_stmt(self, stmt: stmt.Block) -> None:
+        self.walk_all(stmt.statements)
+
+    def visit_class_stmt(self, stmt: stmt.Class) -> None:
+        self.walk(stmt.superclass)
+        for method in stmt.methods:
+            self.walk(method)
+
+    def visit_expression_stmt(self, stmt: stmt.Expression) -> None:
+        self.walk(stmt.expression)
+
+    def visit_function_stmt(self, stmt: stmt.Function) -> None:
+        self.walk_all(stmt.body)
+
+    def visit_if_stmt(self, stmt: stmt.If) -> None:
+        self.walk(stmt.condition, stmt.then_branch, stmt.else_branch)
+
+    def visit_print_stmt(self, stmt: stmt.Print) -> None:
+        self.walk(stmt.expression)
+
+    def visit_return_stmt(self, stmt: stmt.Return) -> None:
+        self.walk(stmt.value)
+
+    def visit_var_stmt(self, stmt: stmt.Var) -> None:
+        self.walk(stmt.initializer)
+
+    def visit_while_stmt(self, stmt: stmt.While) -> None:
+        self.walk(stmt.condition, stmt.body)
+
+    def visit_import_stmt(self, stmt: stmt.Import) -> None:
+        pass
+
+    def visit_assign_expr(self, expr: expr.Assign) -> None:
+        self.walk(expr.value)
+
+    def visit_binary_expr(self, expr: expr.Binary) -> None:
+        self.walk(expr.left, expr.right)
+
+    def visit_call_expr(self, expr: expr.Call) -> None:
+        self.walk(expr.callee, *expr.arguments)
+
+    def visit_get_expr(self, expr: expr.Get) -> None:
+        self.walk(expr.instance)
+
+    def visit_grouping_expr(self, expr: expr.Grouping) -> None:
+        self.walk(expr.expression)
+
+    def visit_literal_expr(self, expr: expr.Literal) -> None:
+        pass
+
+    def visit_logical_expr(self, expr: expr.Logical) -> None:
+        self.walk(expr.left, expr.right)
+
+    def visit_set_expr(self, expr: expr.Set) -> None:
+        self.walk(expr.instance, expr.value)
+
+    def visit_super_expr(self, expr: expr.Super) -> None:
+        pass
+
+    def visit_this_expr(self, expr: expr.This) -> None:
+        pass
+
+    def visit_unary_expr(self, expr: expr.Unary) -> None:
+        self.walk(expr.right)
+
+    def visit_variable_expr(self, expr: expr.Variable) -> None:
+        pass
+
+    # Type feedback gives evaluated nodes these classes, which walk as before
+    def visit_number_binary_expr(self, expr: expr.Binary) -> None:
+        self.visit_binary_expr(expr)
+
+    def visit_string_binary_expr(self, expr: expr.Binary) -> None:
+        self.visit_binary_expr(expr)
+
+    def visit_generic_binary_expr(self, expr: expr.Binary) -> None:
+        self.visit_binary_expr(expr)
+
+    def visit_number_unary_expr(self, expr: expr.Unary) -> None:
+        self.visit_unary_expr(expr)
+
+    def visit_generic_unary_expr(self, expr: expr.Unary) -> None:
+        self.visit_unary_expr(expr)
@@ -0,0 +1,45 @@
+import os
+import sys
+
+# The client only needs a few standard library modules, so that running a
+# script through the daemon does not pay for importing the interpreter.
+
+
+def default_socket_path() -> str:
+    directory: str = (
+        os.environ.get("XDG_RUNTIME_DIR") or os.environ.get("TMPDIR") or "/tmp"
+    )
+    return os.path.join(directory, f"pylox-{os.getuid()}.sock")
+
+
+# Requests and replies are single lines of JSON. The daemon replies with any
+# number of {"stdout": text} and {"stderr": text} messages, then {"exit": code}.
+def run_client(script: str, socket_path: str) -> int:
+    import json
+    import socket
+
+    request: dict[str, str] = (
+        {"source": sys.stdin.read()}
+        if script == "-"
+        else {"path": os.path.abspath(script)}
+    )
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+    except OSError as error:
+        print(f"Cannot connect to {socket_path}: {error}", file=sys.stderr)
+        return 69
+    with connection, connection.makefile("rwb") as stream:
+        stream.write(json.dumps(request).encode() + b"\n")
+        stream.flush()
+        for line in stream:
+            message = json.loads(line)
+            if "stdout" in message:
+                sys.stdout.write(message["stdout"])
+            elif "stderr" in message:
+                sys.stderr.write(message["stderr"])
+            elif "exit" in message:
+                sys.stdout.flush()
+                return int(message["exit"])
+    print("The daemon closed the connection", file=sys.stderr)
+    return 69
@@ -0,0 +1,109 @@
+import lox.expr as expr
+import lox.stmt as stmt
+from lox.ast_walker import AstWalker
+from lox.expr import Expr
+from lox.stmt import Stmt
+from lox.tokens import Token
+from lox.token_types import TokenType
+from lox.type_feedback import NUMBER_OPERATIONS
+
+from typing import Callable, Optional
+
+COMPARISONS: set[TokenType] = {
+    TokenType.GREATER,
+    TokenType.GREATER_EQUAL,
+    TokenType.LESS,
+    TokenType.LESS_EQUAL,
+}
+
+
+# A desugared 'for (var i = a; i < b; i = i + c) body' loop, which the
+# interpreter runs with the counter kept in a Python local.
+class CountedLoop:
+    def __init__(
+        self,
+        declaration: stmt.Var,
+        initializer: Expr,
+        condition: expr.Binary,
+        body: Stmt,
+        increment: Expr,
+        step: float,
+    ) -> None:
+        self.declaration: stmt.Var = declaration
+        self.name: Token = declaration.name
+        self.initializer: Expr = initializer
+        self.condition: expr.Binary = condition
+        self.compare: Callable[[float, float], object] = NUMBER_OPERATIONS[
+            condition.operator.type
+        ]
+        self.limit: Expr = condition.right
+        self.body: Stmt = body
+        self.increment: Expr = increment
+        self.step: float = step
+
+
+class CounterUse(AstWalker):
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self.function_depth: int = 0
+        self.escapes: bool = False
+
+    def visit_function_stmt(self, stmt: stmt.Function) -> None:
+        self.function_depth += 1
+        super().visit_function_stmt(stmt)
+        self.function_depth -= 1
+
+    def visit_assign_expr(self, expr: expr.Assign) -> None:
+        if expr.name.lexeme == self.name:
+            self.escapes = True
+        super().visit_assign_expr(expr)
+
+    def visit_variable_expr(self, expr: expr.Variable) -> None:
+        if self.function_depth > 0 and expr.name.lexeme == self.name:
+            self.escapes = True
+
+
+def is_counter(node: Expr, name: str) -> bool:
+    return isinstance(node, expr.Variable) and node.name.lexeme == name
+
+
+def match_counted_loop(block: stmt.Block) -> Optional[CountedLoop]:
+    match block.statements:
+        case [stmt.Var(initializer=Expr()) as var, stmt.While() as loop]:
+            pass
+        case _:
+            return None
+    name: str = var.name.lexeme
+    condition = loop.condition
+    if not (
+        isinstance(condition, expr.Binary)
+        and condition.operator.type in COMPARISONS
+        and is_counter(condition.left, name)
+    ):
+        return None
+    match loop.body:
+        case stmt.Block(statements=[body, stmt.Expression(expression=increment)]):
+            pass
+        case _:
+            return None
+    if not (
+        isinstance(increment, expr.Assign)
+        and increment.name.lexeme == name
+        and isinstance(increment.value, expr.Binary)
+        and increment.value.operator.type in (TokenType.PLUS, TokenType.MINUS)
+        and is_counter(increment.value.left, name)
+        and isinstance(increment.value.right, expr.Literal)
+        and type(increment.value.right.value) is float
+    ):
+        return None
+    step: float = increment.value.right.value
+    if increment.value.operator.type == TokenType.MINUS:
+        step = -step
+    # The counter must only change through the increment, and no closure may
+    # observe it between iterations
+    use = CounterUse(name)
+    use.walk(condition.right, body)
+    if use.escapes:
+        return None
+    assert var.initializer is not None
+    return CountedLoop(var, var.initializer, condition, body, increment, step)
@@ -0,0 +1,58 @@
+import contextlib
+import io
+from collections import Counter
+from typing import Optional
+
+from lox.hooks import Hook
+from lox.lazy_function import LazyFunction
+
+
+# Counts how many times the statements starting on each line ran. Lines on
+# which a statement starts are executable, the others are not counted.
+class LineCoverage(Hook):
+    def __init__(self, interpreter) -> None:
+        self.interpreter = interpreter
+        self.hits: Counter[int] = Counter()
+
+    def on_line(self, line: int) -> None:
+        self.hits[line] += 1
+
+    def executable(self) -> set[int]:
+        lines: set[int] = set(self.interpreter.lines.values())
+        # The bodies of lazily parsed functions never called are parsed now,
+        # their syntax errors staying unreported as they would have been
+        for function in self.interpreter.layouts:
+            if isinstance(function, LazyFunction):
+                with contextlib.redirect_stderr(io.StringIO()):
+                    parsed: bool = function.parse()
+                if parsed:
+                    lines.update(function.lines.values())
+        return lines
+
+    def missed(self, executable: set[int]) -> list[int]:
+        return sorted(executable - self.hits.keys())
+
+    # Writes a summary followed by the script annotated with the hit count of
+    # each executable line, '#####' marking those that never ran
+    def write(self, path: str, script: Optional[str]) -> None:
+        lines: set[int] = self.executable()
+        missed: list[int] = self.missed(lines)
+        covered: int = len(lines) - len(missed)
+        percent: float = 100.0 * covered / len(lines) if lines else 100.0
+        with open(path, "w") as report:
+            report.write(f"{script or '<prompt>'}: {covered}/{len(lines)} lines")
+            report.write(f" covered ({percent:.1f}%)\n")
+            if missed:
+                report.write(f"missed: {', '.join(map(str, missed))}\n")
+            if script is None:
+                return
+            report.write("\n")
+            missing: set[int] = set(missed)
+            with open(script) as source:
+                for number, text in enumerate(source, 1):
+                    count: str = (
+                        "#####"
+                        if number in missing
+                        else str(self.hits[number]) if number in self.hits else "-"
+                    )
+                    report.write(f"{count:>9}: {number:>4}: {text.rstrip()}\n")
@@ -17,11 +17,11 @@ class Environment:
         return environment
 
     def get(self, name: Token) -> object:
-        value: Optional[object] = self.values.get(name.lexeme)
-        if value is not None:
-            return value
-        if self.enclosing is not None:
-            return self.enclosing.get(name)
+        environment: Optional[Environment] = self
+        while environment is not None:
+            if name.lexeme in environment.values:
+                return environment.values[name.lexeme]
+            environment = environment.enclosing
         raise InterpreterRuntimeError(name, f"Undefined variable '{name.lexeme}'")
 
     def get_at(self, distance: int, name: str) -> Optional[object]:
@@ -30,11 +30,12 @@ class Environment:
         return ancestor.values.get(name)
 
     def assign(self, name: Token, value: object) -> None:
-        if name.lexeme in self.values:
-            self.values[name.lexeme] = value
-            return
-        if self.enclosing is not None:
-            return self.enclosing.assign(name, value)
+        environment: Optional[Environment] = self
+        while environment is not None:
+            if name.lexeme in environment.values:
+                environment.values[name.lexeme] = value
+                return
+            environment = environment.enclosing
         raise InterpreterRuntimeError(name, f"Undefined variable '{name.lexeme}'")
 
     def assign_at(self, distance: int, name: Token, value: object) -> None:
@@ -44,3 +45,69 @@ class Environment:
 
     def define(self, name: str, value: Optional[object]) -> None:
         self.values[name] = value
+
+
+# Marks a global slot whose name has been resolved but not defined yet
+UNDEFINED: object = object()
+
+
+# Globals live in a table indexed by slots handed out at resolution time, so
+# that a global access is a list lookup instead of a walk up the environments.
+# Each module has its own names, but their slots are in the same table.
+class GlobalEnvironment(Environment):
+    def __init__(
+        self,
+        table: Optional[list[object]] = None,
+        natives: Optional[dict[str, object]] = None,
+    ) -> None:
+        super().__init__()
+        self.slots: dict[str, int] = dict()
+        self.table: list[object] = [] if table is None else table
+        # Natives the interpreter defines itself, found from every module
+        self.natives: dict[str, object] = {} if natives is None else natives
+
+    def module(self) -> "GlobalEnvironment":
+        return GlobalEnvironment(self.table, self.natives)
+
+    def slot(self, name: str) -> int:
+        index: Optional[int] = self.slots.get(name)
+        if index is None:
+            index = self.slots[name] = len(self.table)
+            self.table.append(UNDEFINED)
+        return index
+
+    def get(self, name: Token) -> object:
+        return self.get_slot(self.slot(name.lexeme), name)
+
+    def get_slot(self, index: int, name: Token) -> object:
+        value: object = self.table[index]
+        if value is UNDEFINED:
+            return self.load_native(index, name)
+        return value
+
+    def load_native(self, index: int, name: Token) -> object:
+        value: Optional[object] = self.natives.get(name.lexeme)
+        if value is None:
+            # Natives are only imported once a script uses a global it never
+            # defined
+            from lox.natives import NATIVES
+
+            native = NATIVES.get(name.lexeme)
+            if native is None:
+                raise InterpreterRuntimeError(
+                    name, f"Undefined variable '{name.lexeme}'"
+                )
+            value = native()
+        self.table[index] = value
+        return value
+
+    def assign(self, name: Token, value: object) -> None:
+        self.assign_slot(self.slot(name.lexeme), name, value)
+
+    def assign_slot(self, index: int, name: Token, value: object) -> None:
+        if self.table[index] is UNDEFINED:
+            self.load_native(index, name)
+        self.table[index] = value
+
+    def define(self, name: str, value: Optional[object]) -> None:
+        self.table[self.slot(name)] = value
@@ -0,0 +1,30 @@
+import sys
+
+from lox.runtime_error import InterpreterRuntimeError
+
+# Error state of the current run, shared by every phase of the pipeline
+
+had_error: bool = False
+had_runtime_error: bool = False
+
+
+def reset() -> None:
+    global had_error, had_runtime_error
+    had_error = False
+    had_runtime_error = False
+
+
+def error(line: int, message: str) -> None:
+    report(line, "", message)
+
+
+def runtime_error(error: InterpreterRuntimeError) -> None:
+    print(f"{error}\n[line {error.token.line}]", file=sys.stderr)
+    global had_runtime_error
+    had_runtime_error = True
+
+
+def report(line: int, where: str, message: str) -> None:
+    print(f"[line {line}] Error {where}: {message}", file=sys.stderr)
+    global had_error
+    had_error = True
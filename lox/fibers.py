@@ -0,0 +1,152 @@
+import asyncio
+
+import lox.errors
+from lox.environment import Environment
+from lox.lox_callable import LoxCallable
+from lox.lox_function import LoxFunction
+from lox.runtime_error import InterpreterRuntimeError, NativeError
+from lox.stackless import Stackless, Steps, Suspend
+from lox.stmt import Stmt
+
+from typing import Optional
+
+# What the interpreter holds for the task it is running
+TaskState = tuple[Environment, list[object], int]
+
+
+# The value spawn returns, to be awaited for the function's result
+class Task:
+    def __init__(self, task: asyncio.Task) -> None:
+        self.task: asyncio.Task = task
+        self.awaited: bool = False
+
+    def __str__(self) -> str:
+        return "<task>"
+
+
+class Native(LoxCallable):
+    def __init__(self, fibers: "Fibers") -> None:
+        self.fibers: Fibers = fibers
+
+    def __str__(self) -> str:
+        return "<native fn>"
+
+
+class Spawn(Native):
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter, arguments: list[object]) -> Task:
+        function: object = arguments[0]
+        if not isinstance(function, LoxFunction) or function.arity() != 0:
+            raise NativeError("Can only spawn functions without parameters")
+        return self.fibers.spawn(function)
+
+
+class Await(Native):
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter, arguments: list[object]) -> Suspend:
+        task: object = arguments[0]
+        if not isinstance(task, Task):
+            raise NativeError("Can only await tasks")
+        task.awaited = True
+        return Suspend(task.task)
+
+
+class Sleep(Native):
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter, arguments: list[object]) -> Suspend:
+        seconds: object = arguments[0]
+        if type(seconds) is not float or seconds < 0:
+            raise NativeError("Can only sleep for zero or more seconds")
+        return Suspend(asyncio.sleep(seconds))
+
+
+class Yield(Native):
+    def arity(self) -> int:
+        return 0
+
+    def call(self, interpreter, arguments: list[object]) -> Suspend:
+        return Suspend(asyncio.sleep(0))
+
+
+# Cooperative tasks on an asyncio event loop. Each task drives the stackless
+# engine on its own stack of frames and gives way to the others when a native
+# suspends it. The interpreter's current environment, frame and call depth are
+# switched along with the tasks. A program ends once all its tasks are done.
+class Fibers:
+    def __init__(self, interpreter) -> None:
+        self.interpreter = interpreter
+        self.stackless: Stackless = interpreter.stackless
+        self.tasks: list[Task] = []
+        for name, native in (
+            ("spawn", Spawn),
+            ("await", Await),
+            ("sleep", Sleep),
+            ("yield", Yield),
+        ):
+            interpreter.globals.natives[name] = native(self)
+
+    def run(self, statements: list[Stmt]) -> None:
+        asyncio.run(self.main(statements))
+
+    async def main(self, statements: list[Stmt]) -> None:
+        for statement in statements:
+            # A finished drive leaves the interpreter as this task had it
+            if self.stackless.calls.has_call(statement):
+                frame = self.stackless.frame(statement)
+                await self.drive(self.stackless.steps(frame), self.state())
+            else:
+                self.interpreter.evaluate(statement)
+        while not all(task.task.done() for task in self.tasks):
+            await asyncio.wait([task.task for task in self.tasks])
+        # The errors of tasks nobody awaited would go unseen otherwise
+        tasks, self.tasks = self.tasks, []
+        for task in tasks:
+            error: Optional[BaseException] = task.task.exception()
+            if error is None or task.awaited:
+                continue
+            if not isinstance(error, InterpreterRuntimeError):
+                raise error
+            lox.errors.runtime_error(error)
+
+    def spawn(self, function: LoxFunction) -> Task:
+        steps: Steps = self.stackless.steps(
+            self.stackless.invoke(function, [], function.declaration.name)
+        )
+        state: TaskState = (self.interpreter.globals, [], 0)
+        task = Task(asyncio.create_task(self.drive(steps, state)))
+        # Marks the error as seen, as a failing main task leaves it unawaited
+        task.task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self.tasks.append(task)
+        return task
+
+    async def drive(self, steps: Steps, state: TaskState) -> object:
+        value: object = None
+        error: Optional[Exception] = None
+        while True:
+            self.restore(state)
+            try:
+                if error is None:
+                    suspend: Suspend = steps.send(value)
+                else:
+                    suspend = steps.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            state = self.state()
+            try:
+                value, error = await suspend.awaitable, None
+            except Exception as raised:
+                value, error = None, raised
+
+    def state(self) -> TaskState:
+        interpreter = self.interpreter
+        return interpreter.environment, interpreter.frame, self.stackless.depth
+
+    def restore(self, state: TaskState) -> None:
+        interpreter = self.interpreter
+        interpreter.environment, interpreter.frame, self.stackless.depth = state
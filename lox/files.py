@@ -0,0 +1,173 @@
+import sys
+
+from lox.lox_callable import LoxCallable
+from lox.runtime_error import InterpreterRuntimeError, NativeError
+from lox.token_types import TokenType
+from lox.tokens import Token
+
+from typing import Optional, TextIO
+
+# Files are read and written in chunks of this size, not a line at a time
+BUFFER_SIZE: int = 1 << 16
+
+
+class LoxFile:
+    def __init__(self, name: str, stream: TextIO, writable: bool) -> None:
+        self.name: str = name
+        self.stream: TextIO = stream
+        self.writable: bool = writable
+
+    def __str__(self) -> str:
+        return f"<file {self.name}>"
+
+
+def open_file(path: object, mode: str) -> LoxFile:
+    if type(path) is not str:
+        raise NativeError("File path must be a string")
+    try:
+        stream: TextIO = open(path, mode, buffering=BUFFER_SIZE)
+    except OSError as error:
+        raise NativeError(f"Cannot open {path}: {error.strerror}")
+    return LoxFile(path, stream, mode != "r")
+
+
+def readable(value: object) -> LoxFile:
+    if not isinstance(value, LoxFile) or value.writable:
+        raise NativeError("Expect a file opened for reading")
+    if value.stream.closed:
+        raise NativeError(f"Cannot read {value.name}: file is closed")
+    return value
+
+
+def read_line(stream: TextIO) -> Optional[str]:
+    line: str = stream.readline()
+    if not line:
+        return None
+    return line[:-1] if line.endswith("\n") else line
+
+
+class FileNative(LoxCallable):
+    def __str__(self) -> str:
+        return "<native fn>"
+
+
+class OpenRead(FileNative):
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter, arguments: list[object]) -> LoxFile:
+        return open_file(arguments[0], "r")
+
+
+class OpenWrite(FileNative):
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter, arguments: list[object]) -> LoxFile:
+        file: LoxFile = open_file(arguments[0], "w")
+        interpreter.writers.add(file)
+        return file
+
+
+class Stdin(FileNative):
+    def __init__(self) -> None:
+        self.file: LoxFile = LoxFile("stdin", sys.stdin, False)
+
+    def arity(self) -> int:
+        return 0
+
+    def call(self, interpreter, arguments: list[object]) -> LoxFile:
+        return self.file
+
+
+# The next line without its line break, or nil at the end of the file
+class ReadLine(FileNative):
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter, arguments: list[object]) -> Optional[str]:
+        return read_line(readable(arguments[0]).stream)
+
+
+class ReadAll(FileNative):
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter, arguments: list[object]) -> str:
+        return readable(arguments[0]).stream.read()
+
+
+# A function returning the next line of the file each time it is called, and
+# nil once the file is exhausted
+class Lines(FileNative):
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter, arguments: list[object]) -> "NextLine":
+        return NextLine(readable(arguments[0]))
+
+
+class NextLine(FileNative):
+    def __init__(self, file: LoxFile) -> None:
+        self.file: LoxFile = file
+
+    def arity(self) -> int:
+        return 0
+
+    def call(self, interpreter, arguments: list[object]) -> Optional[str]:
+        return read_line(readable(self.file).stream)
+
+
+def write(file: object, text: str) -> None:
+    if not isinstance(file, LoxFile) or not file.writable:
+        raise NativeError("Expect a file opened for writing")
+    if file.stream.closed:
+        raise NativeError(f"Cannot write {file.name}: file is closed")
+    try:
+        file.stream.write(text)
+    except OSError as error:
+        raise NativeError(f"Cannot write {file.name}: {error.strerror}")
+
+
+# Writes the value as print shows it, without adding a line break
+class Write(FileNative):
+    def arity(self) -> int:
+        return 2
+
+    def call(self, interpreter, arguments: list[object]) -> None:
+        write(arguments[0], interpreter.stringify(arguments[1]))
+
+
+# Lox strings have no escapes, so lines are ended by the native
+class WriteLine(FileNative):
+    def arity(self) -> int:
+        return 2
+
+    def call(self, interpreter, arguments: list[object]) -> None:
+        write(arguments[0], interpreter.stringify(arguments[1]) + "\n")
+
+
+class Close(FileNative):
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter, arguments: list[object]) -> None:
+        file: object = arguments[0]
+        if not isinstance(file, LoxFile):
+            raise NativeError("Can only close files")
+        interpreter.writers.discard(file)
+        file.stream.close()
+
+
+# Writes out what the files a program left open still buffer, once it ends
+def flush_writers(interpreter) -> None:
+    for file in list(interpreter.writers):
+        try:
+            file.stream.flush()
+        except OSError as error:
+            interpreter.runtime_error(
+                InterpreterRuntimeError(
+                    Token(TokenType.EOF, "", None, 0),
+                    f"Cannot write {file.name}: {error.strerror}",
+                )
+            )
@@ -0,0 +1,45 @@
+from typing import Optional
+
+# Frames kept per function for later calls, enough for moderate recursion
+MAX_FREE_FRAMES: int = 16
+
+
+# How a call lays out the locals of a function: variables captured by a
+# closure live in an Environment, all others in a frame list indexed by slot.
+# Frames are never captured, so those of returned calls are cleared and reused.
+class FunctionLayout:
+    def __init__(self) -> None:
+        self.frame_size: int = 0
+        self.environment: bool = False
+        self.params: list[Optional[int]] = []
+        # Slot holding the function itself, when its body calls it by name
+        self.itself: Optional[int] = None
+        self.empty: tuple[None, ...] = ()
+        self.free_frames: list[list[object]] = []
+        self.max_free_frames: int = MAX_FREE_FRAMES
+
+    def allocate(self) -> int:
+        self.frame_size += 1
+        self.empty = (None,) * self.frame_size
+        return self.frame_size - 1
+
+    # The same layout with no free frames, for another interpreter to call with
+    def copy(self) -> "FunctionLayout":
+        layout = FunctionLayout()
+        layout.frame_size = self.frame_size
+        layout.environment = self.environment
+        layout.params = self.params
+        layout.itself = self.itself
+        layout.empty = self.empty
+        return layout
+
+    # Threads calling the function at once would race for the free frames, so
+    # none are kept once they may
+    def share(self) -> None:
+        self.max_free_frames = 0
+        self.free_frames = []
+
+    def release(self, frame: list[object]) -> None:
+        if len(self.free_frames) < self.max_free_frames:
+            frame[:] = self.empty
+            self.free_frames.append(frame)
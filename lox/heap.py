@@ -0,0 +1,208 @@
+import os
+import sys
+from collections import Counter
+from types import (
+    CodeType,
+    CoroutineType,
+    FrameType,
+    FunctionType,
+    GeneratorType,
+    MethodType,
+)
+
+from lox.environment import Environment, GlobalEnvironment
+from lox.lox_callable import LoxCallable
+from lox.lox_class import LoxClass
+from lox.lox_function import LoxFunction
+from lox.lox_instance import LoxInstance
+from lox.lox_module import LoxModule
+from lox.transpiler import Cell, CompiledFunction
+
+from typing import Optional
+
+# How many of the largest strings a report lists
+LARGEST_STRINGS: int = 10
+# Characters of each string shown
+PREVIEW: int = 40
+# Only the Python frames of the interpreter are searched for Lox values
+PACKAGE: str = os.path.dirname(__file__)
+
+
+# What one pass over the live Lox values found
+class HeapSnapshot:
+    def __init__(self) -> None:
+        self.instances: Counter[LoxClass] = Counter()
+        # Approximate bytes held by the instances of each class
+        self.sizes: Counter[LoxClass] = Counter()
+        self.closures: Counter[str] = Counter()
+        self.strings: list[str] = []
+
+    def report(self) -> str:
+        lines: list[str] = ["Instances by class:"]
+        for klass, count in self.instances.most_common():
+            lines.append(
+                f"  {klass.name:<24} {count:>9} instances {self.sizes[klass]:>12} bytes"
+            )
+        lines.append("Closures by function:")
+        for function, count in self.closures.most_common():
+            lines.append(f"  {function:<34} {count:>9} closures")
+        lines.append("Largest strings:")
+        for string in sorted(self.strings, key=len, reverse=True)[:LARGEST_STRINGS]:
+            preview: str = repr(string[:PREVIEW])
+            more: str = "..." if len(string) > PREVIEW else ""
+            lines.append(f"  {len(string):>9} chars {preview}{more}")
+        return "\n".join(lines)
+
+
+# Walks the Lox values reachable from the globals, the environment and frame
+# being run, and those of the calls in progress, which are only held by the
+# Python frames running them, or by the generators of the stackless engine and
+# of fibers. Only the objects that hold Lox values are followed, so the walk
+# stays clear of the rest of the Python heap.
+class HeapWalker:
+    def __init__(self, interpreter) -> None:
+        self.interpreter = interpreter
+        self.snapshot = HeapSnapshot()
+        # Kept alive while the walk lasts, so that no id is reused
+        self.seen: dict[int, object] = dict()
+        self.pending: list[object] = []
+
+    def walk(self, frame: Optional[FrameType]) -> HeapSnapshot:
+        interpreter = self.interpreter
+        self.add(interpreter.globals)
+        self.add(interpreter.environment)
+        self.add(interpreter.frame)
+        if interpreter.backend is not None:
+            # Lox globals, leaving out the helpers of the generated code
+            self.add(
+                [
+                    value
+                    for name, value in interpreter.backend.namespace.items()
+                    if name.endswith("_") and not name.startswith("_")
+                ]
+            )
+        if interpreter.fibers is not None:
+            for task in interpreter.fibers.tasks:
+                self.add(task.task.get_coro())
+        while frame is not None:
+            self.add_frame(frame)
+            frame = frame.f_back
+        while self.pending:
+            self.visit(self.pending.pop())
+        return self.snapshot
+
+    def add(self, value: object) -> None:
+        if id(value) not in self.seen:
+            self.seen[id(value)] = value
+            self.pending.append(value)
+
+    def add_frame(self, frame: FrameType) -> None:
+        code: CodeType = frame.f_code
+        backend = self.interpreter.backend
+        if code.co_name == "<module>":
+            # Python module globals, or the compiled Lox globals added already
+            return
+        if backend is not None and code.co_filename in backend.lines:
+            self.add(list(frame.f_locals.values()))
+        elif code.co_filename.startswith(PACKAGE):
+            # The strings the interpreter itself works on, such as the source
+            # being run, are not Lox values
+            self.add(
+                [
+                    value
+                    for value in frame.f_locals.values()
+                    if not isinstance(value, str)
+                ]
+            )
+
+    def visit(self, value: object) -> None:
+        snapshot: HeapSnapshot = self.snapshot
+        if isinstance(value, LoxInstance):
+            snapshot.instances[value.klass] += 1
+            snapshot.sizes[value.klass] += self.instance_size(value)
+            self.add(value.klass)
+            self.add(value.fields)
+        elif isinstance(value, LoxFunction):
+            name = value.declaration.name
+            snapshot.closures[f"{name.lexeme} (line {name.line})"] += 1
+            self.add(value.closure)
+            if value.memo is not None:
+                self.add(value.memo.results)
+        elif isinstance(value, LoxClass):
+            self.add(value.methods)
+            self.add(value.superclass)
+        elif isinstance(value, GlobalEnvironment):
+            self.add(value.table)
+        elif isinstance(value, Environment):
+            self.add(value.values)
+            self.add(value.enclosing)
+        elif isinstance(value, LoxModule):
+            self.add(value.namespace)
+        elif isinstance(value, str):
+            snapshot.strings.append(value)
+        elif isinstance(value, list):
+            for item in value:
+                self.add(item)
+        elif isinstance(value, dict):
+            for item in value.values():
+                self.add(item)
+        elif isinstance(value, (GeneratorType, CoroutineType)):
+            self.visit_suspended(value)
+        elif isinstance(value, CompiledFunction):
+            self.visit_compiled(value)
+        elif isinstance(value, Cell):
+            self.add(value.value)
+
+    def visit_suspended(self, value: GeneratorType | CoroutineType) -> None:
+        frame: Optional[FrameType] = (
+            value.gi_frame if isinstance(value, GeneratorType) else value.cr_frame
+        )
+        if frame is not None:
+            self.add_frame(frame)
+        if isinstance(value, GeneratorType):
+            self.add(value.gi_yieldfrom)
+        else:
+            self.add(value.cr_await)
+
+    # Functions compiled to Python hold their captured variables as default
+    # arguments, and their instance once bound
+    def visit_compiled(self, value: CompiledFunction) -> None:
+        function: object = value.function
+        if isinstance(function, MethodType):
+            self.add(function.__self__)
+            function = function.__func__
+        assert isinstance(function, FunctionType)
+        code = function.__code__
+        line: int = self.interpreter.backend.lines[code.co_filename][
+            code.co_firstlineno - 1
+        ]
+        self.snapshot.closures[f"{value.name} (line {line})"] += 1
+        self.add(list(function.__defaults__ or ()))
+
+    def instance_size(self, instance: LoxInstance) -> int:
+        # The instance and its fields, with the numbers, strings and vectors
+        # they hold
+        vector = sys.modules.get("lox.vector")
+        size: int = sys.getsizeof(instance) + sys.getsizeof(instance.fields)
+        for field in instance.fields.values():
+            if isinstance(field, (float, str)):
+                size += sys.getsizeof(field)
+            elif vector is not None and isinstance(field, vector.Vector):
+                size += sys.getsizeof(field) + sys.getsizeof(field.data)
+        return size
+
+
+def heap_snapshot(interpreter, frame: Optional[FrameType] = None) -> HeapSnapshot:
+    return HeapWalker(interpreter).walk(frame)
+
+
+# heapSnapshot(): a report of the live Lox values, as a string
+class NativeHeapSnapshot(LoxCallable):
+    def arity(self) -> int:
+        return 0
+
+    def call(self, interpreter, arguments: list[object]) -> str:
+        return heap_snapshot(interpreter, sys._getframe(1)).report()
+
+    def __str__(self) -> str:
+        return "<native fn>"
@@ -0,0 +1,153 @@
+from lox.expr import Call, Expr
+from lox.lox_callable import LoxCallable
+from lox.runtime_error import InterpreterRuntimeError
+from lox.stmt import Return, Stmt
+
+from typing import Optional
+
+
+# Receives the events of a run, override the ones needed.
+class Hook:
+    # A statement starting on this line is about to run
+    def on_line(self, line: int) -> None:
+        pass
+
+    # A call expression on this line calls a function, class or native
+    def on_call(self, callee: LoxCallable, arguments: list[object], line: int) -> None:
+        pass
+
+    def on_return(self, callee: LoxCallable, value: object) -> None:
+        pass
+
+    # A runtime error leaves a call, then the program when the callee is None
+    def on_exception(
+        self, error: InterpreterRuntimeError, callee: Optional[LoxCallable]
+    ) -> None:
+        pass
+
+
+# The events of calls, which only hooks overriding one of them are traced for
+CALL_EVENTS: tuple[str, ...] = ("on_call", "on_return", "on_exception")
+
+
+def traces_calls(hook: Hook) -> bool:
+    return any(
+        getattr(type(hook), event) is not getattr(Hook, event) for event in CALL_EVENTS
+    )
+
+
+# The traced dispatch. While there are hooks the interpreter's execute and call
+# methods are shadowed by the ones below, and removing the last hook puts the
+# interpreter's own back, so that runs without hooks do not check for them.
+# Calls are only shadowed while a hook wants their events.
+class Hooks:
+    def __init__(self, interpreter) -> None:
+        self.interpreter = interpreter
+        self.hooks: list[Hook] = []
+        self.lines: dict[Stmt, int] = interpreter.lines
+        self.execute_statement = interpreter.execute
+        self.evaluate_node = interpreter.evaluate
+        interpreter.execute = self.execute
+        self.calls: bool = False
+        self.tail_calls: set[Return] = interpreter.tail_calls
+        self.stackless = interpreter.stackless
+        if self.stackless is not None:
+            self.frame = self.stackless.frame
+            self.stackless.frame = self.stackless_frame
+            # Call free nodes are handed to evaluate, statements included
+            interpreter.evaluate = self.evaluate
+
+    def add(self, hook: Hook) -> None:
+        self.hooks.append(hook)
+        if not self.calls and traces_calls(hook):
+            self.trace_calls()
+
+    # Returns whether hooks are left, the dispatch being restored otherwise
+    def remove(self, hook: Hook) -> bool:
+        self.hooks.remove(hook)
+        if self.calls and not any(map(traces_calls, self.hooks)):
+            self.untrace_calls()
+        if self.hooks:
+            return True
+        interpreter = self.interpreter
+        del interpreter.execute
+        if self.stackless is not None:
+            del self.stackless.frame, interpreter.evaluate
+        return False
+
+    # Every call gets its call and return events: tail calls, including those
+    # resolved from now on, run as ordinary ones while calls are traced
+    def trace_calls(self) -> None:
+        interpreter = self.interpreter
+        self.calls = True
+        self.tail_calls = interpreter.tail_calls
+        interpreter.tail_calls = set()
+        interpreter.tail_call = self.tail_calls.add
+        interpreter.visit_call_expr = self.call
+
+    def untrace_calls(self) -> None:
+        interpreter = self.interpreter
+        self.calls = False
+        del interpreter.visit_call_expr, interpreter.tail_call
+        interpreter.tail_calls = self.tail_calls
+
+    def line(self, line: int) -> None:
+        for hook in self.hooks:
+            hook.on_line(line)
+
+    def enter(self, callee: LoxCallable, arguments: list[object], line: int) -> None:
+        for hook in self.hooks:
+            hook.on_call(callee, arguments, line)
+
+    def leave(self, callee: LoxCallable, value: object) -> None:
+        for hook in self.hooks:
+            hook.on_return(callee, value)
+
+    def exception(
+        self, error: InterpreterRuntimeError, callee: Optional[LoxCallable]
+    ) -> None:
+        for hook in self.hooks:
+            hook.on_exception(error, callee)
+
+    def execute(self, stmt: Stmt) -> None:
+        line: Optional[int] = self.lines.get(stmt)
+        if line is not None:
+            self.line(line)
+        self.execute_statement(stmt)
+
+    def evaluate(self, node: Expr | Stmt) -> object:
+        line: Optional[int] = self.lines.get(node)
+        if line is not None:
+            self.line(line)
+        return self.evaluate_node(node)
+
+    def call(self, expr: Call) -> object:
+        callee, arguments = self.interpreter.prepare_call(expr)
+        self.enter(callee, arguments, expr.paren.line)
+        try:
+            value: object = self.interpreter.call(callee, arguments, expr.paren)
+        except InterpreterRuntimeError as error:
+            self.exception(error, callee)
+            raise
+        self.leave(callee, value)
+        return value
+
+    def stackless_frame(self, node: Expr | Stmt):
+        line: Optional[int] = self.lines.get(node)
+        if line is not None:
+            self.line(line)
+        if self.calls and isinstance(node, Call):
+            return self.stackless_call(node)
+        return self.frame(node)
+
+    def stackless_call(self, expr: Call):
+        assert self.stackless is not None
+        callee, arguments = yield self.stackless.arguments(expr)
+        self.enter(callee, arguments, expr.paren.line)
+        try:
+            value = yield self.stackless.invoke(callee, arguments, expr.paren)
+        except InterpreterRuntimeError as error:
+            self.exception(error, callee)
+            raise
+        self.leave(callee, value)
+        return value
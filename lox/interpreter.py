@@ -1,5 +1,20 @@
+import os
+import sys
+import weakref
+
 import lox.stmt as stmt
-from lox.stmt import Block, Class, Expression, Print, Return, Stmt, Var, If, While
+from lox.stmt import (
+    Block,
+    Class,
+    Expression,
+    Import,
+    Print,
+    Return,
+    Stmt,
+    Var,
+    If,
+    While,
+)
 import lox.expr as expr
 from lox.expr import (
     Assign,
@@ -13,53 +28,235 @@ from lox.expr import (
     Literal,
     Variable,
 )
+import lox.errors
 from lox.tokens import Token
 from lox.token_types import TokenType
-from lox.runtime_error import InterpreterRuntimeError
+from lox.runtime_error import InterpreterRuntimeError, NativeError
 from lox.return_value import ReturnValue
-from lox.environment import Environment
+from lox.tail_call import TailCall
+from lox.environment import UNDEFINED, Environment, GlobalEnvironment
 from lox.lox_callable import LoxCallable
 from lox.lox_function import LoxFunction
 from lox.lox_class import LoxClass
 from lox.lox_instance import LoxInstance
+from lox.lox_module import LoxModule
+from lox.counted_loop import CountedLoop
+from lox.function_layout import FunctionLayout
+from lox.memo_cache import MemoCache
+from lox.type_feedback import (
+    GenericBinary,
+    GenericUnary,
+    NumberBinary,
+    NumberUnary,
+    StringBinary,
+    TypeFeedback,
+)
 
-from typing import NoReturn, Optional
-import time
+from typing import TYPE_CHECKING, NoReturn, Optional
 
+if TYPE_CHECKING:
+    from lox.fibers import Fibers
+    from lox.files import LoxFile
+    from lox.hooks import Hook, Hooks
+    from lox.modules import Modules
+    from lox.parallel import Threads
+    from lox.stackless import Stackless
+    from lox.transpiler import PythonBackend
 
-class Interpreter(stmt.Visitor, expr.Visitor):
-    def __init__(self) -> None:
-        self.globals: Environment = Environment()
-        self.environment: Environment = self.globals
-        self.locals: dict[Expr, int] = dict()
 
-        class NativeClock(LoxCallable):
-            def arity(self) -> int:
-                return 0
+DEFAULT_MAX_DEPTH: int = 50_000
+# Deeply nested code and Lox calls recurse in Python. Since 3.11, Python
+# functions calling Python functions take no native stack, but calls going
+# through C, such as map(), any(), __call__ and compile(), still do. On the
+# deepest such paths, nested calls under --compile and --memoize, a frame was
+# measured to take under 150 bytes of it on average: the limit allows 256.
+NATIVE_STACK_PER_FRAME: int = 256
+MAX_RECURSION_LIMIT: int = 20_000
+# Threads get 2 MB of stack when the process has no limit
+UNLIMITED_STACK: int = 2 << 20
 
-            def call(self, interpreter: Interpreter, arguments: list[object]) -> float:
-                return time.time()
 
-            def __str__(self) -> str:
-                return "<native fn>"
+def recursion_limit() -> int:
+    try:
+        import resource
+    except ImportError:
+        # Python's default is safe on any stack it runs on
+        return sys.getrecursionlimit()
+    stack: int = resource.getrlimit(resource.RLIMIT_STACK)[0]
+    if stack == resource.RLIM_INFINITY:
+        stack = UNLIMITED_STACK
+    limit: int = min(MAX_RECURSION_LIMIT, stack // NATIVE_STACK_PER_FRAME)
+    return max(sys.getrecursionlimit(), limit)
 
-        self.globals.define("clock", NativeClock())
+
+RECURSION_LIMIT: int = recursion_limit()
+
+
+class Interpreter(stmt.Visitor, expr.Visitor):
+    def __init__(
+        self,
+        stackless: bool = False,
+        max_depth: int = DEFAULT_MAX_DEPTH,
+        memo_size: int = 0,
+        fibers: bool = False,
+        compiled: bool = False,
+    ) -> None:
+        self.globals: GlobalEnvironment = GlobalEnvironment()
+        self.environment: Environment = self.globals
+        self.frame: list[object] = []
+        self.top_level_size: int = 0
+        self.locals: dict[Expr, int] = dict()
+        self.slots: dict[Expr | Stmt, int] = dict()
+        self.layouts: dict[stmt.Function, FunctionLayout] = dict()
+        self.global_slots: dict[Expr, int] = dict()
+        self.tail_calls: set[Return] = set()
+        self.counted_loops: dict[Block, CountedLoop] = dict()
+        self.inline_blocks: set[Block] = set()
+        self.type_feedback: TypeFeedback = TypeFeedback()
+        # Pure functions get a call cache of this size, if it is not zero
+        self.memo_size: int = memo_size
+        self.pure_functions: set[stmt.Function] = set()
+        self.lines: dict[Stmt, int] = dict()
+        # Paths of the modules imported, relative ones being found from directory
+        self.imports: dict[Import, str] = dict()
+        self.directory: str = ""
+        # Only set once a module has been imported
+        self.modules: Optional["Modules"] = None
+        # Only set while hooks are registered, see add_hook
+        self.hooks: Optional["Hooks"] = None
+        # Only set once a thread has been started, see lox.parallel
+        self.threads: Optional["Threads"] = None
+        # Files opened for writing, whose buffers a program ending leaves unwritten
+        self.writers: weakref.WeakSet["LoxFile"] = weakref.WeakSet()
+        self.stackless: Optional["Stackless"] = None
+        # Tasks suspend in the middle of calls, which needs the stackless engine
+        if stackless or fibers:
+            from lox.stackless import Stackless
+
+            self.stackless = Stackless(self, max_depth)
+        self.fibers: Optional["Fibers"] = None
+        if fibers:
+            from lox.fibers import Fibers
+
+            self.fibers = Fibers(self)
+        # Programs compiled to Python, except where calls are not plain Python
+        # ones: bounded by max_depth, suspended by fibers or cached by memo_size
+        self.backend: Optional["PythonBackend"] = None
+        if compiled and self.stackless is None and not memo_size:
+            from lox.transpiler import PythonBackend
+
+            self.backend = PythonBackend(self)
+
+    def reset(self) -> None:
+        # Forget run time state but keep the resolution tables, so that the
+        # statements resolved against this interpreter can run again
+        # In place, as the globals of the modules are in the same table
+        self.globals.table[:] = [UNDEFINED] * len(self.globals.table)
+        self.environment = self.globals
+        self.frame = []
+        if self.modules is not None:
+            self.modules.reset()
+        if self.stackless is not None:
+            self.stackless.depth = 0
+        if self.backend is not None:
+            self.backend.reset()
 
     def interpret(self, statements: list[Stmt]) -> None:
+        self.frame = [None] * self.top_level_size
+        statement: Optional[Stmt] = None
         try:
+            if self.fibers is not None:
+                return self.fibers.run(statements)
+            # Hooks see statements run, which only the tree walk can show them
+            if (
+                self.backend is not None
+                and self.hooks is None
+                and self.backend.run(statements)
+            ):
+                return
             for statement in statements:
-                self.execute(statement)
+                if self.stackless is not None:
+                    self.stackless.run(statement)
+                else:
+                    self.execute(statement)
+        except RecursionError:
+            # Python ran out of stack, in deep calls or deeply nested code
+            line: int = 0 if statement is None else self.lines.get(statement, 0)
+            self.runtime_error(
+                InterpreterRuntimeError(
+                    Token(TokenType.EOF, "", None, line), "Stack overflow"
+                )
+            )
         except InterpreterRuntimeError as error:
-            import lox.__main__ as __main__
+            self.runtime_error(error)
+        finally:
+            # A program ends once the threads it started are done
+            if self.threads is not None:
+                self.threads.finish()
+            if self.writers:
+                from lox.files import flush_writers
+
+                flush_writers(self)
 
-            __main__.runtime_error(error)
+    def runtime_error(self, error: InterpreterRuntimeError) -> None:
+        if self.hooks is not None:
+            self.hooks.exception(error, None)
+        lox.errors.runtime_error(error)
 
     def execute(self, stmt: Stmt) -> None:
         stmt.accept(self)
 
+    def find_pure_functions(self, statements: list[Stmt]) -> None:
+        from lox.purity import PurityAnalysis
+
+        self.pure_functions |= PurityAnalysis().pure_functions(statements)
+
+    def add_hook(self, hook: "Hook") -> None:
+        # The traced dispatch is only swapped in once there is a hook to call
+        if self.hooks is None:
+            from lox.hooks import Hooks
+
+            self.hooks = Hooks(self)
+        self.hooks.add(hook)
+
+    def remove_hook(self, hook: "Hook") -> None:
+        assert self.hooks is not None
+        if not self.hooks.remove(hook):
+            self.hooks = None
+
+    def statement_lines(self, lines: dict[Stmt, int]) -> None:
+        self.lines.update(lines)
+
     def resolve(self, expr: Expr, depth: int) -> None:
         self.locals[expr] = depth
 
+    def resolve_global(self, expr: Expr, name: Token) -> None:
+        self.global_slots[expr] = self.globals.slot(name.lexeme)
+
+    def resolve_import(self, stmt: Import) -> None:
+        path: str = os.path.join(self.directory, stmt.path.literal)
+        self.imports[stmt] = os.path.abspath(path)
+
+    def resolve_slot(self, node: Expr | Stmt, slot: int) -> None:
+        self.slots[node] = slot
+
+    def function_layout(self, function: stmt.Function, layout: FunctionLayout) -> None:
+        if self.threads is not None:
+            layout.share()
+        self.layouts[function] = layout
+
+    def top_level_frame(self, size: int) -> None:
+        self.top_level_size = size
+
+    def tail_call(self, stmt: Return) -> None:
+        self.tail_calls.add(stmt)
+
+    def counted_loop(self, stmt: Block, loop: CountedLoop) -> None:
+        self.counted_loops[stmt] = loop
+
+    def inline_block(self, stmt: Block) -> None:
+        self.inline_blocks.add(stmt)
+
     def execute_block(self, statements: list[Stmt], environment: Environment) -> None:
         previous: Environment = self.environment
         try:
@@ -70,7 +267,34 @@ class Interpreter(stmt.Visitor, expr.Visitor):
             self.environment = previous
 
     def visit_block_stmt(self, stmt: Block) -> None:
-        self.execute_block(stmt.statements, Environment(self.environment))
+        if stmt not in self.inline_blocks:
+            return self.execute_block(stmt.statements, Environment(self.environment))
+        loop: Optional[CountedLoop] = self.counted_loops.get(stmt)
+        if loop is not None:
+            return self.execute_counted_loop(loop)
+        for statement in stmt.statements:
+            self.execute(statement)
+
+    def execute_counted_loop(self, loop: CountedLoop) -> None:
+        counter = self.evaluate(loop.initializer)
+        self.define_variable(loop.declaration, loop.name, counter)
+        slot: Optional[int] = self.slots.get(loop.declaration)
+        if type(counter) is float and slot is not None:
+            frame: list[object] = self.frame
+            compare, step, body = loop.compare, loop.step, loop.body
+            while True:
+                limit = self.evaluate(loop.limit)
+                if type(limit) is not float:
+                    # Raises the same error as the generic comparison
+                    self.binary_operation(loop.condition, counter, limit)
+                if not compare(counter, limit):
+                    return
+                self.execute(body)
+                counter += step
+                frame[slot] = counter
+        while self.is_truthy(self.evaluate(loop.condition)):
+            self.execute(loop.body)
+            self.evaluate(loop.increment)
 
     def visit_class_stmt(self, stmt: Class) -> None:
         superclass = None
@@ -80,14 +304,17 @@ class Interpreter(stmt.Visitor, expr.Visitor):
                 raise InterpreterRuntimeError(
                     stmt.superclass.name, "Superclass must be a class"
                 )
-        self.environment.define(stmt.name.lexeme, None)
+        self.define_variable(stmt, stmt.name, None)
         if superclass is not None:
             self.environment = Environment(self.environment)
             self.environment.define("super", superclass)
         methods: dict[str, LoxFunction] = {}
         for method in stmt.methods:
             function = LoxFunction(
-                method, self.environment, method.name.lexeme == "init"
+                method,
+                self.environment,
+                method.name.lexeme == "init",
+                self.layouts[method],
             )
             methods[method.name.lexeme] = function
         klass = LoxClass(stmt.name.lexeme, superclass, methods)
@@ -95,14 +322,20 @@ class Interpreter(stmt.Visitor, expr.Visitor):
             enclosing = self.environment.enclosing
             assert enclosing is not None
             self.environment = enclosing
-        self.environment.assign(stmt.name, klass)
+        self.define_variable(stmt, stmt.name, klass)
 
     def visit_expression_stmt(self, stmt: Expression) -> None:
         self.evaluate(stmt.expression)
 
     def visit_function_stmt(self, stmt: stmt.Function) -> None:
-        function: LoxFunction = LoxFunction(stmt, self.environment, False)
-        self.environment.define(stmt.name.lexeme, function)
+        function: LoxFunction = LoxFunction(
+            stmt,
+            self.environment,
+            False,
+            self.layouts[stmt],
+            MemoCache(self.memo_size) if stmt in self.pure_functions else None,
+        )
+        self.define_variable(stmt, stmt.name, function)
 
     def visit_if_stmt(self, stmt: If) -> None:
         if self.is_truthy(self.evaluate(stmt.condition)):
@@ -115,6 +348,13 @@ class Interpreter(stmt.Visitor, expr.Visitor):
         print(self.stringify(value))
 
     def visit_return_stmt(self, stmt: Return) -> NoReturn:
+        if stmt in self.tail_calls:
+            assert isinstance(stmt.value, expr.Call)
+            callee, arguments = self.prepare_call(stmt.value)
+            # Let the calling LoxFunction run the callee in its own loop
+            if isinstance(callee, LoxFunction):
+                raise TailCall(callee, arguments)
+            raise ReturnValue(self.call(callee, arguments, stmt.value.paren))
         value: Optional[object] = (
             self.evaluate(stmt.value) if stmt.value is not None else None
         )
@@ -124,34 +364,57 @@ class Interpreter(stmt.Visitor, expr.Visitor):
         value: Optional[object] = (
             self.evaluate(stmt.initializer) if stmt.initializer is not None else None
         )
-        self.environment.define(stmt.name.lexeme, value)
+        self.define_variable(stmt, stmt.name, value)
+
+    def define_variable(self, declaration: Stmt, name: Token, value: object) -> None:
+        slot: Optional[int] = self.slots.get(declaration)
+        if slot is not None:
+            self.frame[slot] = value
+        else:
+            self.environment.define(name.lexeme, value)
 
     def visit_while_stmt(self, stmt: While) -> None:
         while self.is_truthy(self.evaluate(stmt.condition)):
             self.execute(stmt.body)
 
+    def visit_import_stmt(self, stmt: Import) -> None:
+        if self.modules is None:
+            from lox.modules import Modules
+
+            self.modules = Modules(self)
+        module: LoxModule = self.modules.load(stmt, self.imports[stmt])
+        self.define_variable(stmt, stmt.name, module)
+
     def visit_assign_expr(self, expr: Assign):
         value = self.evaluate(expr.value)
-        distance = self.locals.get(expr)
-        if distance is not None:
-            self.environment.assign_at(distance, expr.name, value)
-        else:
-            self.globals.assign(expr.name, value)
+        self.assign_variable(expr, value)
         return value
 
+    def assign_variable(self, expr: Assign, value: object) -> None:
+        slot: Optional[int] = self.slots.get(expr)
+        if slot is not None:
+            self.frame[slot] = value
+            return
+        slot = self.global_slots.get(expr)
+        if slot is not None:
+            self.globals.assign_slot(slot, expr.name, value)
+        else:
+            self.environment.assign_at(self.locals[expr], expr.name, value)
+
     def visit_literal_expr(self, expr: Literal) -> object:
         return expr.value
 
     def visit_logical_expr(self, expr: expr.Logical):
         left = self.evaluate(expr.left)
-        if expr.operator.type == TokenType.OR:
-            if self.is_truthy(left):
-                return left
-        else:
-            if not self.is_truthy(left):
-                return left
+        if self.short_circuits(expr, left):
+            return left
         return self.evaluate(expr.right)
 
+    def short_circuits(self, expr: expr.Logical, left: object) -> bool:
+        if expr.operator.type == TokenType.OR:
+            return self.is_truthy(left)
+        return not self.is_truthy(left)
+
     def visit_set_expr(self, expr: Set):
         instance: object = self.evaluate(expr.instance)
         if not isinstance(instance, LoxInstance):
@@ -181,29 +444,52 @@ class Interpreter(stmt.Visitor, expr.Visitor):
 
     def visit_unary_expr(self, expr: Unary):
         right = self.evaluate(expr.right)
+        self.type_feedback.unary(expr, right)
+        return self.unary_operation(expr, right)
+
+    def visit_number_unary_expr(self, expr: NumberUnary):
+        right = self.evaluate(expr.right)
+        if type(right) is float:
+            return -right
+        self.type_feedback.deoptimize(expr)
+        return self.unary_operation(expr, right)
+
+    def visit_generic_unary_expr(self, expr: GenericUnary):
+        return self.unary_operation(expr, self.evaluate(expr.right))
+
+    def unary_operation(self, expr: Unary, right: object):
         match expr.operator.type:
             case TokenType.BANG:
                 return not self.is_truthy(right)
             case TokenType.MINUS:
-                self.check_number_operand(expr.operator, right)
-                return -right
+                if type(right) is float:
+                    return -right
+                return self.vector_negation(expr.operator, right)
         # Unreachable
         return
 
     def visit_variable_expr(self, expr: Variable) -> object:
-        return self.lookup_variable(expr.name, expr)
+        # Frame slots first, then globals: captured variables are the rarest
+        slot: Optional[int] = self.slots.get(expr)
+        if slot is not None:
+            return self.frame[slot]
+        slot = self.global_slots.get(expr)
+        if slot is not None:
+            value: object = self.globals.table[slot]
+            if value is not UNDEFINED:
+                return value
+            return self.globals.get_slot(slot, expr.name)
+        return self.environment.get_at(self.locals[expr], expr.name.lexeme)
 
     def lookup_variable(self, name: Token, expr: Expr) -> object:
+        slot: Optional[int] = self.slots.get(expr)
+        if slot is not None:
+            return self.frame[slot]
         distance: Optional[int] = self.locals.get(expr)
         if distance is not None:
             return self.environment.get_at(distance, name.lexeme)
         else:
-            return self.globals.get(name)
-
-    def check_number_operand(self, operator: Token, operand: object) -> None:
-        if type(operand) is float:
-            return
-        raise InterpreterRuntimeError(operator, "Operand must be a number")
+            return self.globals.get_slot(self.global_slots[expr], name)
 
     def is_truthy(self, obj: object) -> bool:
         if obj is None:
@@ -218,7 +504,31 @@ class Interpreter(stmt.Visitor, expr.Visitor):
     def visit_binary_expr(self, expr: Binary):
         left = self.evaluate(expr.left)
         right = self.evaluate(expr.right)
+        self.type_feedback.binary(expr, left, right)
+        return self.binary_operation(expr, left, right)
 
+    def visit_number_binary_expr(self, expr: NumberBinary):
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if type(left) is float and type(right) is float:
+            return expr.operation(left, right)
+        self.type_feedback.deoptimize(expr)
+        return self.binary_operation(expr, left, right)
+
+    def visit_string_binary_expr(self, expr: StringBinary):
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if type(left) is str and type(right) is str:
+            return expr.operation(left, right)
+        self.type_feedback.deoptimize(expr)
+        return self.binary_operation(expr, left, right)
+
+    def visit_generic_binary_expr(self, expr: GenericBinary):
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        return self.binary_operation(expr, left, right)
+
+    def binary_operation(self, expr: Binary, left: object, right: object):
         match expr.operator.type:
             case TokenType.BANG_EQUAL:
                 return not self.is_equal(left, right)
@@ -237,34 +547,86 @@ class Interpreter(stmt.Visitor, expr.Visitor):
                 self.check_number_operands(expr.operator, right, left)
                 return left <= right
             case TokenType.MINUS:
-                self.check_number_operands(expr.operator, right, left)
-                return left - right
+                if type(left) is float and type(right) is float:
+                    return left - right
+                return self.vector_operation(
+                    expr.operator, left, right, "Operands must be numbers"
+                )
             case TokenType.PLUS:
                 if type(left) is str and type(right) is str:
                     return left + right
                 if type(left) is float and type(right) is float:
                     return left + right
-                raise InterpreterRuntimeError(
-                    expr.operator, "Operands must be a two numbers or two strings"
+                return self.vector_operation(
+                    expr.operator,
+                    left,
+                    right,
+                    "Operands must be a two numbers or two strings",
                 )
             case TokenType.SLASH:
-                self.check_number_operands(expr.operator, right, left)
-                return left / right
+                if type(left) is float and type(right) is float:
+                    return left / right
+                return self.vector_operation(
+                    expr.operator, left, right, "Operands must be numbers"
+                )
             case TokenType.STAR:
-                self.check_number_operands(expr.operator, right, left)
-                return left * right
+                if type(left) is float and type(right) is float:
+                    return left * right
+                return self.vector_operation(
+                    expr.operator, left, right, "Operands must be numbers"
+                )
 
         # Unreachable
         return
 
+    # Arithmetic on vectors, tried once the operands turned out not to be numbers.
+    # Only the vector natives create vectors, so there are none to find until
+    # they have been loaded.
+    def vector_operation(
+        self, operator: Token, left: object, right: object, message: str
+    ) -> object:
+        vector = sys.modules.get("lox.vector")
+        if vector is None or not (
+            isinstance(left, vector.Vector) or isinstance(right, vector.Vector)
+        ):
+            raise InterpreterRuntimeError(operator, message)
+        try:
+            return vector.elementwise(operator.type, left, right)
+        except NativeError as error:
+            raise InterpreterRuntimeError(operator, str(error))
+
+    def vector_negation(self, operator: Token, right: object) -> object:
+        vector = sys.modules.get("lox.vector")
+        if vector is None or not isinstance(right, vector.Vector):
+            raise InterpreterRuntimeError(operator, "Operand must be a number")
+        return vector.negate(right)
+
     def visit_call_expr(self, expr: expr.Call) -> object:
+        function, arguments = self.prepare_call(expr)
+        # Same as call, saving a Python call on the hottest path
+        try:
+            return function.call(self, arguments)
+        except NativeError as error:
+            raise InterpreterRuntimeError(expr.paren, str(error))
+
+    def call(
+        self, function: LoxCallable, arguments: list[object], paren: Token
+    ) -> object:
+        try:
+            return function.call(self, arguments)
+        except NativeError as error:
+            raise InterpreterRuntimeError(paren, str(error))
+
+    def prepare_call(self, expr: expr.Call) -> tuple[LoxCallable, list[object]]:
         callee: object = self.evaluate(expr.callee)
         arguments: list[object] = []
         for argument in expr.arguments:
             arguments.append(self.evaluate(argument))
+        return self.check_call(expr, callee, arguments), arguments
 
-        from lox.lox_callable import LoxCallable
-
+    def check_call(
+        self, expr: expr.Call, callee: object, arguments: list[object]
+    ) -> LoxCallable:
         if not isinstance(callee, LoxCallable):
             raise InterpreterRuntimeError(
                 expr.paren, "Can only call functions and classes"
@@ -275,12 +637,16 @@ class Interpreter(stmt.Visitor, expr.Visitor):
                 expr.paren,
                 f"Expected {function.arity()} arguments but got {len(arguments)}",
             )
-        return function.call(self, arguments)
+        return function
 
     def visit_get_expr(self, expr: expr.Get) -> object:
-        instance: object = self.evaluate(expr.instance)
+        return self.get_property(expr, self.evaluate(expr.instance))
+
+    def get_property(self, expr: expr.Get, instance: object) -> object:
         if isinstance(instance, LoxInstance):
             return instance.get(expr.name)
+        if isinstance(instance, LoxModule):
+            return instance.get(expr.name)
         raise InterpreterRuntimeError(expr.name, "Only instances have properties")
 
     def check_number_operands(
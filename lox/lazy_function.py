@@ -0,0 +1,102 @@
+import lox.errors
+from lox.function_layout import FunctionLayout
+from lox.runtime_error import InterpreterRuntimeError
+from lox.stmt import Function, Stmt
+from lox.token_types import TokenType
+from lox.tokens import Token
+
+from typing import Optional
+
+
+# A top level function whose body was only brace matched by the parser. The
+# body is parsed and resolved the first time it is read, normally by the first
+# call, after which the node becomes a plain Function. Nothing in the enclosing
+# scope can be captured at the top level, so resolving the body later gives the
+# same result as resolving it in place would have.
+class LazyFunction(Function):
+    def __init__(self, name: Token, params: list[Token], tokens: list[Token]) -> None:
+        self.name = name
+        self.params = params
+        # The tokens between the braces, ended by an EOF
+        self.tokens: list[Token] = tokens
+        # Parsed up front by strict parsing, otherwise when first read
+        self.statements: Optional[list[Stmt]] = None
+        self.lines: dict[Stmt, int] = dict()
+        # Filled in place once the body is resolved, as calls hold on to it
+        self.layout: FunctionLayout = FunctionLayout()
+        # What the body is resolved into, set when the declaration is
+        self.interpreter = None
+        self.failed: bool = False
+
+    @property
+    def body(self) -> list[Stmt]:
+        if self.failed or not self.parse():
+            raise self.error()
+        return self.resolve()
+
+    # Once reported, the errors of a body fail each call to it
+    def error(self) -> InterpreterRuntimeError:
+        self.failed = True
+        return InterpreterRuntimeError(
+            self.name, f"Function {self.name.lexeme} has errors"
+        )
+
+    # Reports the syntax errors of the body, if any, and returns whether it had
+    # none
+    def parse(self) -> bool:
+        if self.statements is not None:
+            return True
+        from lox.parser import Parser
+
+        had_error: bool = lox.errors.had_error
+        lox.errors.had_error = False
+        parser = Parser(self.tokens)
+        statements: list[Stmt] = parser.parse()
+        failed: bool = lox.errors.had_error
+        lox.errors.had_error = had_error or failed
+        if failed:
+            return False
+        self.statements = statements
+        self.lines = parser.lines
+        self.tokens = []
+        return True
+
+    def resolve(self) -> list[Stmt]:
+        from lox.resolver import FunctionType, Resolver
+
+        assert self.statements is not None and self.interpreter is not None
+        interpreter = self.interpreter
+        statements: list[Stmt] = self.statements
+        had_error: bool = lox.errors.had_error
+        lox.errors.had_error = False
+        # Resolved as a plain function, which is what it is from now on
+        self.__class__ = Function
+        self.body = statements
+        Resolver(interpreter).resolve_function(
+            self, FunctionType.FUNCTION, self.layout
+        )
+        failed: bool = lox.errors.had_error
+        lox.errors.had_error = had_error or failed
+        if failed:
+            del self.body
+            self.__class__ = LazyFunction
+            raise self.error()
+        interpreter.statement_lines(self.lines)
+        return statements
+
+
+# The index just past the brace closing the one before start, or None when
+# the tokens end first
+def matching_brace(tokens: list[Token], start: int) -> Optional[int]:
+    depth: int = 1
+    index: int = start
+    while tokens[index].type != TokenType.EOF:
+        match tokens[index].type:
+            case TokenType.LEFT_BRACE:
+                depth += 1
+            case TokenType.RIGHT_BRACE:
+                depth -= 1
+                if depth == 0:
+                    return index + 1
+        index += 1
+    return None
@@ -8,6 +8,12 @@ class LoxClass(LoxCallable):
         self.name: str = name
         self.superclass: LoxClass | None = superclass
         self.methods: dict[str, LoxFunction] = methods
+        # Methods never change once the class is defined, so construction
+        # looks up the initializer and its arity only once
+        self.initializer: Optional[LoxFunction] = self.find_method("init")
+        self.init_arity: int = (
+            0 if self.initializer is None else self.initializer.arity()
+        )
 
     def __str__(self) -> str:
         return self.name
@@ -22,11 +28,10 @@ class LoxClass(LoxCallable):
         from lox.lox_instance import LoxInstance
 
         instance = LoxInstance(self)
-        initializer = self.find_method("init")
-        if initializer is not None:
-            initializer.bind(instance).call(interpreter, arguments)
+        if self.initializer is not None:
+            # Initializers are never memoised, so they can run directly
+            self.initializer.bind(instance).run(interpreter, arguments)
         return instance
 
     def arity(self) -> int:
-        initializer = self.find_method("init")
-        return 0 if initializer is None else initializer.arity()
+        return self.init_arity
@@ -2,17 +2,28 @@ from lox.lox_callable import LoxCallable
 from lox.environment import Environment
 import lox.stmt as stmt
 from lox.return_value import ReturnValue
+from lox.tail_call import TailCall
+from lox.function_layout import FunctionLayout
+from lox.memo_cache import MemoCache
 
 from typing import Optional
 
 
 class LoxFunction(LoxCallable):
     def __init__(
-        self, declaration: stmt.Function, closure: Environment, is_initializer: bool
+        self,
+        declaration: stmt.Function,
+        closure: Environment,
+        is_initializer: bool,
+        layout: FunctionLayout,
+        memo: Optional[MemoCache] = None,
     ) -> None:
         self.closure: Environment = closure
         self.declaration: stmt.Function = declaration
         self.is_initializer: bool = is_initializer
+        self.layout: FunctionLayout = layout
+        # Only set on functions found to be pure
+        self.memo: Optional[MemoCache] = memo
 
     def __str__(self) -> str:
         return f"<fn {self.declaration.name.lexeme}>"
@@ -23,17 +34,56 @@ class LoxFunction(LoxCallable):
     def bind(self, instance) -> "LoxFunction":
         environment = Environment(self.closure)
         environment.define("this", instance)
-        return LoxFunction(self.declaration, environment, self.is_initializer)
+        return LoxFunction(
+            self.declaration, environment, self.is_initializer, self.layout
+        )
+
+    def enter(self, arguments: list[object]) -> tuple[Environment, list[object]]:
+        layout: FunctionLayout = self.layout
+        free_frames: list[list[object]] = layout.free_frames
+        frame: list[object] = (
+            free_frames.pop() if free_frames else [None] * layout.frame_size
+        )
+        if layout.itself is not None:
+            frame[layout.itself] = self
+        environment: Environment = self.closure
+        if layout.environment:
+            environment = Environment(environment)
+        for param, slot, arg in zip(self.declaration.params, layout.params, arguments):
+            if slot is None:
+                environment.define(param.lexeme, arg)
+            else:
+                frame[slot] = arg
+        return environment, frame
 
     def call(self, interpreter, arguments: list[object]) -> Optional[object]:
-        environment: Environment = Environment(self.closure)
-        for param, arg in zip(self.declaration.params, arguments):
-            environment.define(param.lexeme, arg)
-        try:
-            interpreter.execute_block(self.declaration.body, environment)
-        except ReturnValue as return_value:
-            if self.is_initializer:
-                return self.closure.get_at(0, "this")
-            return return_value.value
-        if self.is_initializer:
-            return self.closure.get_at(0, "this")
+        if self.memo is not None:
+            return self.memo.call(arguments, lambda: self.run(interpreter, arguments))
+        return self.run(interpreter, arguments)
+
+    def run(self, interpreter, arguments: list[object]) -> Optional[object]:
+        function: LoxFunction = self
+        # Calls in tail position come back here instead of nesting
+        while True:
+            # Read before entering, as a lazily parsed body is laid out on reading
+            body: list[stmt.Stmt] = function.declaration.body
+            environment, frame = function.enter(arguments)
+            # Taken now, as a tail call replaces the function before finally runs
+            layout: FunctionLayout = function.layout
+            previous_frame: list[object] = interpreter.frame
+            interpreter.frame = frame
+            try:
+                interpreter.execute_block(body, environment)
+            except TailCall as tail_call:
+                function, arguments = tail_call.function, tail_call.arguments
+                continue
+            except ReturnValue as return_value:
+                if function.is_initializer:
+                    return function.closure.get_at(0, "this")
+                return return_value.value
+            finally:
+                interpreter.frame = previous_frame
+                layout.release(frame)
+            if function.is_initializer:
+                return function.closure.get_at(0, "this")
+            return None
@@ -0,0 +1,22 @@
+from typing import Optional
+from lox.environment import UNDEFINED, GlobalEnvironment
+from lox.runtime_error import InterpreterRuntimeError
+from lox.tokens import Token
+
+
+# The value an import binds: the globals of the module, read as its properties
+class LoxModule:
+    def __init__(self, name: str, namespace: GlobalEnvironment) -> None:
+        self.name: str = name
+        self.namespace: GlobalEnvironment = namespace
+
+    def __str__(self) -> str:
+        return f"<module {self.name}>"
+
+    def get(self, name: Token) -> object:
+        slot: Optional[int] = self.namespace.slots.get(name.lexeme)
+        if slot is not None:
+            value: object = self.namespace.table[slot]
+            if value is not UNDEFINED:
+                return value
+        raise InterpreterRuntimeError(name, f"Undefined property {name.lexeme}")
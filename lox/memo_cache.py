@@ -0,0 +1,63 @@
+import math
+import threading
+from collections import OrderedDict
+
+from typing import Callable, Hashable, Optional
+
+# Number of results kept per function by default
+DEFAULT_MEMO_SIZE: int = 10_000
+
+# Returned by get for keys without a result, as nil is a valid one
+MISSING: object = object()
+
+
+# Call results of a pure function by argument values, the least recently used
+# being dropped once the cache is full. Threads share it, and take the lock to
+# use it, though not for the calls computing results.
+class MemoCache:
+    def __init__(self, size: int) -> None:
+        self.size: int = size
+        self.results: OrderedDict[Hashable, object] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def call(self, arguments: list[object], compute: Callable[[], object]) -> object:
+        key: Optional[tuple[Hashable, ...]] = memo_key(arguments)
+        if key is None:
+            return compute()
+        value: object = self.get(key)
+        if value is MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def get(self, key: Hashable) -> object:
+        with self.lock:
+            value: object = self.results.get(key, MISSING)
+            if value is not MISSING:
+                self.results.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: object) -> None:
+        with self.lock:
+            self.results[key] = value
+            if len(self.results) > self.size:
+                self.results.popitem(last=False)
+
+
+# Only numbers, strings, booleans and nil can be keys. Python equates True with
+# 1.0 and -0.0 with 0.0, which Lox tells apart, so those are tagged.
+def memo_key(arguments: list[object]) -> Optional[tuple[Hashable, ...]]:
+    key: list[Hashable] = []
+    for argument in arguments:
+        kind = type(argument)
+        if kind is float:
+            key.append(
+                argument if argument else (float, math.copysign(1.0, argument))
+            )
+        elif kind is str or argument is None:
+            key.append(argument)
+        elif kind is bool:
+            key.append((bool, argument))
+        else:
+            return None
+    return tuple(key)
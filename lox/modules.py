@@ -0,0 +1,245 @@
+import atexit
+import contextlib
+import gc
+import os
+import pickle
+
+import lox.errors
+from lox.counted_loop import CountedLoop
+from lox.environment import GlobalEnvironment
+from lox.expr import Expr
+from lox.function_layout import FunctionLayout
+from lox.lox_module import LoxModule
+from lox.parser import Parser
+from lox.resolver import Resolver
+from lox.runtime_error import InterpreterRuntimeError
+from lox.scanner import Scanner
+from lox.stmt import Block, Function, Import, Return, Stmt
+from lox.tokens import Token
+
+from typing import Iterator, Optional
+
+# Resolved modules are pickled to this directory, next to their source
+CACHE_DIRECTORY: str = "__loxcache__"
+# Changed whenever the pickled form of a module changes
+CACHE_VERSION: int = 2
+
+# Modification time and size of a source file when it was read
+Stamp = tuple[int, int]
+
+
+# What resolving a module leaves in the interpreter, kept apart so that it can
+# be cached and then applied to any interpreter importing the module. The
+# resolver calls the same methods on it as on an interpreter. Interpreters share
+# the statements, which type feedback only specialises behind type checks that
+# hold for any of them, and get tables of their own, layouts included, as the
+# free frames in those are per interpreter.
+class Resolution:
+    def __init__(self, path: str, stamp: Stamp, statements: list[Stmt]) -> None:
+        self.path: str = path
+        self.stamp: Stamp = stamp
+        self.statements: list[Stmt] = statements
+        # Where the statements start, for the errors the resolver reports
+        self.lines: dict[Stmt, int] = dict()
+        self.locals: dict[Expr, int] = dict()
+        # Global names, given a slot by the module importing them
+        self.globals: dict[Expr, str] = dict()
+        self.slots: dict[Expr | Stmt, int] = dict()
+        self.layouts: dict[Function, FunctionLayout] = dict()
+        self.top_level_size: int = 0
+        self.tail_calls: list[Return] = []
+        self.counted_loops: dict[Block, CountedLoop] = dict()
+        self.inline_blocks: list[Block] = []
+        self.imports: list[Import] = []
+
+    def resolve(self, expr: Expr, depth: int) -> None:
+        self.locals[expr] = depth
+
+    def resolve_global(self, expr: Expr, name: Token) -> None:
+        self.globals[expr] = name.lexeme
+
+    def resolve_import(self, stmt: Import) -> None:
+        self.imports.append(stmt)
+
+    def resolve_slot(self, node: Expr | Stmt, slot: int) -> None:
+        self.slots[node] = slot
+
+    def function_layout(self, function: Function, layout: FunctionLayout) -> None:
+        self.layouts[function] = layout
+
+    def top_level_frame(self, size: int) -> None:
+        self.top_level_size = size
+
+    def tail_call(self, stmt: Return) -> None:
+        self.tail_calls.append(stmt)
+
+    def counted_loop(self, stmt: Block, loop: CountedLoop) -> None:
+        self.counted_loops[stmt] = loop
+
+    def inline_block(self, stmt: Block) -> None:
+        self.inline_blocks.append(stmt)
+
+    def apply(self, interpreter, namespace: GlobalEnvironment) -> None:
+        interpreter.locals.update(self.locals)
+        for expr, name in self.globals.items():
+            interpreter.global_slots[expr] = namespace.slot(name)
+        interpreter.slots.update(self.slots)
+        for function, layout in self.layouts.items():
+            interpreter.function_layout(function, layout.copy())
+        for stmt in self.tail_calls:
+            interpreter.tail_call(stmt)
+        interpreter.counted_loops.update(self.counted_loops)
+        interpreter.inline_blocks.update(self.inline_blocks)
+        # Found from where the module is now, which a cache does not record
+        for stmt in self.imports:
+            path: str = os.path.join(os.path.dirname(self.path), stmt.path.literal)
+            interpreter.imports[stmt] = os.path.abspath(path)
+        if interpreter.memo_size:
+            interpreter.find_pure_functions(self.statements)
+
+
+# Modules resolved by this process, by path
+RESOLVED: dict[str, Resolution] = dict()
+
+
+def resolution(path: str) -> Optional[Resolution]:
+    status = os.stat(path)
+    stamp: Stamp = (status.st_mtime_ns, status.st_size)
+    resolved: Optional[Resolution] = RESOLVED.get(path)
+    if resolved is None or resolved.stamp != stamp:
+        resolved = read_cache(path, stamp)
+        if resolved is None:
+            resolved = resolve(path, stamp)
+            if resolved is None:
+                return None
+            write_cache(resolved)
+        # Kept to the end, where the collector would only go through them all
+        # again on the way out
+        if not RESOLVED:
+            atexit.register(gc.freeze)
+        RESOLVED[path] = resolved
+    return resolved
+
+
+def resolve(path: str, stamp: Stamp) -> Optional[Resolution]:
+    source: str = open(path).read().encode("ascii").decode("ascii")
+    parser = Parser(Scanner(source).scan_tokens())
+    statements: list[Stmt] = parser.parse()
+    if lox.errors.had_error:
+        return None
+    resolved = Resolution(path, stamp, statements)
+    resolved.lines = parser.lines
+    Resolver(resolved).resolve(statements)
+    if lox.errors.had_error:
+        return None
+    return resolved
+
+
+@contextlib.contextmanager
+def collector_paused() -> Iterator[None]:
+    enabled: bool = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def cache_path(path: str) -> str:
+    directory, name = os.path.split(path)
+    return os.path.join(directory, CACHE_DIRECTORY, f"{name}.pickle")
+
+
+def read_cache(path: str, stamp: Stamp) -> Optional[Resolution]:
+    # A cache that cannot be read is no worse than none at all
+    try:
+        with open(cache_path(path), "rb") as file:
+            if pickle.load(file) != (CACHE_VERSION, stamp):
+                return None
+            # Unpickling makes no garbage, only objects for the collector to
+            # traverse again and again while it runs
+            with collector_paused():
+                resolved: Resolution = pickle.load(file)
+    except Exception:
+        return None
+    resolved.path = path
+    return resolved
+
+
+def write_cache(resolved: Resolution) -> None:
+    path: str = cache_path(resolved.path)
+    # Written aside first, so that other processes never read half of it
+    temporary: str = f"{path}.{os.getpid()}"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temporary, "wb") as file:
+            pickle.dump((CACHE_VERSION, resolved.stamp), file)
+            pickle.dump(resolved, file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+    except (OSError, RecursionError, pickle.PicklingError):
+        # Left unwritten, the module is resolved again by the next process
+        with contextlib.suppress(OSError):
+            os.unlink(temporary)
+
+
+# The modules imported by the programs of an interpreter. A module runs the
+# first time it is imported, in a namespace of its own, and later imports get
+# the same module. It is only scanned, parsed and resolved once per process,
+# and not at all while the cache it left on disk is up to date.
+class Modules:
+    def __init__(self, interpreter) -> None:
+        self.interpreter = interpreter
+        self.loaded: dict[str, LoxModule] = dict()
+        # Modules resolved into the interpreter's tables, which outlive a reset
+        self.applied: dict[str, tuple[Resolution, GlobalEnvironment]] = dict()
+
+    def reset(self) -> None:
+        self.loaded.clear()
+
+    def load(self, stmt: Import, path: str) -> LoxModule:
+        # A module importing one that imports it back gets it half run
+        module: Optional[LoxModule] = self.loaded.get(path)
+        if module is not None:
+            return module
+        applied = self.applied.get(path)
+        if applied is None:
+            applied = self.applied[path] = self.apply(stmt, path)
+        resolved, namespace = applied
+        name: str = os.path.splitext(os.path.basename(path))[0]
+        module = self.loaded[path] = LoxModule(name, namespace)
+        try:
+            self.run(resolved, namespace)
+        except BaseException:
+            del self.loaded[path]
+            raise
+        return module
+
+    def apply(self, stmt: Import, path: str) -> tuple[Resolution, GlobalEnvironment]:
+        try:
+            resolved: Optional[Resolution] = resolution(path)
+        except OSError as error:
+            raise InterpreterRuntimeError(
+                stmt.path, f"Cannot import {stmt.path.literal}: {error.strerror}"
+            )
+        if resolved is None:
+            raise InterpreterRuntimeError(
+                stmt.path, f"Cannot import {stmt.path.literal}: it has errors"
+            )
+        namespace: GlobalEnvironment = self.interpreter.globals.module()
+        resolved.apply(self.interpreter, namespace)
+        return resolved, namespace
+
+    def run(self, resolved: Resolution, namespace: GlobalEnvironment) -> None:
+        interpreter = self.interpreter
+        environment, frame = interpreter.environment, interpreter.frame
+        interpreter.environment = namespace
+        interpreter.frame = [None] * resolved.top_level_size
+        try:
+            for statement in resolved.statements:
+                if interpreter.stackless is not None:
+                    interpreter.stackless.run(statement)
+                else:
+                    interpreter.execute(statement)
+        finally:
+            interpreter.environment, interpreter.frame = environment, frame
@@ -0,0 +1,88 @@
+import time
+
+from lox.files import (
+    Close,
+    Lines,
+    OpenRead,
+    OpenWrite,
+    ReadAll,
+    ReadLine,
+    Stdin,
+    Write,
+    WriteLine,
+)
+from lox.lox_callable import LoxCallable
+
+from typing import Callable
+
+
+class NativeClock(LoxCallable):
+    def arity(self) -> int:
+        return 0
+
+    def call(self, interpreter, arguments: list[object]) -> float:
+        return time.time()
+
+    def __str__(self) -> str:
+        return "<native fn>"
+
+
+# Creates a vector native, importing the vectors (and NumPy) only once used
+def vector_native(name: str) -> Callable[[], LoxCallable]:
+    def create() -> LoxCallable:
+        from lox.vector import VECTOR_NATIVES
+
+        return VECTOR_NATIVES[name]()
+
+    return create
+
+
+def heap_snapshot() -> LoxCallable:
+    from lox.heap import NativeHeapSnapshot
+
+    return NativeHeapSnapshot()
+
+
+# Creates a thread native, importing the threads and process pools only once used
+def parallel_native(name: str) -> Callable[[], LoxCallable]:
+    def create() -> LoxCallable:
+        from lox.parallel import PARALLEL_NATIVES
+
+        return PARALLEL_NATIVES[name]()
+
+    return create
+
+
+# Native functions by global name, created the first time a script reads them
+NATIVES: dict[str, Callable[[], LoxCallable]] = {
+    "clock": NativeClock,
+    "openRead": OpenRead,
+    "openWrite": OpenWrite,
+    "stdin": Stdin,
+    "readLine": ReadLine,
+    "readAll": ReadAll,
+    "lines": Lines,
+    "write": Write,
+    "writeLine": WriteLine,
+    "close": Close,
+    "heapSnapshot": heap_snapshot,
+    **{
+        name: parallel_native(name)
+        for name in ("parallelMap", "spawnThread", "joinThread")
+    },
+    **{
+        name: vector_native(name)
+        for name in (
+            "vector",
+            "range",
+            "len",
+            "get",
+            "set",
+            "slice",
+            "sum",
+            "min",
+            "max",
+            "dot",
+        )
+    },
+}
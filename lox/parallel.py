@@ -0,0 +1,253 @@
+import copy
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+import lox.errors
+from lox.lox_callable import LoxCallable
+from lox.lox_function import LoxFunction
+from lox.runtime_error import InterpreterRuntimeError, NativeError
+from lox.tokens import Token
+from lox.token_types import TokenType
+from lox.type_feedback import NoTypeFeedback
+from lox.vector import Vector, from_numbers, vector
+
+from typing import Callable, Optional
+
+# Where the errors of a call made by a native are reported when the callee has
+# no declaration of its own to point at
+NATIVE_CALL: Token = Token(TokenType.IDENTIFIER, "native", None, 0)
+
+# The interpreter, function and items of the parallelMap running, which forked
+# worker processes inherit instead of having them pickled
+work: Optional[tuple[object, LoxCallable, list[float]]] = None
+
+
+# A runtime error on its way back from a worker process. It takes the token and
+# message as its arguments, so that it unpickles, which the original does not.
+class WorkerError(Exception):
+    pass
+
+
+# A copy of the interpreter for another thread, with an environment, slot frame
+# and stackless call stack of its own. The resolved program, the globals and the
+# caches stay shared. Hooks watch the thread running the program and are left
+# out, along with the methods they patch in.
+def thread_state(interpreter):
+    start_threads(interpreter)
+    worker = copy.copy(interpreter)
+    for name in ("execute", "evaluate", "visit_call_expr", "tail_call"):
+        worker.__dict__.pop(name, None)
+    worker.hooks = None
+    worker.environment = worker.globals
+    worker.frame = []
+    if interpreter.stackless is not None:
+        from lox.stackless import Stackless
+
+        worker.stackless = Stackless(worker, interpreter.stackless.max_depth)
+        # Type feedback swaps the classes of nodes once they are evaluated, so
+        # whether they have calls is only found out before, and kept
+        worker.stackless.calls = interpreter.stackless.calls
+    return worker
+
+
+# Called on the thread running the program before it starts another. Type
+# feedback and free frames would be raced for by the threads, so from then on
+# neither is used, the layouts of functions resolved later being shared too.
+def start_threads(interpreter) -> None:
+    if interpreter.threads is None:
+        interpreter.threads = Threads()
+        interpreter.type_feedback = NoTypeFeedback()
+        for layout in interpreter.layouts.values():
+            layout.share()
+
+
+def call(interpreter, function: LoxCallable, arguments: list[object]) -> object:
+    paren: Token = NATIVE_CALL
+    if isinstance(function, LoxFunction):
+        paren = function.declaration.name
+    stackless = interpreter.stackless
+    if stackless is None:
+        return interpreter.call(function, arguments, paren)
+    steps = stackless.steps(stackless.invoke(function, arguments, paren))
+    try:
+        next(steps)
+    except StopIteration as stop:
+        return stop.value
+    raise InterpreterRuntimeError(paren, "Threads cannot be suspended")
+
+
+def map_items(interpreter, function: LoxCallable, items: list[float]) -> list[float]:
+    worker = thread_state(interpreter)
+    results: list[float] = []
+    for item in items:
+        result: object = call(worker, function, [item])
+        if type(result) is not float:
+            raise NativeError("parallelMap results must be numbers")
+        results.append(result)
+    return results
+
+
+def map_chunk(bounds: tuple[int, int]) -> list[float]:
+    assert work is not None
+    interpreter, function, items = work
+    try:
+        return map_items(interpreter, function, items[bounds[0] : bounds[1]])
+    except InterpreterRuntimeError as error:
+        raise WorkerError(error.token, str(error))
+
+
+# Threads only run Lox code in parallel on CPython builds without a GIL. With
+# one, the work goes to processes forked from this one, which start from a copy
+# of the program and its values: what they assign is not seen back here.
+def parallel_executor(workers: int) -> tuple[Executor, bool]:
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    if (is_gil_enabled is not None and not is_gil_enabled()) or (
+        "fork" not in multiprocessing.get_all_start_methods()
+    ):
+        return ThreadPoolExecutor(workers), False
+    # Output still buffered would be written again by each process
+    sys.stdout.flush()
+    sys.stderr.flush()
+    context = multiprocessing.get_context("fork")
+    return ProcessPoolExecutor(workers, mp_context=context), True
+
+
+class Native(LoxCallable):
+    def __str__(self) -> str:
+        return "<native fn>"
+
+
+# parallelMap(fn, items): a vector of fn called on each number of the vector
+# items, the calls being spread over the processors
+class ParallelMap(Native):
+    def arity(self) -> int:
+        return 2
+
+    def call(self, interpreter, arguments: list[object]) -> Vector:
+        function: object = arguments[0]
+        if not isinstance(function, LoxCallable) or function.arity() != 1:
+            raise NativeError("Can only map functions of one parameter")
+        items: list[float] = [float(item) for item in vector(arguments[1]).data]
+        if not items:
+            return from_numbers([])
+        if isinstance(function, LoxFunction):
+            # A lazily parsed body is parsed here, and not raced for by workers
+            function.declaration.body
+        workers: int = min(os.cpu_count() or 1, len(items))
+        size: int = -(-len(items) // workers)
+        chunks: list[tuple[int, int]] = [
+            (start, start + size) for start in range(0, len(items), size)
+        ]
+        executor, forked = parallel_executor(workers)
+        global work
+        previous, work = work, (interpreter, function, items)
+        try:
+            with executor:
+                if forked:
+                    results = executor.map(map_chunk, chunks)
+                else:
+                    start_threads(interpreter)
+                    results = executor.map(
+                        lambda bounds: map_items(
+                            interpreter, function, items[bounds[0] : bounds[1]]
+                        ),
+                        chunks,
+                    )
+                return from_numbers([value for chunk in results for value in chunk])
+        except WorkerError as error:
+            raise InterpreterRuntimeError(*error.args)
+        finally:
+            work = previous
+
+
+# The value spawnThread returns, to be joined for the function's result
+class Thread:
+    def __init__(self, interpreter, function: LoxCallable) -> None:
+        self.result: object = None
+        self.error: Optional[Exception] = None
+        self.joined: bool = False
+        self.thread = threading.Thread(
+            target=self.run, args=(thread_state(interpreter), function)
+        )
+
+    def run(self, worker, function: LoxCallable) -> None:
+        try:
+            self.result = call(worker, function, [])
+        except Exception as error:
+            self.error = error
+
+    def join(self) -> object:
+        self.joined = True
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def __str__(self) -> str:
+        return "<thread>"
+
+
+# The threads a program started, which it waits for before it ends
+class Threads:
+    def __init__(self) -> None:
+        self.threads: list[Thread] = []
+        self.lock = threading.Lock()
+
+    def start(self, thread: Thread) -> None:
+        with self.lock:
+            self.threads.append(thread)
+        thread.thread.start()
+
+    def finish(self) -> None:
+        while True:
+            with self.lock:
+                threads, self.threads = self.threads, []
+            if not threads:
+                return
+            for thread in threads:
+                thread.thread.join()
+                # The errors of threads nobody joined would go unseen otherwise
+                if thread.error is None or thread.joined:
+                    continue
+                if not isinstance(thread.error, InterpreterRuntimeError):
+                    raise thread.error
+                lox.errors.runtime_error(thread.error)
+
+
+# spawnThread(fn): runs fn, which takes no arguments, on a thread of its own
+class SpawnThread(Native):
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter, arguments: list[object]) -> Thread:
+        function: object = arguments[0]
+        if not isinstance(function, LoxCallable) or function.arity() != 0:
+            raise NativeError("Can only spawn functions without parameters")
+        if isinstance(function, LoxFunction):
+            function.declaration.body
+        thread = Thread(interpreter, function)
+        interpreter.threads.start(thread)
+        return thread
+
+
+# joinThread(thread): waits for the thread, giving back its function's result
+# or raising its error
+class JoinThread(Native):
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter, arguments: list[object]) -> object:
+        thread: object = arguments[0]
+        if not isinstance(thread, Thread):
+            raise NativeError("Can only join threads")
+        return thread.join()
+
+
+PARALLEL_NATIVES: dict[str, Callable[[], LoxCallable]] = {
+    "parallelMap": ParallelMap,
+    "spawnThread": SpawnThread,
+    "joinThread": JoinThread,
+}
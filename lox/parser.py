@@ -1,10 +1,18 @@
+import os
+
+import lox.errors
+from lox.scanner import keywords
 from lox.tokens import Token
 from lox.token_types import TokenType
 import lox.expr as expr
 from lox.expr import Expr
 import lox.stmt as stmt
 from lox.stmt import Stmt
+from lox.interpreter import Interpreter
+from lox.lazy_function import LazyFunction, matching_brace
+from lox.resolver import ClassType, FunctionType, Resolver
 
+from enum import Enum
 from typing import Optional
 
 
@@ -12,10 +20,74 @@ class ParseError(Exception):
     pass
 
 
+Nesting = Enum("Nesting", ["EXPRESSION", "GROUPING", "ARGUMENTS"])
+# Whether the bodies of top level functions are parsed up front, when first
+# called, or when first called after their syntax was checked up front
+Laziness = Enum("Laziness", ["EAGER", "LAZY", "STRICT"])
+
+PREFIX: set[TokenType] = {TokenType.BANG, TokenType.MINUS}
+
+# Binding power of the infix operators, from loosest to tightest
+ASSIGNMENT: int = 1
+INFIX: dict[TokenType, int] = {
+    TokenType.EQUAL: ASSIGNMENT,
+    TokenType.OR: 2,
+    TokenType.AND: 3,
+    TokenType.BANG_EQUAL: 4,
+    TokenType.EQUAL_EQUAL: 4,
+    TokenType.GREATER: 5,
+    TokenType.GREATER_EQUAL: 5,
+    TokenType.LESS: 5,
+    TokenType.LESS_EQUAL: 5,
+    TokenType.MINUS: 6,
+    TokenType.PLUS: 6,
+    TokenType.SLASH: 7,
+    TokenType.STAR: 7,
+}
+UNARY: int = 8
+
+# Expressions of fewer tokens are too shallow to be checked for nesting
+DEEP_EXPRESSION: int = 1000
+
+
+def is_identifier(name: str) -> bool:
+    return name.isascii() and name.isidentifier() and name not in keywords
+
+
+# An expression being parsed, whose operators wait for their right operands.
+# Parenthesised expressions and call arguments each get their own.
+class PendingExpression:
+    def __init__(self, nesting: Nesting, callee: Optional[Expr] = None) -> None:
+        self.nesting: Nesting = nesting
+        self.callee: Optional[Expr] = callee
+        self.arguments: list[Expr] = []
+        self.operators: list[tuple[Token, int]] = []
+        self.operands: list[Expr] = []
+
+
+# Given an interpreter, the parser also resolves the program into it as it goes,
+# saving a walk over the whole tree. Nodes are then created before their
+# children are parsed, so that the resolver can bind them first. Once there is
+# a syntax error the program will not run and resolution stops.
 class Parser:
-    def __init__(self, tokens: list[Token]) -> None:
+    def __init__(
+        self,
+        tokens: list[Token],
+        interpreter: Optional[Interpreter] = None,
+        laziness: Laziness = Laziness.EAGER,
+    ) -> None:
         self.tokens: list[Token] = tokens
         self.current: int = 0
+        self.laziness: Laziness = laziness
+        # How many blocks enclose the current token
+        self.depth: int = 0
+        # Line each statement starts on, for hooks and coverage
+        self.lines: dict[Stmt, int] = dict()
+        self.resolver: Optional[Resolver] = (
+            Resolver(interpreter, defer_errors=True)
+            if interpreter is not None
+            else None
+        )
 
     def parse(self) -> list[Stmt]:
         statements: list[Stmt] = []
@@ -23,43 +95,86 @@ class Parser:
             statement: Optional[Stmt] = self.declaration()
             if statement is not None:
                 statements.append(statement)
+        if self.resolver is not None and not lox.errors.had_error:
+            self.resolver.finish()
         return statements
 
     def declaration(self) -> Optional[Stmt]:
+        line: int = self.peek().line
         try:
+            declaration: Stmt
             if self.match(TokenType.CLASS):
-                return self.class_declaration()
-            if self.match(TokenType.FUN):
-                return self.function("function")
-            if self.match(TokenType.VAR):
-                return self.var_declaration()
-            return self.statement()
+                declaration = self.class_declaration()
+            elif self.match(TokenType.FUN):
+                declaration = self.function("function")
+            elif self.match(TokenType.VAR):
+                declaration = self.var_declaration()
+            elif self.match(TokenType.IMPORT):
+                declaration = self.import_declaration()
+            else:
+                return self.statement()
+            self.lines[declaration] = line
+            return declaration
         except ParseError:
             self.synchronize()
 
     def class_declaration(self) -> Stmt:
         name: Token = self.consume(TokenType.IDENTIFIER, "Expect class name")
-        superclass = None
+        declaration = stmt.Class(name, None, [])
         if self.match(TokenType.LESS):
             self.consume(TokenType.IDENTIFIER, "Expect superclass name")
-            superclass = expr.Variable(self.previous())
+            declaration.superclass = expr.Variable(self.previous())
         self.consume(TokenType.LEFT_BRACE, "Expect '{' before class body")
-        methods: list[stmt.Function] = []
+        enclosing_class: ClassType = (
+            self.resolver.begin_class(declaration)
+            if self.resolver is not None
+            else ClassType.NONE
+        )
         while not self.check(TokenType.RIGHT_BRACE) and not self.is_at_end():
-            methods.append(self.function("method"))
+            declaration.methods.append(self.function("method"))
         self.consume(TokenType.RIGHT_BRACE, "Expect '}' after class body")
-        return stmt.Class(name, superclass, methods)
+        if self.resolver is not None:
+            self.resolver.end_class(declaration, enclosing_class)
+        return declaration
 
     def var_declaration(self) -> Stmt:
         name: Token = self.consume(TokenType.IDENTIFIER, "Expect variable name")
-        initializer: Optional[Expr] = None
+        declaration = stmt.Var(name, None)
+        if self.resolver is not None:
+            self.resolver.declare(name, declaration)
         if self.match(TokenType.EQUAL):
-            initializer = self.expression()
+            declaration.initializer = self.expression()
 
         self.consume(TokenType.SEMICOLON, "Expect ';' after variable initialization")
-        return stmt.Var(name, initializer)
+        if self.resolver is not None:
+            self.resolver.define(name)
+        return declaration
+
+    def import_declaration(self) -> Stmt:
+        keyword: Token = self.previous()
+        path: Token = self.consume(TokenType.STRING, "Expect module path")
+        # The module is bound to the name of its file, unless given one after 'as'
+        if self.check(TokenType.IDENTIFIER) and self.peek().lexeme == "as":
+            self.advance()
+            name: Token = self.consume(TokenType.IDENTIFIER, "Expect module name")
+        else:
+            stem: str = os.path.splitext(os.path.basename(path.literal))[0]
+            if not is_identifier(stem):
+                raise self.error(path, "Module file name is not a name, use 'as'")
+            name = Token(TokenType.IDENTIFIER, stem, None, path.line)
+        self.consume(TokenType.SEMICOLON, "Expect ';' after import")
+        declaration = stmt.Import(keyword, path, name)
+        if self.resolver is not None:
+            self.resolver.visit_import_stmt(declaration)
+        return declaration
 
     def statement(self) -> Stmt:
+        line: int = self.peek().line
+        statement: Stmt = self.any_statement()
+        self.lines[statement] = line
+        return statement
+
+    def any_statement(self) -> Stmt:
         if self.match(TokenType.FOR):
             return self.for_statement()
         if self.match(TokenType.IF):
@@ -71,12 +186,20 @@ class Parser:
         if self.match(TokenType.WHILE):
             return self.while_statement()
         if self.match(TokenType.LEFT_BRACE):
-            return stmt.Block(self.block())
+            if self.resolver is not None:
+                self.resolver.begin_scope()
+            block = stmt.Block(self.block())
+            if self.resolver is not None:
+                self.resolver.end_block(block)
+            return block
         return self.expression_statement()
 
     def for_statement(self) -> Stmt:
         self.consume(TokenType.LEFT_PAREN, "Expect '(' after 'for'")
 
+        # The scope of the block that will hold the initializer and the loop
+        if self.resolver is not None and not self.check(TokenType.SEMICOLON):
+            self.resolver.begin_scope()
         if self.match(TokenType.SEMICOLON):
             initializer = None
         elif self.match(TokenType.VAR):
@@ -98,6 +221,11 @@ class Parser:
 
         if increment is not None:
             body = stmt.Block([body, stmt.Expression(increment)])
+            # Nothing is declared directly in this block, so its scope can be
+            # opened after the fact
+            if self.resolver is not None:
+                self.resolver.begin_scope()
+                self.resolver.end_block(body)
 
         if condition is None:
             condition = expr.Literal(True)
@@ -105,6 +233,8 @@ class Parser:
 
         if initializer is not None:
             body = stmt.Block([initializer, body])
+            if self.resolver is not None:
+                self.resolver.end_block(body)
 
         return body
 
@@ -126,11 +256,15 @@ class Parser:
 
     def return_statement(self) -> Stmt:
         keyword: Token = self.previous()
-        value: Optional[Expr] = (
-            self.expression() if not self.check(TokenType.SEMICOLON) else None
-        )
+        has_value: bool = not self.check(TokenType.SEMICOLON)
+        if self.resolver is not None:
+            self.resolver.check_return(keyword, has_value)
+        value: Optional[Expr] = self.expression() if has_value else None
         self.consume(TokenType.SEMICOLON, "Expect ';' after return value")
-        return stmt.Return(keyword, value)
+        statement = stmt.Return(keyword, value)
+        if self.resolver is not None:
+            self.resolver.mark_tail_call(statement)
+        return statement
 
     def while_statement(self) -> Stmt:
         self.consume(TokenType.LEFT_PAREN, "Expect '(' after 'while'")
@@ -146,8 +280,16 @@ class Parser:
 
     def function(self, kind: str) -> stmt.Function:
         name: Token = self.consume(TokenType.IDENTIFIER, f"Expect {kind} name")
+        function = (
+            LazyFunction(name, [], [])
+            if self.laziness != Laziness.EAGER and kind == "function" and not self.depth
+            else stmt.Function(name, [], [])
+        )
+        if self.resolver is not None and kind == "function":
+            self.resolver.declare(name, function)
+            self.resolver.define(name)
         self.consume(TokenType.LEFT_PAREN, f"Expect '(' after {kind} name")
-        parameters: list[Token] = []
+        parameters: list[Token] = function.params
         if not self.check(TokenType.RIGHT_PAREN):
             while True:
                 if len(parameters) >= 255:
@@ -159,120 +301,176 @@ class Parser:
                     break
         self.consume(TokenType.RIGHT_PAREN, "Expect ')' after parameters")
         self.consume(TokenType.LEFT_BRACE, f"Expect '\u007b' before {kind} body")
-        body: list[Stmt] = self.block()
-        return stmt.Function(name, parameters, body)
+        if isinstance(function, LazyFunction):
+            if self.laziness == Laziness.STRICT:
+                return self.check_body(function)
+            return self.skip_body(function)
+        enclosing_function: FunctionType = FunctionType.NONE
+        if self.resolver is not None:
+            enclosing_function = self.resolver.begin_function(
+                function,
+                (
+                    FunctionType.FUNCTION
+                    if kind == "function"
+                    else self.resolver.method_type(function)
+                ),
+            )
+        function.body = self.block()
+        if self.resolver is not None:
+            self.resolver.end_function(function, enclosing_function)
+        return function
+
+    def skip_body(self, function: LazyFunction) -> stmt.Function:
+        start: int = self.current
+        end: Optional[int] = matching_brace(self.tokens, start)
+        if end is None:
+            self.current = len(self.tokens) - 1
+            raise self.error(self.peek(), "Expect '}' after block")
+        closing: Token = self.tokens[end - 1]
+        function.tokens = self.tokens[start : end - 1]
+        function.tokens.append(Token(TokenType.EOF, "", None, closing.line))
+        self.current = end
+        if self.resolver is not None:
+            self.resolver.defer_function(function)
+        return function
+
+    # Parsed now to report its syntax errors, the body is still only resolved
+    # when first read
+    def check_body(self, function: LazyFunction) -> stmt.Function:
+        resolver: Optional[Resolver] = self.resolver
+        self.resolver = None
+        function.statements = self.block()
+        self.resolver = resolver
+        if resolver is not None:
+            resolver.defer_function(function)
+        return function
 
     def block(self) -> list[Stmt]:
         statements: list[Stmt] = []
-        while not self.check(TokenType.RIGHT_BRACE) and not self.is_at_end():
-            statement: Optional[Stmt] = self.declaration()
-            if statement is not None:
-                statements.append(statement)
-        self.consume(TokenType.RIGHT_BRACE, "Expect '}' after block")
+        self.depth += 1
+        try:
+            while not self.check(TokenType.RIGHT_BRACE) and not self.is_at_end():
+                statement: Optional[Stmt] = self.declaration()
+                if statement is not None:
+                    statements.append(statement)
+            self.consume(TokenType.RIGHT_BRACE, "Expect '}' after block")
+        finally:
+            self.depth -= 1
         return statements
 
     def expression(self) -> Expr:
-        return self.assignment()
-
-    def assignment(self) -> Expr:
-        expression: Expr = self.or_expr()
-        if self.match(TokenType.EQUAL):
-            equals: Token = self.previous()
-            value: Expr = self.assignment()
-            if isinstance(expression, expr.Variable):
-                return expr.Assign(expression.name, value)
-            elif isinstance(expression, expr.Get):
-                return expr.Set(expression.instance, expression.name, value)
-            self.error(equals, "Invalid assignment target.")
-        return expression
-
-    def or_expr(self) -> Expr:
-        expression: Expr = self.and_expr()
-        while self.match(TokenType.OR):
-            operator: Token = self.previous()
-            right: Expr = self.and_expr()
-            expression = expr.Logical(expression, operator, right)
-        return expression
-
-    def and_expr(self) -> Expr:
-        expression: Expr = self.equality()
-        while self.match(TokenType.AND):
-            operator: Token = self.previous()
-            right: Expr = self.equality()
-            expression = expr.Logical(expression, operator, right)
-        return expression
-
-    def equality(self) -> Expr:
-        expression: Expr = self.comparison()
-        while self.match(TokenType.BANG_EQUAL, TokenType.EQUAL_EQUAL):
-            operator: Token = self.previous()
-            right: Expr = self.comparison()
-            expression = expr.Binary(expression, operator, right)
-        return expression
-
-    def comparison(self) -> Expr:
-        expression: Expr = self.term()
-
-        while self.match(
-            TokenType.GREATER,
-            TokenType.GREATER_EQUAL,
-            TokenType.LESS,
-            TokenType.LESS_EQUAL,
-        ):
-            operator: Token = self.previous()
-            right: Expr = self.term()
-            expression = expr.Binary(expression, operator, right)
-        return expression
-
-    def term(self) -> Expr:
-        expression: Expr = self.factor()
-
-        while self.match(TokenType.MINUS, TokenType.PLUS):
-            operator: Token = self.previous()
-            right: Expr = self.factor()
-            expression = expr.Binary(expression, operator, right)
-        return expression
-
-    def factor(self) -> Expr:
-        expression: Expr = self.unary()
-
-        while self.match(TokenType.SLASH, TokenType.STAR):
-            operator: Token = self.previous()
-            right: Expr = self.unary()
-            expression = expr.Binary(expression, operator, right)
-        return expression
-
-    def unary(self) -> Expr:
-        if self.match(TokenType.BANG, TokenType.MINUS):
-            operator: Token = self.previous()
-            right: Expr = self.unary()
-            return expr.Unary(operator, right)
-        return self.call()
-
-    def call(self) -> Expr:
-        expression: Expr = self.primary()
+        # Operator precedence parsing on explicit stacks: each operand costs a
+        # few calls and neither long chains nor deep nesting recurse in Python
+        stack: list[PendingExpression] = [PendingExpression(Nesting.EXPRESSION)]
+        operand: Optional[Expr] = None
+        start: int = self.current
         while True:
-            if self.match(TokenType.LEFT_PAREN):
-                expression = self.finish_call(expression)
-            elif self.match(TokenType.DOT):
+            pending: PendingExpression = stack[-1]
+            type: TokenType = self.peek().type
+            if operand is None:
+                if type in PREFIX:
+                    pending.operators.append((self.advance(), UNARY))
+                elif type == TokenType.LEFT_PAREN:
+                    self.advance()
+                    stack.append(PendingExpression(Nesting.GROUPING))
+                else:
+                    operand = self.primary()
+                continue
+            if type == TokenType.LEFT_PAREN:
+                self.advance()
+                if self.check(TokenType.RIGHT_PAREN):
+                    operand = expr.Call(operand, self.advance(), [])
+                else:
+                    stack.append(PendingExpression(Nesting.ARGUMENTS, operand))
+                    operand = None
+                continue
+            if type == TokenType.DOT:
+                self.advance()
                 name: Token = self.consume(
                     TokenType.IDENTIFIER, "Expect property name after '.'"
                 )
-                expression = expr.Get(expression, name)
-            else:
-                break
-        return expression
+                operand = expr.Get(operand, name)
+                continue
+            precedence: Optional[int] = INFIX.get(type)
+            if precedence is not None:
+                operator: Token = self.advance()
+                pending.operands.append(operand)
+                operand = None
+                # Assignment is the only right associative operator
+                self.reduce(
+                    pending,
+                    precedence + 1 if type == TokenType.EQUAL else precedence,
+                )
+                pending.operators.append((operator, precedence))
+                continue
+            pending.operands.append(operand)
+            self.reduce(pending, ASSIGNMENT)
+            operand = pending.operands.pop()
+            stack.pop()
+            match pending.nesting:
+                case Nesting.EXPRESSION:
+                    if self.resolver is not None and (
+                        self.current - start > DEEP_EXPRESSION
+                    ):
+                        self.check_nesting(operand, self.tokens[start])
+                    return operand
+                case Nesting.GROUPING:
+                    self.consume(TokenType.RIGHT_PAREN, "Expect ')' after expression")
+                    operand = expr.Grouping(operand)
+                case Nesting.ARGUMENTS:
+                    assert pending.callee is not None
+                    pending.arguments.append(operand)
+                    operand = None
+                    if self.match(TokenType.COMMA):
+                        if len(pending.arguments) >= 255:
+                            self.error(
+                                self.peek(), "Cannot have more than 255 arguments"
+                            )
+                        stack.append(pending)
+                        continue
+                    paren: Token = self.consume(
+                        TokenType.RIGHT_PAREN, "Expect ')' after arguments"
+                    )
+                    operand = expr.Call(pending.callee, paren, pending.arguments)
+
+    # Resolving as it parses, the parser does not recurse on expressions as the
+    # resolver does in a pass of its own, reporting those nested too deeply
+    def check_nesting(self, operand: Expr, start: Token) -> None:
+        from lox.ast_walker import AstWalker
 
-    def finish_call(self, callee: Expr) -> Expr:
-        arguments: list[Expr] = []
-        if not self.check(TokenType.RIGHT_PAREN):
-            arguments.append(self.expression())
-            while self.match(TokenType.COMMA):
-                if len(arguments) >= 255:
-                    self.error(self.peek(), "Cannot have more than 255 arguments")
-                arguments.append(self.expression())
-        paren: Token = self.consume(TokenType.RIGHT_PAREN, "Expect ')' after arguments")
-        return expr.Call(callee, paren, arguments)
+        try:
+            AstWalker().walk(operand)
+        except RecursionError:
+            raise self.error(start, "Expression too deeply nested")
+
+    def reduce(self, pending: PendingExpression, precedence: int) -> None:
+        # Apply the stacked operators binding at least as tightly
+        operators, operands = pending.operators, pending.operands
+        while operators and operators[-1][1] >= precedence:
+            operator, binding = operators.pop()
+            right: Expr = operands.pop()
+            if binding == UNARY:
+                operands.append(expr.Unary(operator, right))
+                continue
+            left: Expr = operands.pop()
+            match operator.type:
+                case TokenType.EQUAL:
+                    operands.append(self.assignment(left, operator, right))
+                case TokenType.AND | TokenType.OR:
+                    operands.append(expr.Logical(left, operator, right))
+                case _:
+                    operands.append(expr.Binary(left, operator, right))
+
+    def assignment(self, target: Expr, equals: Token, value: Expr) -> Expr:
+        if isinstance(target, expr.Variable):
+            assign = expr.Assign(target.name, value)
+            if self.resolver is not None:
+                self.resolver.resolve_local(assign, assign.name)
+            return assign
+        if isinstance(target, expr.Get):
+            return expr.Set(target.instance, target.name, value)
+        self.error(equals, "Invalid assignment target.")
+        return target
 
     def primary(self) -> Expr:
         if self.match(TokenType.FALSE):
@@ -287,15 +485,24 @@ class Parser:
             keyword = self.previous()
             self.consume(TokenType.DOT, "Expect '.' after 'super'")
             method = self.consume(TokenType.IDENTIFIER, "Expect superclass method name")
-            return expr.Super(keyword, method)
+            super_expr = expr.Super(keyword, method)
+            if self.resolver is not None:
+                self.resolver.visit_super_expr(super_expr)
+            return super_expr
         if self.match(TokenType.THIS):
-            return expr.This(self.previous())
+            this = expr.This(self.previous())
+            if self.resolver is not None:
+                self.resolver.visit_this_expr(this)
+            return this
         if self.match(TokenType.IDENTIFIER):
-            return expr.Variable(self.previous())
-        if self.match(TokenType.LEFT_PAREN):
-            expression: Expr = self.expression()
-            self.consume(TokenType.RIGHT_PAREN, "Expect ')' after expression")
-            return expr.Grouping(expression)
+            variable = expr.Variable(self.previous())
+            # A variable right before '=' is resolved as the assignment target
+            if (
+                self.resolver is not None
+                and self.tokens[self.current].type != TokenType.EQUAL
+            ):
+                self.resolver.visit_variable_expr(variable)
+            return variable
         raise self.error(self.peek(), "Expect expression")
 
     def consume(self, type: TokenType, message: str) -> Token:
@@ -304,9 +511,9 @@ class Parser:
         raise self.error(self.peek(), message)
 
     def error(self, token: Token, message: str) -> ParseError:
-        import lox.__main__ as __main__
-
-        __main__.error(token.line, message)
+        lox.errors.error(token.line, message)
+        # The tree will not be resolved, nor its scopes closed properly
+        self.resolver = None
         return ParseError()
 
     def synchronize(self) -> None:
@@ -326,22 +533,21 @@ class Parser:
                     | TokenType.WHILE
                     | TokenType.PRINT
                     | TokenType.RETURN
+                    | TokenType.IMPORT
                 ):
                     return
 
             self.advance()
 
+    # Nothing ever looks for EOF, so check and match need no end test
     def match(self, *types: TokenType) -> bool:
-        for type in types:
-            if self.check(type):
-                self.advance()
-                return True
+        if self.tokens[self.current].type in types:
+            self.current += 1
+            return True
         return False
 
     def check(self, type: TokenType) -> bool:
-        if self.is_at_end():
-            return False
-        return self.peek().type == type
+        return self.tokens[self.current].type == type
 
     def advance(self) -> Token:
         if not self.is_at_end():
@@ -0,0 +1,187 @@
+import lox.expr as expr
+import lox.stmt as stmt
+from lox.ast_walker import AstWalker
+from lox.expr import Variable
+from lox.runtime_error import InterpreterRuntimeError
+from lox.stmt import Stmt
+
+from typing import Optional
+
+
+# A declared name. Reading it from another function is only safe while it is
+# never assigned after its declaration.
+class Name:
+    def __init__(
+        self, declaration: Optional[Stmt], function: Optional["FunctionFacts"]
+    ) -> None:
+        self.declaration: Optional[Stmt] = declaration
+        self.function: Optional[FunctionFacts] = function
+        self.assigned: bool = False
+
+
+class FunctionFacts:
+    def __init__(self, declaration: stmt.Function) -> None:
+        self.declaration: stmt.Function = declaration
+        self.impure: bool = False
+        # Names declared outside the function, or global names to look up once
+        # the whole program has been seen
+        self.reads: list[Name | str] = []
+        self.calls: list[Name | str] = []
+
+
+# Finds the functions whose result only depends on their arguments: they do
+# not print, set fields, assign or read variables that change outside of them,
+# and only call functions of the same kind.
+class PurityAnalysis(AstWalker):
+    def __init__(self) -> None:
+        self.globals: dict[str, Name] = dict()
+        self.scopes: list[dict[str, Name]] = []
+        self.functions: list[FunctionFacts] = []
+        self.current: Optional[FunctionFacts] = None
+
+    def pure_functions(self, statements: list[Stmt]) -> set[stmt.Function]:
+        self.walk_all(statements)
+        # Assume every candidate pure, then drop those calling one that is not
+        pure: dict[stmt.Function, FunctionFacts] = {
+            facts.declaration: facts
+            for facts in self.functions
+            if not facts.impure
+            and all(self.is_constant(read) for read in facts.reads)
+        }
+        changed: bool = True
+        while changed:
+            changed = False
+            for declaration, facts in list(pure.items()):
+                if not all(self.is_pure_call(callee, pure) for callee in facts.calls):
+                    del pure[declaration]
+                    changed = True
+        return set(pure)
+
+    def is_constant(self, name: Name | str) -> bool:
+        found: Optional[Name] = self.lookup_global(name)
+        return found is not None and not found.assigned
+
+    def is_pure_call(
+        self, callee: Name | str, pure: dict[stmt.Function, FunctionFacts]
+    ) -> bool:
+        found: Optional[Name] = self.lookup_global(callee)
+        return found is not None and not found.assigned and found.declaration in pure
+
+    def lookup_global(self, name: Name | str) -> Optional[Name]:
+        return self.globals.get(name) if isinstance(name, str) else name
+
+    def visit_block_stmt(self, stmt: stmt.Block) -> None:
+        self.scopes.append(dict())
+        super().visit_block_stmt(stmt)
+        self.scopes.pop()
+
+    def visit_class_stmt(self, stmt: stmt.Class) -> None:
+        self.taint()
+        self.declare(stmt.name.lexeme, stmt)
+        self.walk(stmt.superclass)
+        for method in stmt.methods:
+            self.function(method).impure = True
+
+    def visit_function_stmt(self, stmt: stmt.Function) -> None:
+        # Creating a closure is a side effect too
+        self.taint()
+        self.declare(stmt.name.lexeme, stmt)
+        self.function(stmt)
+
+    def visit_print_stmt(self, stmt: stmt.Print) -> None:
+        self.taint()
+        super().visit_print_stmt(stmt)
+
+    def visit_var_stmt(self, stmt: stmt.Var) -> None:
+        super().visit_var_stmt(stmt)
+        self.declare(stmt.name.lexeme, stmt)
+
+    def visit_import_stmt(self, stmt: stmt.Import) -> None:
+        # The first import runs the module
+        self.taint()
+        self.declare(stmt.name.lexeme, stmt)
+
+    def visit_assign_expr(self, expr: expr.Assign) -> None:
+        super().visit_assign_expr(expr)
+        name: Name | str = self.lookup(expr.name.lexeme)
+        if isinstance(name, str):
+            name = self.globals.setdefault(name, Name(None, None))
+        name.assigned = True
+        if name.function is not self.current:
+            self.taint()
+
+    def visit_call_expr(self, expr: expr.Call) -> None:
+        super().visit_call_expr(expr)
+        if self.current is None:
+            return
+        if not isinstance(expr.callee, Variable):
+            self.taint()
+            return
+        callee: Name | str = self.lookup(expr.callee.name.lexeme)
+        if isinstance(callee, Name) and callee.function is self.current:
+            # A parameter or local variable could hold anything
+            self.taint()
+        else:
+            self.current.calls.append(callee)
+
+    def visit_get_expr(self, expr: expr.Get) -> None:
+        self.taint()
+        super().visit_get_expr(expr)
+
+    def visit_set_expr(self, expr: expr.Set) -> None:
+        self.taint()
+        super().visit_set_expr(expr)
+
+    def visit_super_expr(self, expr: expr.Super) -> None:
+        self.taint()
+
+    def visit_this_expr(self, expr: expr.This) -> None:
+        self.taint()
+
+    def visit_variable_expr(self, expr: expr.Variable) -> None:
+        if self.current is None:
+            return
+        name: Name | str = self.lookup(expr.name.lexeme)
+        if isinstance(name, str) or name.function is not self.current:
+            self.current.reads.append(name)
+
+    def function(self, declaration: stmt.Function) -> FunctionFacts:
+        facts = FunctionFacts(declaration)
+        self.functions.append(facts)
+        try:
+            body: list[Stmt] = declaration.body
+        except InterpreterRuntimeError:
+            # A lazily parsed body with errors, which can never run
+            facts.impure = True
+            return facts
+        enclosing: Optional[FunctionFacts] = self.current
+        self.current = facts
+        self.scopes.append(
+            {param.lexeme: Name(None, facts) for param in declaration.params}
+        )
+        self.walk_all(body)
+        self.scopes.pop()
+        self.current = enclosing
+        return facts
+
+    def taint(self) -> None:
+        if self.current is not None:
+            self.current.impure = True
+
+    def declare(self, name: str, declaration: Stmt) -> None:
+        if self.scopes:
+            self.scopes[-1][name] = Name(declaration, self.current)
+            return
+        # Globals can be declared again, which changes their value
+        existing: Optional[Name] = self.globals.get(name)
+        if existing is not None:
+            existing.assigned = True
+        else:
+            self.globals[name] = Name(declaration, None)
+
+    def lookup(self, name: str) -> Name | str:
+        for scope in reversed(self.scopes):
+            found: Optional[Name] = scope.get(name)
+            if found is not None:
+                return found
+        return name
@@ -1,5 +1,6 @@
 from enum import Enum
-import lox.__main__
+from typing import Optional
+import lox.errors
 import lox.expr as expr
 import lox.stmt as stmt
 from lox.interpreter import Interpreter
@@ -23,6 +24,7 @@ from lox.stmt import (
     Expression,
     Function,
     If,
+    Import,
     Print,
     Return,
     Stmt,
@@ -31,62 +33,122 @@ from lox.stmt import (
     While,
 )
 from lox.tokens import Token
+from lox.counted_loop import CountedLoop, match_counted_loop
+from lox.function_layout import FunctionLayout
+from lox.lazy_function import LazyFunction
 
 FunctionType = Enum("FunctionType", ["NONE", "INITIALIZER", "METHOD", "FUNCTION"])
 ClassType = Enum("ClassType", ["NONE", "SUBCLASS", "CLASS"])
 
 
+class Binding:
+    def __init__(self, name: str, scope: "Scope") -> None:
+        self.name: str = name
+        self.scope: Scope = scope
+        self.defined: bool = False
+        self.captured: bool = False
+        self.declaration: Optional[Stmt] = None
+        self.slot: Optional[int] = None
+        self.assigned: bool = False
+        self.references: list[tuple[Expr, Scope]] = []
+        # Uses of a function's name in its own body, which need not capture it
+        self.self_references: list[tuple[Expr, Scope]] = []
+
+
+# Whether a scope needs an Environment at run time is only known once it ends,
+# when all closures that might capture its bindings have been seen. References
+# are therefore resolved when the scope declaring them ends.
+class Scope:
+    def __init__(
+        self, enclosing: Optional["Scope"], layout: FunctionLayout, environment: bool
+    ) -> None:
+        self.enclosing: Optional[Scope] = enclosing
+        self.layout: FunctionLayout = layout
+        self.environment: bool = environment
+        self.bindings: dict[str, Binding] = dict()
+
+
+# The resolver is either run over a parsed tree, or driven by the parser as it
+# builds the nodes. In the latter case errors are held back until the parse
+# succeeds, like a separate pass would only report them then.
 class Resolver(expr.Visitor, stmt.Visitor):
-    def __init__(self, interpreter: Interpreter) -> None:
+    def __init__(self, interpreter: Interpreter, defer_errors: bool = False) -> None:
         self.interpreter = interpreter
-        self.scopes: list[dict[str, bool]] = []
+        self.deferred: Optional[list[tuple[int, str]]] = [] if defer_errors else None
+        self.scopes: list[Scope] = []
+        self.top_level: FunctionLayout = FunctionLayout()
+        self.functions: list[Function] = []
         self.current_function: FunctionType = FunctionType.NONE
         self.current_class: ClassType = ClassType.NONE
+        self.line: int = 0
 
     def visit_block_stmt(self, stmt: Block) -> None:
         self.begin_scope()
         self.resolve(stmt.statements)
-        self.end_scope()
+        self.end_block(stmt)
+
+    def end_block(self, stmt: Block) -> None:
+        if self.end_scope().environment:
+            return
+        # Nothing in the block is captured, so it runs in the enclosing environment
+        self.interpreter.inline_block(stmt)
+        loop: Optional[CountedLoop] = match_counted_loop(stmt)
+        if loop is not None:
+            self.interpreter.counted_loop(stmt, loop)
 
     def visit_class_stmt(self, stmt: Class) -> None:
+        enclosing_class: ClassType = self.begin_class(stmt)
+        for method in stmt.methods:
+            self.resolve_function(method, self.method_type(method))
+        self.end_class(stmt, enclosing_class)
+
+    def begin_class(self, stmt: Class) -> ClassType:
         enclosing_class = self.current_class
         self.current_class = ClassType.CLASS
-        self.declare(stmt.name)
+        self.declare(stmt.name, stmt)
         self.define(stmt.name)
         if (
             stmt.superclass is not None
             and stmt.name.lexeme == stmt.superclass.name.lexeme
         ):
-            lox.__main__.error(
-                stmt.superclass.name.line, "A class cannot inherit from itself"
-            )
+            self.error(stmt.superclass.name.line, "A class cannot inherit from itself")
         if stmt.superclass is not None:
             self.current_class = ClassType.SUBCLASS
             self.resolve_expr(stmt.superclass)
         if stmt.superclass is not None:
-            self.begin_scope()
-            self.scopes[-1]["super"] = True
-        self.begin_scope()
-        self.scopes[-1]["this"] = True
-        for method in stmt.methods:
-            declaration = (
-                FunctionType.INITIALIZER
-                if method.name.lexeme == "init"
-                else FunctionType.METHOD
-            )
-            self.resolve_function(method, declaration)
+            self.begin_scope(environment=True)
+            self.bind_keyword("super")
+        self.begin_scope(environment=True)
+        self.bind_keyword("this")
+        return enclosing_class
+
+    def end_class(self, stmt: Class, enclosing_class: ClassType) -> None:
         self.end_scope()
         if stmt.superclass is not None:
             self.end_scope()
         self.current_class = enclosing_class
 
+    def method_type(self, method: Function) -> FunctionType:
+        if method.name.lexeme == "init":
+            return FunctionType.INITIALIZER
+        return FunctionType.METHOD
+
     def visit_expression_stmt(self, stmt: Expression) -> None:
         self.resolve_expr(stmt.expression)
 
     def visit_function_stmt(self, stmt: Function) -> None:
-        self.declare(stmt.name)
+        self.declare(stmt.name, stmt)
         self.define(stmt.name)
-        self.resolve_function(stmt, FunctionType.FUNCTION)
+        if isinstance(stmt, LazyFunction):
+            self.defer_function(stmt)
+        else:
+            self.resolve_function(stmt, FunctionType.FUNCTION)
+
+    # The body is resolved into the interpreter when first read, and laid out
+    # in the layout calls are given now
+    def defer_function(self, function: LazyFunction) -> None:
+        function.interpreter = self.interpreter
+        self.interpreter.function_layout(function, function.layout)
 
     def visit_if_stmt(self, stmt: If) -> None:
         self.resolve_expr(stmt.condition)
@@ -98,17 +160,26 @@ class Resolver(expr.Visitor, stmt.Visitor):
         self.resolve_expr(stmt.expression)
 
     def visit_return_stmt(self, stmt: Return) -> None:
-        if self.current_function == FunctionType.NONE:
-            lox.__main__.error(stmt.keyword.line, "Cannot return from top-level code")
+        self.check_return(stmt.keyword, stmt.value is not None)
         if stmt.value is not None:
-            if self.current_function == FunctionType.INITIALIZER:
-                lox.__main__.error(
-                    stmt.keyword.line, "Cannot return a value from an initializer"
-                )
             self.resolve_expr(stmt.value)
+        self.mark_tail_call(stmt)
+
+    def check_return(self, keyword: Token, has_value: bool) -> None:
+        if self.current_function == FunctionType.NONE:
+            self.error(keyword.line, "Cannot return from top-level code")
+        if has_value and self.current_function == FunctionType.INITIALIZER:
+            self.error(keyword.line, "Cannot return a value from an initializer")
+
+    def mark_tail_call(self, stmt: Return) -> None:
+        if isinstance(stmt.value, Call) and self.current_function in (
+            FunctionType.FUNCTION,
+            FunctionType.METHOD,
+        ):
+            self.interpreter.tail_call(stmt)
 
     def visit_var_stmt(self, stmt: Var) -> None:
-        self.declare(stmt.name)
+        self.declare(stmt.name, stmt)
         if stmt.initializer is not None:
             self.resolve_expr(stmt.initializer)
         self.define(stmt.name)
@@ -117,6 +188,11 @@ class Resolver(expr.Visitor, stmt.Visitor):
         self.resolve_expr(stmt.condition)
         self.resolve_stmt(stmt.body)
 
+    def visit_import_stmt(self, stmt: Import) -> None:
+        self.declare(stmt.name, stmt)
+        self.define(stmt.name)
+        self.interpreter.resolve_import(stmt)
+
     def visit_binary_expr(self, expr: Binary) -> None:
         self.resolve_expr(expr.left)
         self.resolve_expr(expr.right)
@@ -140,23 +216,24 @@ class Resolver(expr.Visitor, stmt.Visitor):
         self.resolve_expr(expr.right)
 
     def visit_set_expr(self, expr: Set) -> None:
-        self.resolve_expr(expr.value)
+        # In source order, which is the order the parser sees them
         self.resolve_expr(expr.instance)
+        self.resolve_expr(expr.value)
 
     def visit_super_expr(self, expr: Super) -> None:
         if self.current_class == ClassType.NONE:
-            lox.__main__.error(
+            self.error(
                 expr.keyword.line, "Cannot use 'super' outside of a class"
             )
         elif self.current_class != ClassType.SUBCLASS:
-            lox.__main__.error(
+            self.error(
                 expr.keyword.line, "Cannot use 'super' in a class without superclass"
             )
         self.resolve_local(expr, expr.keyword)
 
     def visit_this_expr(self, expr: This) -> None:
         if self.current_class == ClassType.NONE:
-            lox.__main__.error(
+            self.error(
                 expr.keyword.line, "Cannot use 'this' outside of a class"
             )
         self.resolve_local(expr, expr.keyword)
@@ -165,8 +242,11 @@ class Resolver(expr.Visitor, stmt.Visitor):
         self.resolve_expr(expr.right)
 
     def visit_variable_expr(self, expr: Variable) -> None:
-        if len(self.scopes) >= 1 and self.scopes[-1].get(expr.name.lexeme) is False:
-            lox.__main__.error(
+        binding: Optional[Binding] = (
+            self.scopes[-1].bindings.get(expr.name.lexeme) if self.scopes else None
+        )
+        if binding is not None and not binding.defined:
+            self.error(
                 expr.name.line, "Cannot read local variable in its own initializer"
             )
         self.resolve_local(expr, expr.name)
@@ -176,49 +256,167 @@ class Resolver(expr.Visitor, stmt.Visitor):
         self.resolve_local(expr, expr.name)
 
     def resolve(self, statements: list[Stmt]) -> None:
+        if self.scopes:
+            for statement in statements:
+                self.resolve_stmt(statement)
+            return
         for statement in statements:
-            self.resolve_stmt(statement)
-
-    def resolve_function(self, function: Function, type: FunctionType) -> None:
+            try:
+                self.resolve_stmt(statement)
+            except RecursionError:
+                # Nested deeper than Python's stack, which running the code
+                # would need too
+                self.error(self.line, "Expression too deeply nested")
+                self.reset_nesting()
+        self.finish()
+
+    # Leaves the scopes, functions and classes that an error left entered
+    def reset_nesting(self) -> None:
+        self.scopes.clear()
+        self.functions.clear()
+        self.current_function = FunctionType.NONE
+        self.current_class = ClassType.NONE
+
+    def finish(self) -> None:
+        for line, message in self.deferred or []:
+            lox.errors.error(line, message)
+        self.interpreter.top_level_frame(self.top_level.frame_size)
+
+    def resolve_function(
+        self,
+        function: Function,
+        type: FunctionType,
+        layout: Optional[FunctionLayout] = None,
+    ) -> None:
+        enclosing_function: FunctionType = self.begin_function(function, type, layout)
+        self.resolve(function.body)
+        self.end_function(function, enclosing_function)
+
+    def begin_function(
+        self,
+        function: Function,
+        type: FunctionType,
+        layout: Optional[FunctionLayout] = None,
+    ) -> FunctionType:
         enclosing_function: FunctionType = self.current_function
         self.current_function = type
-        self.begin_scope()
+        self.functions.append(function)
+        self.begin_scope(layout if layout is not None else FunctionLayout())
         for param in function.params:
             self.declare(param)
             self.define(param)
-        self.resolve(function.body)
-        self.end_scope()
+        return enclosing_function
+
+    def end_function(
+        self, function: Function, enclosing_function: FunctionType
+    ) -> None:
+        scope: Scope = self.end_scope()
+        layout: FunctionLayout = scope.layout
+        layout.environment = scope.environment
+        layout.params = [scope.bindings[param.lexeme].slot for param in function.params]
+        self.interpreter.function_layout(function, layout)
+        self.functions.pop()
         self.current_function = enclosing_function
 
     def resolve_stmt(self, stmt: Stmt) -> None:
+        # The line of the innermost statement, for errors found in expressions
+        self.line = self.interpreter.lines.get(stmt, self.line)
         stmt.accept(self)
 
     def resolve_expr(self, expr: Expr) -> None:
         expr.accept(self)
 
-    def begin_scope(self) -> None:
-        self.scopes.append(dict())
-
-    def end_scope(self) -> None:
-        self.scopes.pop()
-
-    def declare(self, name: Token) -> None:
+    def begin_scope(
+        self, layout: Optional[FunctionLayout] = None, environment: bool = False
+    ) -> None:
+        enclosing: Optional[Scope] = self.scopes[-1] if self.scopes else None
+        if layout is None:
+            layout = enclosing.layout if enclosing is not None else self.top_level
+        self.scopes.append(Scope(enclosing, layout, environment))
+
+    def end_scope(self) -> Scope:
+        scope: Scope = self.scopes.pop()
+        bindings = scope.bindings.values()
+        for binding in bindings:
+            if binding.assigned and binding.self_references:
+                # The name may no longer hold the function, so it is captured
+                binding.captured = True
+                binding.references += binding.self_references
+            else:
+                self.resolve_self_references(binding)
+        if any(binding.captured for binding in bindings):
+            scope.environment = True
+        for binding in bindings:
+            if binding.captured:
+                for expr, origin in binding.references:
+                    self.interpreter.resolve(expr, self.distance(origin, scope))
+                continue
+            binding.slot = scope.layout.allocate()
+            for expr, _ in binding.references:
+                self.interpreter.resolve_slot(expr, binding.slot)
+            if binding.declaration is not None:
+                self.interpreter.resolve_slot(binding.declaration, binding.slot)
+        return scope
+
+    def resolve_self_references(self, binding: Binding) -> None:
+        # A recursive function gets itself from its own frame instead of the
+        # enclosing environment, which would otherwise hold it in a cycle
+        for expr, origin in binding.self_references:
+            layout: FunctionLayout = origin.layout
+            if layout.itself is None:
+                layout.itself = layout.allocate()
+            self.interpreter.resolve_slot(expr, layout.itself)
+
+    def distance(self, origin: Scope, target: Scope) -> int:
+        # Only scopes with an environment are links in the run time chain
+        distance: int = 0
+        scope: Optional[Scope] = origin
+        while scope is not target:
+            assert scope is not None
+            if scope.environment:
+                distance += 1
+            scope = scope.enclosing
+        return distance
+
+    def declare(self, name: Token, declaration: Optional[Stmt] = None) -> None:
         if len(self.scopes) == 0:
             return
-        scope: dict[str, bool] = self.scopes[-1]
-        if name.lexeme in scope:
-            lox.__main__.error(
+        scope: Scope = self.scopes[-1]
+        if name.lexeme in scope.bindings:
+            self.error(
                 name.line, "Already a variable with this name in this scope"
             )
-        scope[name.lexeme] = False
+        binding = scope.bindings[name.lexeme] = Binding(name.lexeme, scope)
+        binding.declaration = declaration
 
     def define(self, name: Token) -> None:
         if len(self.scopes) == 0:
             return
-        self.scopes[-1][name.lexeme] = True
+        self.scopes[-1].bindings[name.lexeme].defined = True
+
+    def error(self, line: int, message: str) -> None:
+        if self.deferred is not None:
+            self.deferred.append((line, message))
+        else:
+            lox.errors.error(line, message)
+
+    def bind_keyword(self, name: str) -> None:
+        binding = self.scopes[-1].bindings[name] = Binding(name, self.scopes[-1])
+        binding.defined = binding.captured = True
 
     def resolve_local(self, expr: Expr, name: Token) -> None:
-        for n, scope in enumerate(reversed(self.scopes)):
-            if name.lexeme in scope:
-                self.interpreter.resolve(expr, n)
+        for scope in reversed(self.scopes):
+            binding: Optional[Binding] = scope.bindings.get(name.lexeme)
+            if binding is not None:
+                origin: Scope = self.scopes[-1]
+                if isinstance(expr, Assign):
+                    binding.assigned = True
+                if scope.layout is not origin.layout:
+                    if self.functions and binding.declaration is self.functions[-1]:
+                        binding.self_references.append((expr, origin))
+                        return
+                    # Reached from another function, the binding outlives its frame
+                    binding.captured = True
+                binding.references.append((expr, origin))
                 return
+        self.interpreter.resolve_global(expr, name)
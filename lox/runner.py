@@ -0,0 +1,150 @@
+import os
+
+import lox.errors
+from lox.interpreter import Interpreter
+from lox.parser import Laziness, Parser
+from lox.resolver import Resolver
+from lox.runtime_error import InterpreterRuntimeError
+from lox.scanner import Scanner
+from lox.stmt import Stmt
+from lox.tokens import Token
+
+from typing import Optional
+
+
+def run_file(
+    path: str,
+    interpreter: Interpreter,
+    single_pass: bool = False,
+    laziness: Laziness = Laziness.EAGER,
+    shake: bool = False,
+) -> None:
+    data = open(path).read().encode("ascii")
+    interpreter.directory = os.path.dirname(path)
+    run(data.decode("ascii"), interpreter, single_pass, laziness, shake)
+
+    # Indicate an error in the exit code.
+    if lox.errors.had_error:
+        exit(65)
+    if lox.errors.had_runtime_error:
+        exit(70)
+
+
+def run_prompt(
+    interpreter: Interpreter,
+    single_pass: bool = False,
+    laziness: Laziness = Laziness.EAGER,
+) -> None:
+    try:
+        while True:
+            line: str = input("> ")
+            if line == " ":
+                break
+            run(line, interpreter, single_pass, laziness)
+            lox.errors.had_error = False
+    except EOFError:
+        pass
+
+
+def run(
+    source: str,
+    interpreter: Interpreter,
+    single_pass: bool = False,
+    laziness: Laziness = Laziness.EAGER,
+    shake: bool = False,
+) -> None:
+    statements: Optional[list[Stmt]] = prepare(
+        source, interpreter, single_pass, laziness, shake
+    )
+    if statements is not None:
+        interpreter.interpret(statements)
+
+
+def prepare(
+    source: str,
+    interpreter: Interpreter,
+    single_pass: bool = False,
+    laziness: Laziness = Laziness.EAGER,
+    shake: bool = False,
+) -> Optional[list[Stmt]]:
+    scanner = Scanner(source)
+    tokens: list[Token] = scanner.scan_tokens()
+
+    # In a single pass the parser resolves the statements as it builds them
+    parser = Parser(tokens, interpreter if single_pass else None, laziness)
+    statements: list[Stmt] = parser.parse()
+
+    # Stop if there was a syntax error
+    if lox.errors.had_error:
+        return None
+    interpreter.statement_lines(parser.lines)
+
+    if not single_pass:
+        resolver = Resolver(interpreter)
+        resolver.resolve(statements)
+
+        # Stop if there was a resolution error
+        if lox.errors.had_error:
+            return None
+
+    try:
+        # Only a whole program can be shaken, as later lines of a session could
+        # use what it leaves out
+        if shake:
+            from lox.tree_shaking import TreeShaker
+
+            statements = TreeShaker(statements).shake()
+
+        if interpreter.memo_size:
+            # Which reads every body, lazily parsed ones included
+            interpreter.find_pure_functions(statements)
+    except RecursionError:
+        # Only possible in a single pass, as the resolver reports it otherwise
+        report_too_deep(statements, interpreter)
+    if lox.errors.had_error:
+        return None
+    return statements
+
+
+# Reports the first statement nested too deeply to be walked
+def report_too_deep(statements: list[Stmt], interpreter: Interpreter) -> None:
+    from lox.ast_walker import AstWalker
+
+    for statement in statements:
+        try:
+            AstWalker().walk(statement)
+        except InterpreterRuntimeError:
+            # A lazily parsed body with errors, reported already
+            pass
+        except RecursionError:
+            line: int = interpreter.lines.get(statement, 0)
+            return lox.errors.error(line, "Expression too deeply nested")
+
+
+# Writes the script, shaken, to output as a single file instead of running it
+def bundle_file(
+    path: str,
+    output: str,
+    interpreter: Interpreter,
+    single_pass: bool = False,
+    laziness: Laziness = Laziness.EAGER,
+) -> None:
+    from lox.unparser import Unparser
+
+    data = open(path).read().encode("ascii")
+    interpreter.directory = os.path.dirname(path)
+    statements: Optional[list[Stmt]] = prepare(
+        data.decode("ascii"), interpreter, single_pass, laziness, shake=True
+    )
+    if statements is None:
+        exit(65)
+    try:
+        # Lazily parsed bodies add their imports as they are written out
+        source: str = Unparser(
+            interpreter.imports, os.path.dirname(os.path.abspath(output))
+        ).unparse(statements)
+    except InterpreterRuntimeError:
+        # A lazily parsed body had errors, reported as it was read
+        exit(65)
+    with open(output, "w") as file:
+        file.write(source)
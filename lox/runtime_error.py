@@ -5,3 +5,9 @@ class InterpreterRuntimeError(Exception):
     def __init__(self, token: Token, message: str) -> None:
         super().__init__(message)
         self.token: Token = token
+
+
+# Raised by natives, which do not know where they are called from: the call
+# reports it as a runtime error on its line
+class NativeError(Exception):
+    pass
@@ -9,6 +9,7 @@ keywords: dict[str, TokenType] = {
     "for": TokenType.FOR,
     "fun": TokenType.FUN,
     "if": TokenType.IF,
+    "import": TokenType.IMPORT,
     "nil": TokenType.NIL,
     "or": TokenType.OR,
     "print": TokenType.PRINT,
@@ -98,9 +99,7 @@ class Scanner:
                 elif self.is_alpha(c):
                     self.identifier()
                 else:
-                    import lox.__main__ as __main__
-
-                    __main__.error(self.line, f"Unexpected character: {c}")
+                    lox.errors.error(self.line, f"Unexpected character: {c}")
 
     def identifier(self):
         while self.is_alphanumeric(self.peek()):
@@ -130,9 +129,7 @@ class Scanner:
             self.advance()
 
         if self.at_end():
-            import lox.__main__ as __main__
-
-            __main__.error(self.line, "Unterminated string")
+            lox.errors.error(self.line, "Unterminated string")
             return
 
         # The closing '"'
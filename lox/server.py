@@ -0,0 +1,225 @@
+import asyncio
+import contextlib
+import io
+import json
+import os
+import select
+import signal
+import socket
+import sys
+import traceback
+
+import lox.errors
+from lox.interpreter import Interpreter
+from lox.runner import prepare
+from lox.stmt import Stmt
+
+from typing import Optional
+
+# Number of resolved scripts kept warm, the oldest being dropped first
+MAX_CACHED: int = 256
+
+
+def message(key: str, value: object) -> bytes:
+    return json.dumps({key: value}).encode() + b"\n"
+
+
+# Forwards what loading a script reports to the client, through the event loop
+class ClientStream(io.TextIOBase):
+    def __init__(self, writer: asyncio.StreamWriter, channel: str) -> None:
+        self.writer: asyncio.StreamWriter = writer
+        self.channel: str = channel
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if text:
+            self.writer.write(message(self.channel, text))
+        return len(text)
+
+
+# Sends what a running script prints to the client as soon as it is written,
+# from the process running it. The socket is shared with the event loop of the
+# daemon, which keeps it non-blocking.
+class SocketStream(io.TextIOBase):
+    def __init__(self, connection: socket.socket, channel: str) -> None:
+        self.connection: socket.socket = connection
+        self.channel: str = channel
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if text:
+            data = memoryview(message(self.channel, text))
+            while data:
+                select.select([], [self.connection], [])
+                try:
+                    data = data[self.connection.send(data) :]
+                except BlockingIOError:
+                    pass
+        return len(text)
+
+
+class CachedScript:
+    def __init__(
+        self, stamp: object, statements: list[Stmt], interpreter: Interpreter
+    ) -> None:
+        self.stamp: object = stamp
+        self.statements: list[Stmt] = statements
+        self.interpreter: Interpreter = interpreter
+
+
+# A long lived process running scripts for thin clients, which saves them the
+# cost of starting Python and importing the interpreter. Scripts are kept parsed
+# and resolved; each run starts from fresh globals.
+class Server:
+    def __init__(
+        self,
+        socket_path: str,
+        stackless: bool,
+        max_depth: int,
+        single_pass: bool,
+        memo_size: int,
+    ) -> None:
+        self.socket_path: str = socket_path
+        self.stackless: bool = stackless
+        self.max_depth: int = max_depth
+        self.single_pass: bool = single_pass
+        self.memo_size: int = memo_size
+        self.cache: dict[str, CachedScript] = dict()
+
+    async def serve(self) -> None:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.socket_path)
+        # Created for the owner only: changing its mode once bound would leave
+        # other users a moment to connect
+        umask: int = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(
+                self.handle, path=self.socket_path
+            )
+        finally:
+            os.umask(umask)
+        stop = asyncio.Event()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            asyncio.get_running_loop().add_signal_handler(signal_number, stop.set)
+        async with server:
+            await stop.wait()
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            request = json.loads(await reader.readline())
+            # Loading fills the cache of the daemon, so it happens here, with
+            # what it reports captured by redirecting the process wide streams
+            stdout = ClientStream(writer, "stdout")
+            stderr = ClientStream(writer, "stderr")
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(
+                stderr
+            ):
+                script, code = self.prepare(request)
+            await writer.drain()
+            if script is not None:
+                code = await self.run(script, writer.get_extra_info("socket"))
+            writer.write(message("exit", code))
+            await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def prepare(self, request: dict[str, str]) -> tuple[Optional[CachedScript], int]:
+        lox.errors.reset()
+        try:
+            script: Optional[CachedScript] = self.load(request)
+        except OSError as error:
+            print(f"Cannot read script: {error}", file=sys.stderr)
+            return None, 66
+        except Exception:
+            traceback.print_exc()
+            return None, 1
+        return script, 65
+
+    # Each script runs in a process forked for it, so that it neither holds up
+    # the other clients nor changes the scripts kept warm, and what it prints
+    # goes straight to its client
+    async def run(self, script: CachedScript, connection: socket.socket) -> int:
+        descriptor: int = os.dup(connection.fileno())
+        pid: int = os.fork()
+        if pid == 0:
+            code: int = 1
+            try:
+                code = self.run_child(script, descriptor)
+            finally:
+                os._exit(code)
+        os.close(descriptor)
+        _, status = await asyncio.to_thread(os.waitpid, pid, 0)
+        return os.waitstatus_to_exitcode(status)
+
+    def run_child(self, script: CachedScript, descriptor: int) -> int:
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signal_number, signal.SIG_DFL)
+        connection = socket.socket(fileno=descriptor)
+        sys.stdout = SocketStream(connection, "stdout")
+        sys.stderr = SocketStream(connection, "stderr")
+        # The input of the daemon is not the client's: reading it is refused
+        # as reading a closed file
+        sys.stdin = io.StringIO()
+        sys.stdin.close()
+        try:
+            script.interpreter.interpret(script.statements)
+        except Exception:
+            traceback.print_exc()
+            return 1
+        return 70 if lox.errors.had_runtime_error else 0
+
+    def load(self, request: dict[str, str]) -> Optional[CachedScript]:
+        if "path" in request:
+            key: str = request["path"]
+            status = os.stat(key)
+            stamp: object = (status.st_mtime_ns, status.st_size)
+        else:
+            key = stamp = request["source"]
+        script: Optional[CachedScript] = self.cache.get(key)
+        if script is not None and script.stamp == stamp:
+            return script
+        source: str = (
+            open(key).read().encode("ascii").decode("ascii")
+            if "path" in request
+            else key
+        )
+        interpreter = Interpreter(
+            stackless=self.stackless,
+            max_depth=self.max_depth,
+            memo_size=self.memo_size,
+        )
+        if "path" in request:
+            interpreter.directory = os.path.dirname(key)
+        statements: Optional[list[Stmt]] = prepare(
+            source, interpreter, self.single_pass
+        )
+        if statements is None:
+            return None
+        self.cache.pop(key, None)
+        if len(self.cache) >= MAX_CACHED:
+            del self.cache[next(iter(self.cache))]
+        script = self.cache[key] = CachedScript(stamp, statements, interpreter)
+        return script
+
+
+def serve(
+    socket_path: str,
+    stackless: bool,
+    max_depth: int,
+    single_pass: bool,
+    memo_size: int,
+) -> None:
+    server = Server(socket_path, stackless, max_depth, single_pass, memo_size)
+    try:
+        asyncio.run(server.serve())
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(socket_path)
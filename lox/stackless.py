@@ -0,0 +1,400 @@
+import lox.expr as expr
+import lox.stmt as stmt
+from lox.expr import Expr
+from lox.stmt import Stmt
+from lox.tokens import Token
+from lox.environment import Environment
+from lox.runtime_error import InterpreterRuntimeError, NativeError
+from lox.return_value import ReturnValue
+from lox.tail_call import TailCall
+from lox.lox_callable import LoxCallable
+from lox.lox_function import LoxFunction
+from lox.function_layout import FunctionLayout
+from lox.lox_class import LoxClass
+from lox.lox_instance import LoxInstance
+from lox.memo_cache import MISSING, MemoCache, memo_key
+from lox.type_feedback import (
+    GenericBinary,
+    GenericUnary,
+    NumberBinary,
+    NumberUnary,
+    StringBinary,
+)
+
+from types import GeneratorType
+from typing import Awaitable, Generator, Optional, Union
+
+Node = Union[Expr, Stmt]
+Frame = Generator[Union[Node, GeneratorType], object, object]
+
+
+# Returned by a native that has to wait. The task running the call is suspended
+# until the awaitable is done, its result being the value of the call.
+class Suspend:
+    def __init__(self, awaitable: Awaitable) -> None:
+        self.awaitable: Awaitable = awaitable
+
+
+Steps = Generator[Suspend, object, object]
+
+
+# What a node tells the call finder: whether it has calls, when that does not
+# depend on its children, or else the children that decide it
+Found = Union[bool, tuple[Optional[Node], ...]]
+
+
+# Nodes that cannot enter a Lox call are handed to the recursive interpreter
+# as a whole, their Python stack usage being bounded by the source nesting.
+class CallFinder(expr.Visitor, stmt.Visitor):
+    def __init__(self) -> None:
+        self.cache: dict[Node, bool] = {}
+
+    def has_call(self, node: Node) -> bool:
+        found = self.cache.get(node)
+        if found is not None:
+            return found
+        # Searched on an explicit stack, as the operator chains the parser
+        # accepts are deeper than Python's, each node once its children are
+        stack: list[tuple[Node, Optional[tuple[Optional[Node], ...]]]] = [
+            (node, None)
+        ]
+        while stack:
+            current, children = stack.pop()
+            if children is not None:
+                self.cache[current] = any(
+                    child is not None and self.cache[child] for child in children
+                )
+                continue
+            if current in self.cache:
+                continue
+            found = current.accept(self)
+            if type(found) is bool:
+                self.cache[current] = found
+                continue
+            stack.append((current, found))
+            stack.extend((child, None) for child in found if child is not None)
+        return self.cache[node]
+
+    def visit_block_stmt(self, stmt: stmt.Block) -> Found:
+        return tuple(stmt.statements)
+
+    def visit_class_stmt(self, stmt: stmt.Class) -> Found:
+        return False
+
+    def visit_expression_stmt(self, stmt: stmt.Expression) -> Found:
+        return (stmt.expression,)
+
+    def visit_function_stmt(self, stmt: stmt.Function) -> Found:
+        return False
+
+    def visit_if_stmt(self, stmt: stmt.If) -> Found:
+        return (stmt.condition, stmt.then_branch, stmt.else_branch)
+
+    def visit_print_stmt(self, stmt: stmt.Print) -> Found:
+        return (stmt.expression,)
+
+    def visit_return_stmt(self, stmt: stmt.Return) -> Found:
+        return (stmt.value,)
+
+    def visit_var_stmt(self, stmt: stmt.Var) -> Found:
+        return (stmt.initializer,)
+
+    def visit_while_stmt(self, stmt: stmt.While) -> Found:
+        return (stmt.condition, stmt.body)
+
+    def visit_import_stmt(self, stmt: stmt.Import) -> Found:
+        # Importing runs the module's statements through the engine anew
+        return False
+
+    def visit_assign_expr(self, expr: expr.Assign) -> Found:
+        return (expr.value,)
+
+    def visit_binary_expr(self, expr: expr.Binary) -> Found:
+        return (expr.left, expr.right)
+
+    def visit_call_expr(self, expr: expr.Call) -> Found:
+        return True
+
+    def visit_get_expr(self, expr: expr.Get) -> Found:
+        return (expr.instance,)
+
+    def visit_grouping_expr(self, expr: expr.Grouping) -> Found:
+        return (expr.expression,)
+
+    def visit_literal_expr(self, expr: expr.Literal) -> Found:
+        return False
+
+    def visit_logical_expr(self, expr: expr.Logical) -> Found:
+        return (expr.left, expr.right)
+
+    def visit_set_expr(self, expr: expr.Set) -> Found:
+        return (expr.instance, expr.value)
+
+    def visit_super_expr(self, expr: expr.Super) -> Found:
+        return False
+
+    def visit_this_expr(self, expr: expr.This) -> Found:
+        return False
+
+    def visit_unary_expr(self, expr: expr.Unary) -> Found:
+        return (expr.right,)
+
+    def visit_variable_expr(self, expr: expr.Variable) -> Found:
+        return False
+
+    def visit_number_binary_expr(self, expr: expr.Binary) -> Found:
+        return self.visit_binary_expr(expr)
+
+    def visit_string_binary_expr(self, expr: expr.Binary) -> Found:
+        return self.visit_binary_expr(expr)
+
+    def visit_generic_binary_expr(self, expr: expr.Binary) -> Found:
+        return self.visit_binary_expr(expr)
+
+    def visit_number_unary_expr(self, expr: expr.Unary) -> Found:
+        return self.visit_unary_expr(expr)
+
+    def visit_generic_unary_expr(self, expr: expr.Unary) -> Found:
+        return self.visit_unary_expr(expr)
+
+
+# Nodes that may call into Lox code are evaluated by generators which yield the
+# child nodes they need and are sent back their values. The generators live on
+# an explicit stack, so Lox recursion is bounded by max_depth and not by Python.
+class Stackless:
+    def __init__(self, interpreter, max_depth: int) -> None:
+        self.interpreter = interpreter
+        self.max_depth: int = max_depth
+        self.depth: int = 0
+        self.calls: CallFinder = CallFinder()
+        self.frames: dict[type, object] = {
+            stmt.Block: self.block,
+            stmt.Expression: self.expression,
+            stmt.If: self.if_stmt,
+            stmt.Print: self.print_stmt,
+            stmt.Return: self.return_stmt,
+            stmt.Var: self.var,
+            stmt.While: self.while_stmt,
+            expr.Assign: self.assign,
+            expr.Binary: self.binary,
+            expr.Call: self.call,
+            expr.Get: self.get,
+            expr.Grouping: self.grouping,
+            expr.Logical: self.logical,
+            expr.Set: self.set,
+            expr.Unary: self.unary,
+        }
+        for specialized in (GenericBinary, NumberBinary, StringBinary):
+            self.frames[specialized] = self.binary
+        for specialized in (GenericUnary, NumberUnary):
+            self.frames[specialized] = self.unary
+
+    def run(self, node: Node) -> object:
+        # Nodes without calls go through evaluate, which accepts statements too
+        if not self.calls.has_call(node):
+            return self.interpreter.evaluate(node)
+        steps: Steps = self.steps(self.frame(node))
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
+        raise RuntimeError("Only fibers can be suspended")
+
+    # Runs the frame to completion, handing out the suspensions it asks for to
+    # the driver, which sends back their results
+    def steps(self, root: Frame) -> Steps:
+        stack: list[Frame] = [root]
+        value: object = None
+        error: Optional[Exception] = None
+        while stack:
+            try:
+                if error is None:
+                    item = stack[-1].send(value)
+                else:
+                    item, error = stack[-1].throw(error), None
+            except StopIteration as stop:
+                stack.pop()
+                value, error = stop.value, None
+                continue
+            except Exception as raised:
+                stack.pop()
+                if not stack:
+                    raise
+                value, error = None, raised
+                continue
+            value = None
+            if isinstance(item, GeneratorType):
+                stack.append(item)
+            elif type(item) is Suspend:
+                try:
+                    value = yield item
+                except Exception as raised:
+                    error = raised
+            elif self.calls.has_call(item):
+                stack.append(self.frame(item))
+            else:
+                try:
+                    value = self.interpreter.evaluate(item)
+                except Exception as raised:
+                    error = raised
+        return value
+
+    def frame(self, node: Node) -> Frame:
+        return self.frames[type(node)](node)
+
+    def invoke(
+        self,
+        function: LoxCallable,
+        arguments: list[object],
+        paren: Token,
+        memoize: bool = True,
+    ):
+        if isinstance(function, LoxClass):
+            instance = LoxInstance(function)
+            initializer: Optional[LoxFunction] = function.initializer
+            if initializer is not None:
+                yield self.invoke(initializer.bind(instance), arguments, paren)
+            return instance
+        if not isinstance(function, LoxFunction):
+            try:
+                value = function.call(self.interpreter, arguments)
+            except NativeError as error:
+                raise InterpreterRuntimeError(paren, str(error))
+            if type(value) is Suspend:
+                value = yield value
+            return value
+        memo: Optional[MemoCache] = function.memo
+        key = memo_key(arguments) if memoize and memo is not None else None
+        if memo is not None and key is not None:
+            value = memo.get(key)
+            if value is MISSING:
+                value = yield self.invoke(function, arguments, paren, False)
+                memo.put(key, value)
+            return value
+        if self.depth >= self.max_depth:
+            raise InterpreterRuntimeError(paren, "Stack overflow")
+        interpreter = self.interpreter
+        self.depth += 1
+        try:
+            while True:
+                # Read before entering, as a lazily parsed body is laid out on
+                # reading
+                body: list[Stmt] = function.declaration.body
+                environment, frame = function.enter(arguments)
+                # Taken now, as a tail call replaces the function before finally runs
+                layout: FunctionLayout = function.layout
+                previous: Environment = interpreter.environment
+                previous_frame: list[object] = interpreter.frame
+                interpreter.environment = environment
+                interpreter.frame = frame
+                try:
+                    for statement in body:
+                        yield statement
+                except TailCall as tail_call:
+                    function, arguments = tail_call.function, tail_call.arguments
+                    continue
+                except ReturnValue as return_value:
+                    if function.is_initializer:
+                        return function.closure.get_at(0, "this")
+                    return return_value.value
+                finally:
+                    interpreter.environment = previous
+                    interpreter.frame = previous_frame
+                    layout.release(frame)
+                if function.is_initializer:
+                    return function.closure.get_at(0, "this")
+                return None
+        finally:
+            self.depth -= 1
+
+    def block(self, stmt: stmt.Block):
+        interpreter = self.interpreter
+        if stmt in interpreter.inline_blocks:
+            for statement in stmt.statements:
+                yield statement
+            return
+        previous: Environment = interpreter.environment
+        interpreter.environment = Environment(previous)
+        try:
+            for statement in stmt.statements:
+                yield statement
+        finally:
+            interpreter.environment = previous
+
+    def expression(self, stmt: stmt.Expression):
+        yield stmt.expression
+
+    def if_stmt(self, stmt: stmt.If):
+        if self.interpreter.is_truthy((yield stmt.condition)):
+            yield stmt.then_branch
+        elif stmt.else_branch is not None:
+            yield stmt.else_branch
+
+    def print_stmt(self, stmt: stmt.Print):
+        value = yield stmt.expression
+        print(self.interpreter.stringify(value))
+
+    def return_stmt(self, stmt: stmt.Return):
+        if stmt in self.interpreter.tail_calls:
+            assert isinstance(stmt.value, expr.Call)
+            function, arguments = yield self.arguments(stmt.value)
+            if isinstance(function, LoxFunction):
+                raise TailCall(function, arguments)
+            value = yield self.invoke(function, arguments, stmt.value.paren)
+            raise ReturnValue(value)
+        value = (yield stmt.value) if stmt.value is not None else None
+        raise ReturnValue(value)
+
+    def var(self, stmt: stmt.Var):
+        value = (yield stmt.initializer) if stmt.initializer is not None else None
+        self.interpreter.define_variable(stmt, stmt.name, value)
+
+    def while_stmt(self, stmt: stmt.While):
+        while self.interpreter.is_truthy((yield stmt.condition)):
+            yield stmt.body
+
+    def assign(self, expr: expr.Assign):
+        value = yield expr.value
+        self.interpreter.assign_variable(expr, value)
+        return value
+
+    def binary(self, expr: expr.Binary):
+        left = yield expr.left
+        right = yield expr.right
+        return self.interpreter.binary_operation(expr, left, right)
+
+    def arguments(self, expr: expr.Call):
+        callee = yield expr.callee
+        arguments: list[object] = []
+        for argument in expr.arguments:
+            arguments.append((yield argument))
+        return self.interpreter.check_call(expr, callee, arguments), arguments
+
+    def call(self, expr: expr.Call):
+        function, arguments = yield self.arguments(expr)
+        return (yield self.invoke(function, arguments, expr.paren))
+
+    def get(self, expr: expr.Get):
+        instance = yield expr.instance
+        return self.interpreter.get_property(expr, instance)
+
+    def grouping(self, expr: expr.Grouping):
+        return (yield expr.expression)
+
+    def logical(self, expr: expr.Logical):
+        left = yield expr.left
+        if self.interpreter.short_circuits(expr, left):
+            return left
+        return (yield expr.right)
+
+    def set(self, expr: expr.Set):
+        instance = yield expr.instance
+        if not isinstance(instance, LoxInstance):
+            raise InterpreterRuntimeError(expr.name, "Only instances have fields")
+        value = yield expr.value
+        instance.set(expr.name, value)
+        return value
+
+    def unary(self, expr: expr.Unary):
+        right = yield expr.right
+        return self.interpreter.unary_operation(expr, right)
@@ -0,0 +1,85 @@
+import importlib.abc
+import importlib.machinery
+import sys
+import time
+
+from types import ModuleType, TracebackType
+from typing import Optional, Sequence
+
+
+# Runs a module's code under the report's clock
+class TimedLoader(importlib.abc.Loader):
+    def __init__(
+        self, loader: importlib.abc.Loader, report: "StartupReport"
+    ) -> None:
+        self.loader: importlib.abc.Loader = loader
+        self.report: StartupReport = report
+
+    def create_module(self, spec: importlib.machinery.ModuleSpec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module: ModuleType) -> None:
+        self.report.time(module.__name__, lambda: self.loader.exec_module(module))
+
+    def __getattr__(self, name: str) -> object:
+        return getattr(self.loader, name)
+
+
+# Times every module imported while it is active, each module's own time
+# excluding the modules it imports, then prints the breakdown to stderr.
+class StartupReport(importlib.abc.MetaPathFinder):
+    def __init__(self) -> None:
+        self.started: float = 0.0
+        self.modules: list[tuple[str, float, float]] = []
+        self.nested: list[float] = []
+
+    def find_spec(
+        self,
+        name: str,
+        path: Optional[Sequence[str]],
+        target: Optional[ModuleType] = None,
+    ) -> Optional[importlib.machinery.ModuleSpec]:
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = TimedLoader(spec.loader, self)
+                return spec
+        return None
+
+    def time(self, name: str, load) -> None:
+        started: float = time.perf_counter()
+        self.nested.append(0.0)
+        try:
+            load()
+        finally:
+            total: float = time.perf_counter() - started
+            nested: float = self.nested.pop()
+            if self.nested:
+                self.nested[-1] += total
+            self.modules.append((name, total - nested, total))
+
+    def __enter__(self) -> "StartupReport":
+        self.started = time.perf_counter()
+        sys.meta_path.insert(0, self)
+        return self
+
+    def __exit__(
+        self,
+        type: Optional[type[BaseException]],
+        value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        sys.meta_path.remove(self)
+        elapsed: float = time.perf_counter() - self.started
+        imports: float = sum(own for _, own, _ in self.modules)
+        self.line("module", "self ms", "total ms")
+        for name, own, total in sorted(self.modules, key=lambda module: -module[1]):
+            self.line(name, f"{own * 1000:.2f}", f"{total * 1000:.2f}")
+        self.line("all imports", f"{imports * 1000:.2f}")
+        self.line("initialisation and run", f"{(elapsed - imports) * 1000:.2f}")
+
+    def line(self, name: str, own: str, total: str = "") -> None:
+        print(f"{name:<32} {own:>9} {total:>9}", file=sys.stderr)
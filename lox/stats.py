@@ -0,0 +1,213 @@
+import gc
+import json
+import time
+
+from collections import Counter
+from types import TracebackType
+from typing import Callable, Optional
+
+from lox.environment import Environment
+from lox.expr import Expr
+from lox.interpreter import Interpreter
+from lox.lox_class import LoxClass
+from lox.lox_function import LoxFunction
+from lox.lox_instance import LoxInstance
+from lox.parser import Parser
+from lox.resolver import Resolver
+from lox.return_value import ReturnValue
+from lox.scanner import Scanner
+from lox.stackless import Stackless
+from lox.stmt import Stmt
+from lox.tokens import Token
+
+# Methods timed as a phase of the run, only the outermost of nested calls counts
+PHASES: dict[str, tuple[type, str]] = {
+    "scan": (Scanner, "scan_tokens"),
+    "parse": (Parser, "parse"),
+    "resolve": (Resolver, "resolve"),
+    "purity": (Interpreter, "find_pure_functions"),
+    "interpret": (Interpreter, "interpret"),
+}
+
+
+# The class the parser made a node of. Type feedback and lazy parsing replace
+# the classes of nodes with subclasses of their own, whose counts would depend
+# on when that happened.
+def syntax_class(node: type) -> type:
+    return next(
+        owner for owner in node.__mro__ if owner.__module__ in ("lox.expr", "lox.stmt")
+    )
+
+
+# Counts what the interpreter does while it is active and writes the counts to
+# a JSON file when it exits. The counting versions of the methods are patched
+# into the classes for that time only, so that runs without statistics do not
+# pay for them.
+class Stats:
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self.patched: list[tuple[type, str, object]] = []
+        self.nodes: Counter[type] = Counter()
+        self.counts: Counter[str] = Counter()
+        self.superclass_depth: Counter[int] = Counter()
+        self.phases: dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self.gc_before: list[dict[str, int]] = []
+        self.gc_seconds: float = 0.0
+        self.gc_started: float = 0.0
+
+    def __enter__(self) -> "Stats":
+        for phase, (owner, name) in PHASES.items():
+            self.patch(owner, name, self.timed(phase))
+        for owner, name in ((Interpreter, "execute"), (Interpreter, "evaluate")):
+            self.patch(owner, name, self.count_node)
+        # The stackless engine evaluates the nodes that can call Lox code itself
+        self.patch(Stackless, "frame", self.count_node)
+        self.patch(Stackless, "invoke", self.count_invoke)
+        self.patch(Environment, "__init__", self.count("environments"))
+        self.patch(LoxFunction, "enter", self.count("function_calls"))
+        self.patch(LoxFunction, "bind", self.count("binds"))
+        self.patch(LoxClass, "call", self.count("class_calls"))
+        self.patch(ReturnValue, "__init__", self.count("returns"))
+        self.patch(LoxInstance, "__init__", self.count("instances"))
+        self.patch(LoxInstance, "get", self.count_get)
+        self.gc_before = gc.get_stats()
+        gc.callbacks.append(self.time_gc)
+        return self
+
+    def __exit__(
+        self,
+        type: Optional[type[BaseException]],
+        value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        for owner, name, original in reversed(self.patched):
+            setattr(owner, name, original)
+        self.patched.clear()
+        gc.callbacks.remove(self.time_gc)
+        with open(self.path, "w") as file:
+            json.dump(self.report(), file, indent=2)
+            file.write("\n")
+
+    def report(self) -> dict[str, object]:
+        return {
+            "phase_seconds": self.phases,
+            "statements": self.node_counts(Stmt),
+            "expressions": self.node_counts(Expr),
+            "environments": self.counts["environments"],
+            "functions": {
+                "calls": self.counts["function_calls"],
+                "binds": self.counts["binds"],
+                "returns": self.counts["returns"],
+            },
+            "classes": {"calls": self.counts["class_calls"]},
+            "instances": {
+                "created": self.counts["instances"],
+                "property_lookups": self.counts["property_lookups"],
+                "field_hits": self.counts["field_hits"],
+                # Number of superclasses walked before a method was found, or
+                # to the root of the hierarchy for undefined properties
+                "superclass_depth": {
+                    str(depth): count
+                    for depth, count in sorted(self.superclass_depth.items())
+                },
+            },
+            "gc": self.gc_report(),
+        }
+
+    # Collections run by Python's cycle collector per generation while active
+    def gc_report(self) -> dict[str, object]:
+        generations: list[dict[str, int]] = [
+            {key: after[key] - before[key] for key in after}
+            for before, after in zip(self.gc_before, gc.get_stats())
+        ]
+        return {"generations": generations, "pause_seconds": self.gc_seconds}
+
+    def time_gc(self, phase: str, info: dict[str, int]) -> None:
+        if phase == "start":
+            self.gc_started = time.perf_counter()
+        else:
+            self.gc_seconds += time.perf_counter() - self.gc_started
+
+    def node_counts(self, kind: type) -> dict[str, int]:
+        counts: Counter[str] = Counter()
+        for node, count in self.nodes.items():
+            if issubclass(node, kind):
+                counts[syntax_class(node).__name__] += count
+        return dict(counts.most_common())
+
+    def patch(self, owner: type, name: str, wrap: Callable) -> None:
+        original = owner.__dict__[name]
+        self.patched.append((owner, name, original))
+        setattr(owner, name, wrap(original))
+
+    def count(self, key: str) -> Callable:
+        counts: Counter[str] = self.counts
+
+        def wrap(original: Callable) -> Callable:
+            def counted(*args, **kwargs):
+                counts[key] += 1
+                return original(*args, **kwargs)
+
+            return counted
+
+        return wrap
+
+    def count_node(self, original: Callable) -> Callable:
+        nodes: Counter[type] = self.nodes
+
+        def counted(owner: object, node: Expr | Stmt):
+            nodes[type(node)] += 1
+            return original(owner, node)
+
+        return counted
+
+    def count_invoke(self, original: Callable) -> Callable:
+        counts: Counter[str] = self.counts
+
+        # Stackless calls to classes do not go through LoxClass.call
+        def counted(stackless: Stackless, function: object, *args):
+            if isinstance(function, LoxClass):
+                counts["class_calls"] += 1
+            return original(stackless, function, *args)
+
+        return counted
+
+    def count_get(self, original: Callable) -> Callable:
+        counts: Counter[str] = self.counts
+        superclass_depth: Counter[int] = self.superclass_depth
+
+        def counted(instance: LoxInstance, name: Token) -> object:
+            counts["property_lookups"] += 1
+            if name.lexeme in instance.fields:
+                counts["field_hits"] += 1
+            else:
+                depth: int = 0
+                klass: Optional[LoxClass] = instance.klass
+                while klass is not None and name.lexeme not in klass.methods:
+                    klass = klass.superclass
+                    depth += 1
+                superclass_depth[depth] += 1
+            return original(instance, name)
+
+        return counted
+
+    def timed(self, phase: str) -> Callable:
+        phases: dict[str, float] = self.phases
+
+        def wrap(original: Callable) -> Callable:
+            running: list[bool] = [False]
+
+            def timed(*args, **kwargs):
+                if running[0]:
+                    return original(*args, **kwargs)
+                running[0] = True
+                started: float = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    phases[phase] += time.perf_counter() - started
+                    running[0] = False
+
+            return timed
+
+        return wrap
@@ -93,6 +93,16 @@ class While(Stmt):
         return visitor.visit_while_stmt(self)
 
 
+class Import(Stmt):
+    def __init__(self, keyword: Token, path: Token, name: Token):
+        self.keyword = keyword
+        self.path = path
+        self.name = name
+
+    def accept(self, visitor: VisitorFwd):
+        return visitor.visit_import_stmt(self)
+
+
 class Visitor:
     def visit_block_stmt(self, stmt: Block):
         raise NotImplementedError
@@ -120,3 +130,6 @@ class Visitor:
 
     def visit_while_stmt(self, stmt: While):
         raise NotImplementedError
+
+    def visit_import_stmt(self, stmt: Import):
+        raise NotImplementedError
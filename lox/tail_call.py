@@ -0,0 +1,7 @@
+from lox.lox_callable import LoxCallable
+
+
+class TailCall(Exception):
+    def __init__(self, function: LoxCallable, arguments: list[object]) -> None:
+        self.function: LoxCallable = function
+        self.arguments: list[object] = arguments
@@ -36,6 +36,7 @@ TokenType = Enum(
         "FUN",
         "FOR",
         "IF",
+        "IMPORT",
         "NIL",
         "OR",
         "PRINT",
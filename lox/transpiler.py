@@ -0,0 +1,629 @@
+import sys
+from types import MethodType, TracebackType
+
+import lox.expr as expr
+import lox.stmt as stmt
+from lox.expr import Expr
+from lox.interpreter import RECURSION_LIMIT
+from lox.lox_callable import LoxCallable
+from lox.lox_class import LoxClass
+from lox.lox_instance import LoxInstance
+from lox.runtime_error import InterpreterRuntimeError
+from lox.stmt import Stmt
+from lox.token_types import TokenType
+from lox.tokens import Token
+
+from typing import Callable, Optional
+
+# Python operators computing the Lox ones when both operands are numbers
+OPERATORS: dict[TokenType, str] = {
+    TokenType.GREATER: ">",
+    TokenType.GREATER_EQUAL: ">=",
+    TokenType.LESS: "<",
+    TokenType.LESS_EQUAL: "<=",
+    TokenType.MINUS: "-",
+    TokenType.PLUS: "+",
+    TokenType.SLASH: "/",
+    TokenType.STAR: "*",
+}
+EQUALITY: dict[TokenType, str] = {
+    TokenType.BANG_EQUAL: "!=",
+    TokenType.EQUAL_EQUAL: "==",
+}
+# Lox operators whose result is always a boolean
+BOOLEAN: set[TokenType] = {
+    TokenType.GREATER,
+    TokenType.GREATER_EQUAL,
+    TokenType.LESS,
+    TokenType.LESS_EQUAL,
+    *EQUALITY,
+}
+
+# Raised for programs the backend cannot compile, which the tree walking
+# interpreter runs instead
+class Unsupported(Exception):
+    pass
+
+
+# A variable captured by a closure. A closure is given the cell itself when it
+# is created, so that closures created in different passes through a loop body
+# see different variables, as they do with environments.
+class Cell:
+    __slots__ = ("value",)
+
+    def __init__(self, value: object) -> None:
+        self.value: object = value
+
+    def set(self, value: object) -> object:
+        self.value = value
+        return value
+
+
+# What a function returns for a call in tail position, which the trampoline it
+# returns to then makes, so that the Python stack does not grow
+class Bounce:
+    __slots__ = ("function", "arguments")
+
+    def __init__(self, function: Callable, *arguments: object) -> None:
+        self.function: Callable = function
+        self.arguments: tuple[object, ...] = arguments
+
+
+def trampoline(body: Callable) -> Callable:
+    def run(*arguments: object) -> object:
+        result: object = body(*arguments)
+        while type(result) is Bounce:
+            result = result.function(*result.arguments)
+        return result
+
+    return run
+
+
+# A Lox function compiled to a Python one. With tail calls, the function is the
+# trampoline callers call, and the body what tail calls make, which may bounce.
+class CompiledFunction(LoxCallable):
+    def __init__(
+        self,
+        name: str,
+        params: int,
+        function: Callable,
+        is_initializer: bool,
+        body: Optional[Callable] = None,
+    ) -> None:
+        self.name: str = name
+        self.params: int = params
+        self.function: Callable = function
+        self.is_initializer: bool = is_initializer
+        self.body: Callable = function if body is None else body
+
+    def __str__(self) -> str:
+        return f"<fn {self.name}>"
+
+    def arity(self) -> int:
+        return self.params
+
+    def bind(self, instance: LoxInstance) -> "CompiledFunction":
+        function: MethodType = MethodType(self.function, instance)
+        return CompiledFunction(
+            self.name,
+            self.params,
+            function,
+            self.is_initializer,
+            function if self.body is self.function else MethodType(self.body, instance),
+        )
+
+    def call(self, interpreter, arguments: list[object]) -> Optional[object]:
+        return self.function(*arguments)
+
+    # How LoxClass runs an initializer
+    run = call
+
+
+# A local variable and the Python name it was given, unique in the program
+class Binding:
+    def __init__(self, name: str, cell: bool, function: "FunctionCode") -> None:
+        self.name: str = name
+        self.cell: bool = cell
+        self.function: FunctionCode = function
+
+
+class FunctionCode:
+    def __init__(self, is_initializer: bool = False) -> None:
+        self.is_initializer: bool = is_initializer
+        # Cells of enclosing functions used in this one, passed in as defaults
+        self.free: dict[str, Binding] = dict()
+        self.tail_calls: bool = False
+
+
+# Turns resolved statements into Python source. Lox functions become Python
+# functions and their locals Python locals, except for those captured by
+# closures, which are cells. Globals are globals of the generated module, their
+# names suffixed with '_' so that none can clash with the generated code's own.
+# Operations take a fast path for numbers and otherwise call back into the
+# interpreter, which raises its usual errors for the nodes the code came from.
+class Transpiler(expr.Visitor, stmt.Visitor):
+    def __init__(self, backend: "PythonBackend") -> None:
+        self.backend: PythonBackend = backend
+        self.interpreter = backend.interpreter
+        self.output: list[tuple[int, str, int]] = []
+        self.indent: int = 0
+        self.line: int = 0
+        self.scopes: list[dict[str, Binding]] = []
+        self.function: FunctionCode = FunctionCode()
+
+    def transpile(self, statements: list[Stmt]) -> list[tuple[int, str, int]]:
+        for statement in statements:
+            self.statement(statement)
+        return self.output
+
+    def emit(self, code: str) -> None:
+        self.output.append((self.indent, code, self.line))
+
+    def statement(self, statement: Stmt) -> None:
+        line: Optional[int] = self.interpreter.lines.get(statement)
+        if line is not None:
+            self.line = line
+        statement.accept(self)
+
+    def body(self, statement: Stmt) -> None:
+        self.indent += 1
+        start: int = len(self.output)
+        self.statement(statement)
+        if len(self.output) == start:
+            self.emit("pass")
+        self.indent -= 1
+
+    def expression(self, node: Expr) -> str:
+        return node.accept(self)
+
+    def condition(self, node: Expr) -> str:
+        code: str = self.expression(node)
+        if self.is_boolean(node):
+            return code
+        value: str = self.temporary()
+        return f"(({value} := {code}) is not None and {value} is not False)"
+
+    def is_boolean(self, node: Expr) -> bool:
+        if isinstance(node, expr.Grouping):
+            return self.is_boolean(node.expression)
+        if isinstance(node, expr.Binary):
+            return node.operator.type in BOOLEAN
+        if isinstance(node, expr.Unary):
+            return node.operator.type == TokenType.BANG
+        return isinstance(node, expr.Literal) and type(node.value) is bool
+
+    def constant(self, value: object) -> str:
+        return f"_K[{self.backend.constant(value)}]"
+
+    def temporary(self) -> str:
+        return f"_t{self.backend.unique()}"
+
+    def declare(self, name: Token, cell: bool) -> Optional[Binding]:
+        # Globals have no binding, their Python name being fixed
+        if not self.scopes:
+            return None
+        binding = Binding(f"{name.lexeme}_{self.backend.unique()}", cell, self.function)
+        self.scopes[-1][name.lexeme] = binding
+        return binding
+
+    def define(self, binding: Optional[Binding], name: Token, value: str) -> None:
+        if binding is None:
+            self.emit(f"{name.lexeme}_ = {value}")
+        elif binding.cell:
+            self.emit(f"{binding.name}.value = {value}")
+        else:
+            self.emit(f"{binding.name} = {value}")
+
+    def is_captured(self, declaration: Stmt) -> bool:
+        # Functions calling themselves by name are given to the body as a cell
+        if isinstance(declaration, stmt.Function):
+            if self.interpreter.layouts[declaration].itself is not None:
+                return True
+        return declaration not in self.interpreter.slots
+
+    def lookup(self, name: Token) -> Binding:
+        for scope in reversed(self.scopes):
+            binding: Optional[Binding] = scope.get(name.lexeme)
+            if binding is not None:
+                if binding.cell and binding.function is not self.function:
+                    self.function.free[binding.name] = binding
+                return binding
+        raise AssertionError(f"Unresolved local {name.lexeme}")
+
+    def global_name(self, name: Token) -> str:
+        # Left undefined, reading it raises a NameError, which run reports as
+        # Lox does, as a later program can still define it for the functions
+        # of this one
+        if f"{name.lexeme}_" not in self.backend.namespace:
+            self.backend.load_native(name.lexeme)
+        return f"{name.lexeme}_"
+
+    # The code making the function value of the declaration, once its body is
+    # defined
+    def function_code(
+        self,
+        declaration: stmt.Function,
+        is_method: bool = False,
+        superclass: Optional[str] = None,
+    ) -> str:
+        name: str = f"_f{self.backend.unique()}"
+        is_initializer: bool = is_method and declaration.name.lexeme == "init"
+        header: int = len(self.output)
+        self.emit("")
+        enclosing: FunctionCode = self.function
+        self.function = FunctionCode(is_initializer)
+        self.scopes.append(dict())
+        self.indent += 1
+        params: list[str] = ["this_"] if is_method else []
+        # Read first, as a lazily parsed body is only laid out once read
+        body: list[Stmt] = declaration.body
+        layout = self.interpreter.layouts[declaration]
+        for param, slot in zip(declaration.params, layout.params):
+            binding: Optional[Binding] = self.declare(param, slot is None)
+            assert binding is not None
+            params.append(binding.name)
+            if binding.cell:
+                self.emit(f"{binding.name} = _Cell({binding.name})")
+        for statement in body:
+            self.statement(statement)
+        if not body or not isinstance(body[-1], stmt.Return):
+            self.emit("return this_" if is_initializer else "return None")
+        self.indent -= 1
+        self.scopes.pop()
+        function: FunctionCode = self.function
+        self.function = enclosing
+        # Cells of functions further out are passed down through this one
+        for free, binding in function.free.items():
+            params.append(f"{free}={free}")
+            if binding.function is not enclosing:
+                enclosing.free[free] = binding
+        if superclass is not None:
+            params.append(f"super_={superclass}")
+        line: int = self.output[header][2]
+        self.output[header] = (self.indent, f"def {name}({', '.join(params)}):", line)
+        lexeme: str = declaration.name.lexeme
+        arguments: str = f"{lexeme!r}, {len(declaration.params)}"
+        if function.tail_calls:
+            return f"_Function({arguments}, _trampoline({name}), False, {name})"
+        return f"_Function({arguments}, {name}, {is_initializer})"
+
+    def visit_block_stmt(self, stmt: stmt.Block) -> None:
+        self.scopes.append(dict())
+        for statement in stmt.statements:
+            self.statement(statement)
+        self.scopes.pop()
+
+    def visit_class_stmt(self, stmt: stmt.Class) -> None:
+        superclass: Optional[str] = None
+        if stmt.superclass is not None:
+            superclass = self.temporary()
+            self.emit(f"{superclass} = {self.expression(stmt.superclass)}")
+            self.emit(f"if not isinstance({superclass}, _Class):")
+            self.emit(f"    _superclass_error({self.constant(stmt.superclass.name)})")
+        binding: Optional[Binding] = self.declare(stmt.name, self.is_captured(stmt))
+        if binding is not None and binding.cell:
+            self.emit(f"{binding.name} = _Cell(None)")
+        methods: list[str] = [
+            f"{method.name.lexeme!r}: {self.function_code(method, True, superclass)}"
+            for method in stmt.methods
+        ]
+        self.define(
+            binding,
+            stmt.name,
+            f"_Class({stmt.name.lexeme!r}, {superclass}, {{{', '.join(methods)}}})",
+        )
+
+    def visit_expression_stmt(self, stmt: stmt.Expression) -> None:
+        self.emit(self.expression(stmt.expression))
+
+    def visit_function_stmt(self, stmt: stmt.Function) -> None:
+        binding: Optional[Binding] = self.declare(stmt.name, self.is_captured(stmt))
+        if binding is not None and binding.cell:
+            self.emit(f"{binding.name} = _Cell(None)")
+        self.define(binding, stmt.name, self.function_code(stmt))
+
+    def visit_if_stmt(self, stmt: stmt.If) -> None:
+        self.emit(f"if {self.condition(stmt.condition)}:")
+        self.body(stmt.then_branch)
+        if stmt.else_branch is not None:
+            self.emit("else:")
+            self.body(stmt.else_branch)
+
+    def visit_print_stmt(self, stmt: stmt.Print) -> None:
+        self.emit(f"_print({self.expression(stmt.expression)})")
+
+    def visit_return_stmt(self, stmt: stmt.Return) -> None:
+        if self.function.is_initializer:
+            self.emit("return this_")
+        elif stmt.value is None:
+            self.emit("return None")
+        elif stmt in self.interpreter.tail_calls:
+            # Made by the trampoline, as the tree walker loops instead of nesting
+            call = stmt.value
+            assert isinstance(call, expr.Call)
+            self.function.tail_calls = True
+            arguments: list[str] = [self.call(call, "body")]
+            arguments.extend(map(self.expression, call.arguments))
+            self.emit(f"return _Bounce({', '.join(arguments)})")
+        else:
+            self.emit(f"return {self.expression(stmt.value)}")
+
+    def visit_var_stmt(self, stmt: stmt.Var) -> None:
+        value: str = (
+            self.expression(stmt.initializer)
+            if stmt.initializer is not None
+            else "None"
+        )
+        binding: Optional[Binding] = self.declare(stmt.name, self.is_captured(stmt))
+        if binding is not None and binding.cell:
+            # A new cell each time, for the closures created after it
+            self.emit(f"{binding.name} = _Cell({value})")
+        else:
+            self.define(binding, stmt.name, value)
+
+    def visit_while_stmt(self, stmt: stmt.While) -> None:
+        self.emit(f"while {self.condition(stmt.condition)}:")
+        self.body(stmt.body)
+
+    def visit_import_stmt(self, stmt: stmt.Import) -> None:
+        raise Unsupported("modules")
+
+    def visit_assign_expr(self, expr: expr.Assign) -> str:
+        value: str = self.expression(expr.value)
+        if expr in self.interpreter.global_slots:
+            return f"_assign_global({self.constant(expr.name)}, {value})"
+        binding: Binding = self.lookup(expr.name)
+        if binding.cell:
+            return f"{binding.name}.set({value})"
+        return f"({binding.name} := {value})"
+
+    def visit_binary_expr(self, expr: expr.Binary) -> str:
+        left: str = self.expression(expr.left)
+        right: str = self.expression(expr.right)
+        operator: Optional[str] = EQUALITY.get(expr.operator.type)
+        if operator is not None:
+            return f"({left} {operator} {right})"
+        a, check_a = self.operand(expr.left, left)
+        b, check_b = self.operand(expr.right, right)
+        checks: str = " & ".join(check for check in (check_a, check_b) if check)
+        return (
+            f"({a} {OPERATORS[expr.operator.type]} {b}"
+            f" if {checks or 'True'} else _binary({self.constant(expr)}, {a}, {b}))"
+        )
+
+    # An operand of a binary operation and the check that it is a number, which
+    # number literals do without
+    def operand(self, node: Expr, code: str) -> tuple[str, str]:
+        if isinstance(node, expr.Literal) and type(node.value) is float:
+            return code, ""
+        value: str = self.temporary()
+        return value, f"(type({value} := {code}) is float)"
+
+    def visit_call_expr(self, expr: expr.Call) -> str:
+        arguments: str = ", ".join(map(self.expression, expr.arguments))
+        return f"({self.call(expr, 'function')}({arguments}))"
+
+    # The Python callable a call calls: the given attribute of compiled functions
+    # of the right arity, a checked call into the interpreter for anything else
+    def call(self, expr: expr.Call, attribute: str) -> str:
+        callee: str = self.temporary()
+        count: int = len(expr.arguments)
+        return (
+            f"({callee}.{attribute} if type({callee} := {self.expression(expr.callee)})"
+            f" is _Function and {callee}.params == {count}"
+            f" else _callable({callee}, {self.constant(expr)}))"
+        )
+
+    def visit_get_expr(self, expr: expr.Get) -> str:
+        instance: str = self.temporary()
+        return (
+            f"({instance}.get({self.constant(expr.name)})"
+            f" if type({instance} := {self.expression(expr.instance)}) is _Instance"
+            f" else _get({self.constant(expr)}, {instance}))"
+        )
+
+    def visit_grouping_expr(self, expr: expr.Grouping) -> str:
+        return f"({self.expression(expr.expression)})"
+
+    def visit_literal_expr(self, expr: expr.Literal) -> str:
+        return repr(expr.value)
+
+    def visit_logical_expr(self, expr: expr.Logical) -> str:
+        left: str = self.temporary()
+        truthy: str = (
+            f"({left} := {self.expression(expr.left)}) is not None"
+            f" and {left} is not False"
+        )
+        right: str = self.expression(expr.right)
+        if expr.operator.type == TokenType.OR:
+            return f"({left} if {truthy} else {right})"
+        return f"({right} if {truthy} else {left})"
+
+    def visit_set_expr(self, expr: expr.Set) -> str:
+        # The value is only evaluated once the object is known to have fields
+        instance: str = self.temporary()
+        return (
+            f"(_set_field({instance}, {self.constant(expr.name)},"
+            f" {self.expression(expr.value)})"
+            f" if type({instance} := {self.expression(expr.instance)}) is _Instance"
+            f" else _no_fields({self.constant(expr.name)}))"
+        )
+
+    def visit_super_expr(self, expr: expr.Super) -> str:
+        return f"_super(super_, this_, {self.constant(expr.method)})"
+
+    def visit_this_expr(self, expr: expr.This) -> str:
+        return "this_"
+
+    def visit_unary_expr(self, expr: expr.Unary) -> str:
+        right: str = self.temporary()
+        code: str = self.expression(expr.right)
+        if expr.operator.type == TokenType.BANG:
+            return f"(({right} := {code}) is None or {right} is False)"
+        return (
+            f"(-{right} if type({right} := {code}) is float"
+            f" else _unary({self.constant(expr)}, {right}))"
+        )
+
+    def visit_variable_expr(self, expr: expr.Variable) -> str:
+        if expr in self.interpreter.global_slots:
+            return self.global_name(expr.name)
+        binding: Binding = self.lookup(expr.name)
+        return f"{binding.name}.value" if binding.cell else binding.name
+
+
+# Runs programs by compiling them to Python, for CPython's own interpreter to
+# run. The generated globals, like those of the tree walking interpreter, last
+# from one program to the next, which the prompt relies on.
+class PythonBackend:
+    def __init__(self, interpreter) -> None:
+        self.interpreter = interpreter
+        self.constants: list[object] = []
+        self.indices: dict[int, int] = dict()
+        self.count: int = 0
+        # Lox line of each line of the code generated, by file name
+        self.lines: dict[str, list[int]] = dict()
+        self.namespace: dict[str, object] = {
+            "_K": self.constants,
+            "_Cell": Cell,
+            "_Function": CompiledFunction,
+            "_Bounce": Bounce,
+            "_trampoline": trampoline,
+            "_Class": LoxClass,
+            "_Instance": LoxInstance,
+            "_print": self.print,
+            "_binary": interpreter.binary_operation,
+            "_unary": interpreter.unary_operation,
+            "_get": interpreter.get_property,
+            "_callable": self.callable,
+            "_assign_global": self.assign_global,
+            "_set_field": self.set_field,
+            "_no_fields": self.no_fields,
+            "_super": self.super,
+            "_superclass_error": self.superclass_error,
+        }
+
+    # Forgets the globals of the programs run, as Interpreter.reset does
+    def reset(self) -> None:
+        for name in list(self.namespace):
+            if name.endswith("_") and not name.startswith("__"):
+                del self.namespace[name]
+
+    # Returns whether the statements ran, which they do unless they use
+    # something the backend cannot compile
+    def run(self, statements: list[Stmt]) -> bool:
+        name: str = f"<lox {len(self.lines)}>"
+        try:
+            output = Transpiler(self).transpile(statements)
+            source: str = "".join(
+                f"{'    ' * indent}{code}\n" for indent, code, _ in output
+            )
+            # Python limits how deeply blocks and expressions can nest
+            code = compile(source, name, "exec")
+        except Unsupported as error:
+            return self.fall_back(str(error))
+        except (SyntaxError, RecursionError):
+            return self.fall_back("code nested this deeply")
+        except InterpreterRuntimeError:
+            # A lazily parsed body had errors, which the tree walking
+            # interpreter only raises if the function is called
+            return self.fall_back("functions with syntax errors")
+        self.lines[name] = [line for _, _, line in output]
+        limit: int = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, RECURSION_LIMIT))
+        try:
+            exec(code, self.namespace)
+        except NameError as error:
+            # Read before their declaration ran, Lox globals are Python ones
+            # that do not exist yet
+            if error.name is None or not error.name.endswith("_"):
+                raise
+            lexeme: str = error.name[:-1]
+            token = Token(TokenType.IDENTIFIER, lexeme, None, self.line(error))
+            raise InterpreterRuntimeError(token, f"Undefined variable '{lexeme}'")
+        except RecursionError as error:
+            token = Token(TokenType.EOF, "", None, self.line(error))
+            raise InterpreterRuntimeError(token, "Stack overflow")
+        finally:
+            sys.setrecursionlimit(limit)
+        return True
+
+    def fall_back(self, reason: str) -> bool:
+        print(f"Cannot compile {reason}, walking the tree instead", file=sys.stderr)
+        return False
+
+    def line(self, error: BaseException) -> int:
+        line: int = 0
+        traceback: Optional[TracebackType] = error.__traceback__
+        while traceback is not None:
+            lines: Optional[list[int]] = self.lines.get(
+                traceback.tb_frame.f_code.co_filename
+            )
+            if lines is not None:
+                line = lines[traceback.tb_lineno - 1]
+            traceback = traceback.tb_next
+        return line
+
+    def constant(self, value: object) -> int:
+        index: Optional[int] = self.indices.get(id(value))
+        if index is None:
+            index = self.indices[id(value)] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    def unique(self) -> int:
+        self.count += 1
+        return self.count
+
+    # Reading an undefined global gives the native of that name, if any
+    def load_native(self, name: str) -> bool:
+        native: Optional[object] = self.interpreter.globals.natives.get(name)
+        if native is None:
+            from lox.natives import NATIVES
+
+            factory: Optional[Callable[[], LoxCallable]] = NATIVES.get(name)
+            if factory is None:
+                return False
+            native = factory()
+        self.namespace[f"{name}_"] = native
+        return True
+
+    def print(self, value: object) -> None:
+        print(self.interpreter.stringify(value))
+
+    def callable(self, callee: object, call: expr.Call) -> Callable:
+        interpreter = self.interpreter
+
+        def checked(*arguments: object) -> object:
+            function: LoxCallable = interpreter.check_call(
+                call, callee, list(arguments)
+            )
+            return interpreter.call(function, list(arguments), call.paren)
+
+        return checked
+
+    def assign_global(self, name: Token, value: object) -> object:
+        if f"{name.lexeme}_" not in self.namespace:
+            raise InterpreterRuntimeError(name, f"Undefined variable '{name.lexeme}'")
+        self.namespace[f"{name.lexeme}_"] = value
+        return value
+
+    def set_field(self, instance: LoxInstance, name: Token, value: object) -> object:
+        instance.fields[name.lexeme] = value
+        return value
+
+    def no_fields(self, name: Token) -> None:
+        raise InterpreterRuntimeError(name, "Only instances have fields")
+
+    def super(
+        self, superclass: LoxClass, instance: LoxInstance, method: Token
+    ) -> object:
+        function = superclass.find_method(method.lexeme)
+        if function is None:
+            raise InterpreterRuntimeError(
+                method, f"Undefined property {method.lexeme}"
+            )
+        return function.bind(instance)
+
+    def superclass_error(self, name: Token) -> None:
+        raise InterpreterRuntimeError(name, "Superclass must be a class")
@@ -0,0 +1,108 @@
+import lox.expr as expr
+import lox.stmt as stmt
+from lox.ast_walker import AstWalker
+from lox.runtime_error import InterpreterRuntimeError
+from lox.stmt import Stmt
+
+
+# The global names a subtree mentions. Lox has no way to look a variable up by
+# a name computed at run time, and property reads never reach variables, so
+# what is mentioned is all that can be read. Names are collected whatever they
+# resolve to, which only keeps more: a local shadowing a global keeps it too.
+class NameCollector(AstWalker):
+    def __init__(self) -> None:
+        self.names: set[str] = set()
+        self.assigned: set[str] = set()
+
+    def visit_function_stmt(self, stmt: stmt.Function) -> None:
+        try:
+            body: list[Stmt] = stmt.body
+        except InterpreterRuntimeError:
+            # A lazily parsed body with errors, which can never run
+            return
+        self.walk_all(body)
+
+    def visit_assign_expr(self, expr: expr.Assign) -> None:
+        self.names.add(expr.name.lexeme)
+        self.assigned.add(expr.name.lexeme)
+        super().visit_assign_expr(expr)
+
+    def visit_variable_expr(self, expr: expr.Variable) -> None:
+        self.names.add(expr.name.lexeme)
+
+
+# Leaves out the top level functions and classes that nothing that runs can
+# reach, starting from the other top level statements. Declaring a function
+# has no effect but the binding. Declaring a class also reads its superclass,
+# which fails unless it is a class, so a class is only left out while its
+# superclass is bound by class declarations alone, one of them before it, and
+# assigned by none of the code kept. Only that code is read, so the bodies of
+# lazily parsed functions left out are never parsed.
+class TreeShaker:
+    def __init__(self, statements: list[Stmt]) -> None:
+        self.statements: list[Stmt] = statements
+        # The declarations that can be left out, by the name they bind
+        self.declarations: dict[str, list[Stmt]] = dict()
+
+    def shake(self) -> list[Stmt]:
+        kept = NameCollector()
+        classes: set[str] = self.only_classes()
+        declared: set[str] = set()
+        for statement in self.statements:
+            if self.is_removable(statement, classes, declared):
+                name: str = statement.name.lexeme
+                self.declarations.setdefault(name, []).append(statement)
+            else:
+                kept.walk(statement)
+            if isinstance(statement, stmt.Class):
+                declared.add(statement.name.lexeme)
+        reached: set[str] = set()
+        while True:
+            new: set[str] = kept.names - reached
+            if new:
+                reached |= new
+                for name in new:
+                    kept.walk_all(self.declarations.pop(name, []))
+                continue
+            unsafe: list[stmt.Class] = [
+                declaration
+                for declarations in self.declarations.values()
+                for declaration in declarations
+                if isinstance(declaration, stmt.Class)
+                and declaration.superclass is not None
+                and declaration.superclass.name.lexeme in kept.assigned
+            ]
+            if not unsafe:
+                break
+            for declaration in unsafe:
+                self.declarations[declaration.name.lexeme].remove(declaration)
+                kept.walk(declaration)
+        removed: set[Stmt] = {
+            declaration
+            for declarations in self.declarations.values()
+            for declaration in declarations
+        }
+        return [statement for statement in self.statements if statement not in removed]
+
+    def is_removable(
+        self, statement: Stmt, classes: set[str], declared: set[str]
+    ) -> bool:
+        if isinstance(statement, stmt.Function):
+            return True
+        if not isinstance(statement, stmt.Class):
+            return False
+        if statement.superclass is None:
+            return True
+        superclass: str = statement.superclass.name.lexeme
+        return superclass in classes and superclass in declared
+
+    # Names only bound by class declarations at the top level
+    def only_classes(self) -> set[str]:
+        classes: set[str] = set()
+        others: set[str] = set()
+        for statement in self.statements:
+            if isinstance(statement, stmt.Class):
+                classes.add(statement.name.lexeme)
+            elif isinstance(statement, (stmt.Var, stmt.Function, stmt.Import)):
+                others.add(statement.name.lexeme)
+        return classes - others
@@ -0,0 +1,125 @@
+import operator
+from lox.expr import Binary, Expr, Unary
+from lox.token_types import TokenType
+
+from typing import Callable, TypeAlias
+
+VisitorFwd: TypeAlias = "Visitor"
+
+# Number of evaluations with the same operand types before a node is rewritten
+SPECIALIZE_AFTER: int = 4
+
+NUMBER_OPERATIONS: dict[TokenType, Callable[[float, float], object]] = {
+    TokenType.BANG_EQUAL: operator.ne,
+    TokenType.EQUAL_EQUAL: operator.eq,
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATER_EQUAL: operator.ge,
+    TokenType.LESS: operator.lt,
+    TokenType.LESS_EQUAL: operator.le,
+    TokenType.MINUS: operator.sub,
+    TokenType.PLUS: operator.add,
+    TokenType.SLASH: operator.truediv,
+    TokenType.STAR: operator.mul,
+}
+
+STRING_OPERATIONS: dict[TokenType, Callable[[str, str], object]] = {
+    TokenType.BANG_EQUAL: operator.ne,
+    TokenType.EQUAL_EQUAL: operator.eq,
+    TokenType.PLUS: operator.add,
+}
+
+
+# The node classes below replace Binary and Unary in place once the
+# interpreter has seen enough of their operands. Rewriting happens at run time,
+# so analyses walking the tree afterwards treat them as the classes they replace.
+class NumberBinary(Binary):
+    operation: Callable[[float, float], object]
+
+    def accept(self, visitor: VisitorFwd):
+        return visitor.visit_number_binary_expr(self)
+
+
+class StringBinary(Binary):
+    operation: Callable[[str, str], object]
+
+    def accept(self, visitor: VisitorFwd):
+        return visitor.visit_string_binary_expr(self)
+
+
+class GenericBinary(Binary):
+    def accept(self, visitor: VisitorFwd):
+        return visitor.visit_generic_binary_expr(self)
+
+
+class NumberUnary(Unary):
+    def accept(self, visitor: VisitorFwd):
+        return visitor.visit_number_unary_expr(self)
+
+
+class GenericUnary(Unary):
+    def accept(self, visitor: VisitorFwd):
+        return visitor.visit_generic_unary_expr(self)
+
+
+class TypeFeedback:
+    def __init__(self) -> None:
+        self.observed: dict[Expr, tuple[type, int]] = {}
+
+    def binary(self, expr: Binary, left: object, right: object) -> None:
+        kind = type(left)
+        if kind is not type(right):
+            expr.__class__ = GenericBinary
+            return
+        operations = (
+            NUMBER_OPERATIONS
+            if kind is float
+            else STRING_OPERATIONS if kind is str else None
+        )
+        if operations is None or expr.operator.type not in operations:
+            expr.__class__ = GenericBinary
+            return
+        if self.observe(expr, kind):
+            # Set first, as another thread may evaluate the node once swapped
+            expr.operation = operations[expr.operator.type]
+            expr.__class__ = NumberBinary if kind is float else StringBinary
+
+    def unary(self, expr: Unary, right: object) -> None:
+        kind = type(right)
+        if expr.operator.type != TokenType.MINUS or kind is not float:
+            expr.__class__ = GenericUnary
+            return
+        if self.observe(expr, kind):
+            expr.__class__ = NumberUnary
+
+    def observe(self, expr: Expr, kind: type) -> bool:
+        seen, count = self.observed.get(expr, (kind, 0))
+        if seen is not kind:
+            del self.observed[expr]
+            deoptimize(expr)
+            return False
+        if count + 1 < SPECIALIZE_AFTER:
+            self.observed[expr] = (kind, count + 1)
+            return False
+        self.observed.pop(expr, None)
+        return True
+
+    def deoptimize(self, expr: Expr) -> None:
+        deoptimize(expr)
+
+
+# The feedback of an interpreter once it starts threads, which share the nodes
+# and would race for the observations and the classes: nodes are left as they
+# are, a specialised one falling back to the generic operation on other types.
+class NoTypeFeedback(TypeFeedback):
+    def binary(self, expr: Binary, left: object, right: object) -> None:
+        pass
+
+    def unary(self, expr: Unary, right: object) -> None:
+        pass
+
+    def deoptimize(self, expr: Expr) -> None:
+        pass
+
+
+def deoptimize(expr: Expr) -> None:
+    expr.__class__ = GenericBinary if isinstance(expr, Binary) else GenericUnary
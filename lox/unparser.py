@@ -0,0 +1,178 @@
+import os
+from decimal import Decimal
+
+import lox.expr as expr
+import lox.stmt as stmt
+from lox.expr import Expr
+from lox.stmt import Stmt
+
+from typing import Optional
+
+INDENT: str = "    "
+
+
+# Writes statements back out as Lox source that parses to the same tree. The
+# parser keeps parentheses as groupings, so operands need none added. Loops
+# come out as the while loops and blocks that for loops are parsed into.
+# Given the paths imports resolved to, it writes them relative to the directory
+# the source goes to, so that they are found from there.
+class Unparser(expr.Visitor, stmt.Visitor):
+    def __init__(
+        self,
+        imports: Optional[dict[stmt.Import, str]] = None,
+        directory: str = "",
+    ) -> None:
+        self.lines: list[str] = []
+        self.indent: int = 0
+        self.imports: dict[stmt.Import, str] = {} if imports is None else imports
+        self.directory: str = directory
+
+    def unparse(self, statements: list[Stmt]) -> str:
+        for statement in statements:
+            self.statement(statement)
+        return "".join(f"{line}\n" for line in self.lines)
+
+    def emit(self, line: str) -> None:
+        self.lines.append(f"{INDENT * self.indent}{line}")
+
+    def statement(self, statement: Stmt) -> None:
+        statement.accept(self)
+
+    def body(self, statement: Stmt, head: str, braces: bool = False) -> None:
+        if isinstance(statement, stmt.Block):
+            self.emit(f"{head} {{")
+            self.nested(statement.statements)
+            self.emit("}")
+        elif braces:
+            self.emit(f"{head} {{")
+            self.nested([statement])
+            self.emit("}")
+        else:
+            self.emit(head)
+            self.nested([statement])
+
+    def nested(self, statements: list[Stmt]) -> None:
+        self.indent += 1
+        for statement in statements:
+            self.statement(statement)
+        self.indent -= 1
+
+    def function(self, declaration: stmt.Function, head: str) -> None:
+        params: str = ", ".join(param.lexeme for param in declaration.params)
+        self.emit(f"{head}{declaration.name.lexeme}({params}) {{")
+        self.nested(declaration.body)
+        self.emit("}")
+
+    def expression(self, node: Expr) -> str:
+        return node.accept(self)
+
+    def visit_block_stmt(self, stmt: stmt.Block) -> None:
+        self.emit("{")
+        self.nested(stmt.statements)
+        self.emit("}")
+
+    def visit_class_stmt(self, stmt: stmt.Class) -> None:
+        head: str = f"class {stmt.name.lexeme}"
+        if stmt.superclass is not None:
+            head += f" < {stmt.superclass.name.lexeme}"
+        self.emit(f"{head} {{")
+        self.indent += 1
+        for method in stmt.methods:
+            self.function(method, "")
+        self.indent -= 1
+        self.emit("}")
+
+    def visit_expression_stmt(self, stmt: stmt.Expression) -> None:
+        self.emit(f"{self.expression(stmt.expression)};")
+
+    def visit_function_stmt(self, stmt: stmt.Function) -> None:
+        self.function(stmt, "fun ")
+
+    def visit_if_stmt(self, stmt: stmt.If) -> None:
+        # Braces keep the else from going to an if in the then branch
+        self.body(
+            stmt.then_branch,
+            f"if ({self.expression(stmt.condition)})",
+            stmt.else_branch is not None and isinstance(stmt.then_branch, stmt.If),
+        )
+        if stmt.else_branch is not None:
+            self.body(stmt.else_branch, "else")
+
+    def visit_import_stmt(self, stmt: stmt.Import) -> None:
+        path: Optional[str] = self.imports.get(stmt)
+        if path is None:
+            self.emit(f"import {stmt.path.lexeme} as {stmt.name.lexeme};")
+        else:
+            path = os.path.relpath(path, self.directory)
+            self.emit(f'import "{path}" as {stmt.name.lexeme};')
+
+    def visit_print_stmt(self, stmt: stmt.Print) -> None:
+        self.emit(f"print {self.expression(stmt.expression)};")
+
+    def visit_return_stmt(self, stmt: stmt.Return) -> None:
+        if stmt.value is None:
+            self.emit("return;")
+        else:
+            self.emit(f"return {self.expression(stmt.value)};")
+
+    def visit_var_stmt(self, stmt: stmt.Var) -> None:
+        if stmt.initializer is None:
+            self.emit(f"var {stmt.name.lexeme};")
+        else:
+            self.emit(
+                f"var {stmt.name.lexeme} = {self.expression(stmt.initializer)};"
+            )
+
+    def visit_while_stmt(self, stmt: stmt.While) -> None:
+        self.body(stmt.body, f"while ({self.expression(stmt.condition)})")
+
+    def visit_assign_expr(self, expr: expr.Assign) -> str:
+        return f"{expr.name.lexeme} = {self.expression(expr.value)}"
+
+    def visit_binary_expr(self, expr: expr.Binary) -> str:
+        left: str = self.expression(expr.left)
+        return f"{left} {expr.operator.lexeme} {self.expression(expr.right)}"
+
+    def visit_call_expr(self, expr: expr.Call) -> str:
+        arguments: str = ", ".join(map(self.expression, expr.arguments))
+        return f"{self.expression(expr.callee)}({arguments})"
+
+    def visit_get_expr(self, expr: expr.Get) -> str:
+        return f"{self.expression(expr.instance)}.{expr.name.lexeme}"
+
+    def visit_grouping_expr(self, expr: expr.Grouping) -> str:
+        return f"({self.expression(expr.expression)})"
+
+    def visit_literal_expr(self, expr: expr.Literal) -> str:
+        value: object = expr.value
+        if value is None:
+            return "nil"
+        if value is True:
+            return "true"
+        if value is False:
+            return "false"
+        if isinstance(value, float):
+            # Lox numbers have no exponent
+            text: str = format(Decimal(repr(value)), "f")
+            return text[:-2] if text.endswith(".0") else text
+        return f'"{value}"'
+
+    def visit_logical_expr(self, expr: expr.Logical) -> str:
+        left: str = self.expression(expr.left)
+        return f"{left} {expr.operator.lexeme} {self.expression(expr.right)}"
+
+    def visit_set_expr(self, expr: expr.Set) -> str:
+        instance: str = self.expression(expr.instance)
+        return f"{instance}.{expr.name.lexeme} = {self.expression(expr.value)}"
+
+    def visit_super_expr(self, expr: expr.Super) -> str:
+        return f"super.{expr.method.lexeme}"
+
+    def visit_this_expr(self, expr: expr.This) -> str:
+        return "this"
+
+    def visit_unary_expr(self, expr: expr.Unary) -> str:
+        return f"{expr.operator.lexeme}{self.expression(expr.right)}"
+
+    def visit_variable_expr(self, expr: expr.Variable) -> str:
+        return expr.name.lexeme
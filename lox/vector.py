@@ -0,0 +1,235 @@
+import math
+import operator
+from array import array
+
+from lox.lox_callable import LoxCallable
+from lox.runtime_error import NativeError
+from lox.token_types import TokenType
+
+from typing import Callable
+
+# Vectors are NumPy arrays when it is installed, arrays of doubles otherwise
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def divide(left: float, right: float) -> float:
+    # What NumPy gives for a division by zero
+    if right == 0.0:
+        if left == 0.0 or math.isnan(left):
+            return math.nan
+        return math.copysign(math.inf, left) * math.copysign(1.0, right)
+    return left / right
+
+
+OPERATIONS: dict[TokenType, Callable[[float, float], float]] = {
+    TokenType.MINUS: operator.sub,
+    TokenType.PLUS: operator.add,
+    TokenType.SLASH: divide,
+    TokenType.STAR: operator.mul,
+}
+
+
+class Vector:
+    def __init__(self, data) -> None:
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __str__(self) -> str:
+        numbers: list[str] = []
+        for number in self.data:
+            text: str = str(float(number))
+            numbers.append(text[:-2] if text.endswith(".0") else text)
+        return f"[{', '.join(numbers)}]"
+
+
+def filled(size: int, value: float) -> Vector:
+    if numpy is not None:
+        return Vector(numpy.full(size, value, dtype=float))
+    return Vector(array("d", [value]) * size)
+
+
+def number_range(start: float, stop: float) -> Vector:
+    if numpy is not None:
+        return Vector(numpy.arange(start, stop, dtype=float))
+    size: int = max(0, math.ceil(stop - start))
+    return Vector(array("d", (start + index for index in range(size))))
+
+
+def from_numbers(numbers: list[float]) -> Vector:
+    if numpy is not None:
+        return Vector(numpy.array(numbers, dtype=float))
+    return Vector(array("d", numbers))
+
+
+# Arithmetic between two vectors of the same length, or a vector and a number
+def elementwise(operator: TokenType, left: object, right: object) -> Vector:
+    for operand in (left, right):
+        if not isinstance(operand, Vector) and type(operand) is not float:
+            raise NativeError("Operands must be vectors or numbers")
+    if (
+        isinstance(left, Vector)
+        and isinstance(right, Vector)
+        and len(left) != len(right)
+    ):
+        raise NativeError("Vectors must have the same length")
+    operation: Callable[[float, float], float] = OPERATIONS[operator]
+    if numpy is not None:
+        a = left.data if isinstance(left, Vector) else left
+        b = right.data if isinstance(right, Vector) else right
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            return Vector(numpy.asarray(operation(a, b), dtype=float))
+    if not isinstance(left, Vector):
+        assert isinstance(right, Vector)
+        return Vector(array("d", (operation(left, b) for b in right.data)))
+    if not isinstance(right, Vector):
+        return Vector(array("d", (operation(a, right) for a in left.data)))
+    return Vector(array("d", map(operation, left.data, right.data)))
+
+
+def negate(vector: Vector) -> Vector:
+    if numpy is not None:
+        return Vector(-vector.data)
+    return Vector(array("d", (-number for number in vector.data)))
+
+
+def vector(value: object) -> Vector:
+    if not isinstance(value, Vector):
+        raise NativeError("Expect a vector")
+    return value
+
+
+def size(value: object) -> int:
+    if type(value) is not float or value < 0 or not value.is_integer():
+        raise NativeError("Vector size must be a whole number")
+    return int(value)
+
+
+def index(value: object, vector: Vector, end: bool = False) -> int:
+    if type(value) is not float or not value.is_integer():
+        raise NativeError("Vector index must be a whole number")
+    if not 0 <= value < len(vector) + end:
+        raise NativeError("Vector index out of range")
+    return int(value)
+
+
+def number(value: object) -> float:
+    if type(value) is not float:
+        raise NativeError("Vector elements must be numbers")
+    return value
+
+
+class VectorNative(LoxCallable):
+    def __str__(self) -> str:
+        return "<native fn>"
+
+
+# vector(size, value): a vector of size elements, all equal to value
+class New(VectorNative):
+    def arity(self) -> int:
+        return 2
+
+    def call(self, interpreter, arguments: list[object]) -> Vector:
+        return filled(size(arguments[0]), number(arguments[1]))
+
+
+# range(start, stop): start, start + 1 and so on, up to but excluding stop
+class Range(VectorNative):
+    def arity(self) -> int:
+        return 2
+
+    def call(self, interpreter, arguments: list[object]) -> Vector:
+        return number_range(number(arguments[0]), number(arguments[1]))
+
+
+class Len(VectorNative):
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter, arguments: list[object]) -> float:
+        return float(len(vector(arguments[0])))
+
+
+class Get(VectorNative):
+    def arity(self) -> int:
+        return 2
+
+    def call(self, interpreter, arguments: list[object]) -> float:
+        values: Vector = vector(arguments[0])
+        return float(values.data[index(arguments[1], values)])
+
+
+class Set(VectorNative):
+    def arity(self) -> int:
+        return 3
+
+    def call(self, interpreter, arguments: list[object]) -> None:
+        values: Vector = vector(arguments[0])
+        values.data[index(arguments[1], values)] = number(arguments[2])
+
+
+# slice(vector, start, end): a copy of the elements from start to before end
+class Slice(VectorNative):
+    def arity(self) -> int:
+        return 3
+
+    def call(self, interpreter, arguments: list[object]) -> Vector:
+        values: Vector = vector(arguments[0])
+        start: int = index(arguments[1], values, end=True)
+        end: int = index(arguments[2], values, end=True)
+        if numpy is not None:
+            # NumPy slices share their elements, array slices do not
+            return Vector(values.data[start:end].copy())
+        return Vector(values.data[start:end])
+
+
+# Reductions by name, run by the array's own method under NumPy
+REDUCTIONS: dict[str, Callable] = {"sum": math.fsum, "min": min, "max": max}
+
+
+class Reduction(VectorNative):
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter, arguments: list[object]) -> float:
+        values: Vector = vector(arguments[0])
+        if not len(values) and self.name != "sum":
+            raise NativeError("Vector is empty")
+        if numpy is not None:
+            return float(getattr(values.data, self.name)())
+        return float(REDUCTIONS[self.name](values.data))
+
+
+class Dot(VectorNative):
+    def arity(self) -> int:
+        return 2
+
+    def call(self, interpreter, arguments: list[object]) -> float:
+        left: Vector = vector(arguments[0])
+        right: Vector = vector(arguments[1])
+        if len(left) != len(right):
+            raise NativeError("Vectors must have the same length")
+        if numpy is not None:
+            return float(numpy.dot(left.data, right.data))
+        return math.fsum(map(operator.mul, left.data, right.data))
+
+
+VECTOR_NATIVES: dict[str, Callable[[], LoxCallable]] = {
+    "vector": New,
+    "range": Range,
+    "len": Len,
+    "get": Get,
+    "set": Set,
+    "slice": Slice,
+    "sum": lambda: Reduction("sum"),
+    "min": lambda: Reduction("min"),
+    "max": lambda: Reduction("max"),
+    "dot": Dot,
+}
@@ -39,6 +39,7 @@ def main() -> None:
             "Return     => keyword: Token, value: Expr | None",
             "Var        => name: Token, initializer: Expr | None",
             "While      => condition: Expr, body: Stmt",
+            "Import     => keyword: Token, path: Token, name: Token",
         ],
         imports=[("expr", "Expr, Variable"), ("tokens", "Token")],
     )